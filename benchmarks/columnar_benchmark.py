@@ -0,0 +1,101 @@
+"""
+Compares per-commit filter evaluation with the vectorized masks of a columnar `CommitTable`.
+
+A synthetic history of `CommitRecord`s is generated in memory and indexed once into a `CommitTable`. Each filter
+of an author + date range + message keyword + path query is then evaluated over the whole history twice, with
+`is_match` per commit and with its vectorized `mask`, followed by the combined query:
+    - per commit: `all(f.is_match(commit) for f in filters)` over every record (short-circuiting);
+    - columnar: the filters' masks AND-ed over the table, then `np.flatnonzero`.
+Both approaches must select the same commits. Requires NumPy.
+
+Usage:
+    python benchmarks/columnar_benchmark.py --commits 200000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gitgrazer"))
+
+from columnar import CommitTable  # noqa: E402
+from filters import AuthorFilter, DateFilter, MessageKeywordFilter, PathFilter  # noqa: E402
+from history import Author, CommitRecord, FileChange  # noqa: E402
+
+AUTHORS = ("Ada Lovelace", "Grace Hopper", "Linus Torvalds", "Margaret Hamilton", "Ken Thompson")
+TOPICS = ("parser", "cache", "client", "storage", "formatter", "config", "filters", "cli", "docs", "tests")
+VERBS = ("Fix", "Add", "Refactor", "Update", "Remove", "Improve", "Document")
+EPOCH = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def build_history(commits, seed):
+    rng = random.Random(seed)
+    records = []
+    for number in range(commits):
+        topic = rng.choice(TOPICS)
+        message = f"{rng.choice(VERBS)} {topic} handling (PROJ-{rng.randint(1, 5000)})\n\nDetails for {topic}.\n"
+        changes = [FileChange("M", path, path) for path in
+                   {f"src/{rng.choice(TOPICS)}/module_{rng.randint(0, 199)}.py" for _ in range(rng.randint(1, 5))}]
+        records.append(CommitRecord(
+            hexsha=f"{number:040x}",
+            parents=[f"{number - 1:040x}"] if number else [],
+            author=Author(rng.choice(AUTHORS), "dev@example.com"),
+            authored_datetime=EPOCH + datetime.timedelta(minutes=rng.randint(0, 5_000_000)),
+            message=message,
+            changes=changes,
+        ))
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    records = build_history(args.commits, args.seed)
+    filters = [
+        AuthorFilter("Grace Hopper"),
+        DateFilter(datetime.date(2018, 1, 1), datetime.date(2022, 12, 31)),
+        MessageKeywordFilter(["proj-42", "proj-4711", "cache"]),
+        PathFilter(["src/storage"]),
+    ]
+
+    started = time.perf_counter()
+    table = CommitTable.from_commits(records)
+    build_s = time.perf_counter() - started
+
+    print(f"{'filter':<22} {'is_match s':>11} {'mask s':>9} {'speedup':>8}")
+    for commit_filter in filters:
+        started = time.perf_counter()
+        expected = [commit_filter.is_match(record) for record in records]
+        naive_s = time.perf_counter() - started
+        started = time.perf_counter()
+        mask = commit_filter.mask(table)
+        columnar_s = time.perf_counter() - started
+        assert expected == mask.tolist(), f"{type(commit_filter).__name__} mask disagrees with is_match"
+        print(f"{type(commit_filter).__name__:<22} {naive_s:>11.3f} {columnar_s:>9.3f} {naive_s / columnar_s:>7.1f}x")
+
+    started = time.perf_counter()
+    naive = [record.hexsha for record in records if all(f.is_match(record) for f in filters)]
+    naive_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    mask = filters[0].mask(table)
+    for commit_filter in filters[1:]:
+        mask &= commit_filter.mask(table)
+    rows = table.rows(mask)
+    columnar_s = time.perf_counter() - started
+
+    assert naive == [table.hexsha(row) for row in rows], "columnar masks disagree with is_match"
+    print(f"{args.commits} commits, {len(table.authors)} authors, {len(table.paths)} paths, {len(rows)} matches")
+    print(f"table build (once):      {build_s:8.3f}s")
+    print(f"query, per-commit:       {naive_s:8.3f}s")
+    print(f"query, columnar masks:   {columnar_s:8.3f}s")
+    print(f"speedup:                 {naive_s / columnar_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
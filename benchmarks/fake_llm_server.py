@@ -0,0 +1,257 @@
+"""
+A local OpenAI-compatible chat completions stub with configurable latency, error and rate-limit injection.
+
+Point the pipeline at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY. Every
+response echoes a short summary of the request, and the usage block reports a rough token count, so callers
+exercising caching, batching or budgeting see realistic shapes without network access or cost. Requests with
+`"stream": true` get server-sent events whose first token arrives after a tenth of the latency, the rest being
+spread over the remaining words.
+
+Usage:
+    python benchmarks/fake_llm_server.py --port 8765 --latency-ms 800 --jitter-ms 200 --error-rate 0.01
+    python benchmarks/fake_llm_server.py --requests-per-minute 60 --rate-limit-rate 0.05 --spike-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMConfig:
+    """
+    Behaviour of the fake server.
+
+    :param latency_ms: The mean latency added to each request.
+    :param jitter_ms: The standard deviation of the latency.
+    :param error_rate: The probability that a request fails with a 500 error.
+    :param seed: The random seed for latency and error injection.
+    :param rate_limit_rate: The probability that a request is rejected with a 429 error.
+    :param requests_per_minute: A sliding-window request limit enforced with 429 errors, or None for no limit.
+    :param spike_rate: The probability that a request is delayed by an extra `spike_ms`.
+    :param spike_ms: The latency added by a spike.
+    :param retry_after_s: The `retry-after` value sent with injected 429 errors.
+    """
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0, rate_limit_rate=0.0,
+                 requests_per_minute=None, spike_rate=0.0, spike_ms=5000.0, retry_after_s=1.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        self.rate_limit_rate = rate_limit_rate
+        self.requests_per_minute = requests_per_minute
+        self.spike_rate = spike_rate
+        self.spike_ms = spike_ms
+        self.retry_after_s = retry_after_s
+
+
+class FakeLLMServer:
+    """
+    Runs the stub on a background thread; usable as a context manager.
+
+    :ivar requests: The number of chat completion requests received.
+    :ivar errors: The number of injected errors.
+    :ivar rate_limited: The number of requests rejected with a 429 error.
+    :ivar spikes: The number of latency spikes.
+
+    Example usage:
+        with FakeLLMServer(FakeLLMConfig(latency_ms=500)) as server:
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            ...
+    """
+    def __init__(self, config: FakeLLMConfig = None, host="127.0.0.1", port=0):
+        self.config = config or FakeLLMConfig()
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.spikes = 0
+        self._accepted = deque()  # Monotonic times of the requests accepted within the last minute
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _next_outcome(self):
+        """Returns the (delay seconds, outcome, headers) of the next request; outcome is 'ok', 'error' or 'limited'."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._accepted and now - self._accepted[0] >= 60:
+                self._accepted.popleft()
+            delay = max(0.0, self._random.gauss(self.config.latency_ms, self.config.jitter_ms)) / 1000
+            if self._random.random() < self.config.spike_rate:
+                self.spikes += 1
+                delay += self.config.spike_ms / 1000
+            limit = self.config.requests_per_minute
+            if limit and len(self._accepted) >= limit:
+                self.rate_limited += 1
+                reset = 60 - (now - self._accepted[0])
+                return 0.0, "limited", {"retry-after": f"{reset:.3f}", **self._limit_headers(limit, 0, reset)}
+            if self._random.random() < self.config.rate_limit_rate:
+                self.rate_limited += 1
+                return 0.0, "limited", {"retry-after": str(self.config.retry_after_s)}
+            self._accepted.append(now)
+            headers = self._limit_headers(limit, limit - len(self._accepted), 60 - (now - self._accepted[0])) \
+                if limit else {}
+            if self._random.random() < self.config.error_rate:
+                self.errors += 1
+                return delay, "error", headers
+        return delay, "ok", headers
+
+    @staticmethod
+    def _limit_headers(limit, remaining, reset_s):
+        return {"x-ratelimit-limit-requests": str(limit), "x-ratelimit-remaining-requests": str(remaining),
+                "x-ratelimit-reset-requests": f"{max(0.0, reset_s):.3f}s"}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                delay, outcome, headers = server._next_outcome()
+                if outcome == "ok" and body.get("stream"):
+                    self._send_stream(_completion(body), delay, headers)
+                    return
+                time.sleep(delay)
+                if outcome == "limited":
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                                    "code": "rate_limit_exceeded"}}, headers)
+                    return
+                if outcome == "error":
+                    self._send_json(500, {"error": {"message": "Injected failure", "type": "server_error"}}, headers)
+                    return
+                self._send_json(200, _completion(body), headers)
+
+            def _send_stream(self, completion, delay, headers):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                words = re.findall(r"\S+\s*", completion["choices"][0]["message"]["content"])
+                time.sleep(delay * FIRST_TOKEN_SHARE)
+                for index, word in enumerate(words):
+                    if index:
+                        time.sleep(delay * (1 - FIRST_TOKEN_SHARE) / len(words))
+                    self._send_event({**completion, "object": "chat.completion.chunk", "usage": None,
+                                      "choices": [{"index": 0, "finish_reason": None,
+                                                   "delta": {"role": "assistant", "content": word}}]})
+                self._send_event({**completion, "object": "chat.completion.chunk", "usage": None,
+                                  "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]})
+                self._send_chunk(b"data: [DONE]\n\n")
+                self._send_chunk(b"")
+
+            def _send_event(self, payload):
+                self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+FIRST_TOKEN_SHARE = 0.1  # Share of a streamed request's latency spent before its first token
+BATCHED_COMMIT = re.compile(r"^### Commit (c\d+)$", re.MULTILINE)  # Not the "'### Commit <id>'" of the instructions
+
+
+def _completion(request):
+    messages = request.get("messages", [])
+    prompt = "".join(str(message.get("content", "")) for message in messages)
+    last = str(messages[-1].get("content", "")) if messages else ""
+    commit_ids = BATCHED_COMMIT.findall(last)
+    if commit_ids:
+        # Batched requests get the JSON object keyed by commit id that batching.BatchChangeDescriber asks for.
+        content = json.dumps({commit_id: f"Synthetic analysis of batched commit {commit_id}."
+                              for commit_id in commit_ids})
+    else:
+        content = f"Synthetic analysis of a {len(last)}-character request: the commit adjusts the listed files."
+    prompt_tokens, completion_tokens = _estimate_tokens(prompt), _estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake-model"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=None)
+    parser.add_argument("--spike-rate", type=float, default=0.0)
+    parser.add_argument("--spike-ms", type=float, default=5000.0)
+    args = parser.parse_args(argv)
+    config = FakeLLMConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.seed, args.rate_limit_rate,
+                           args.requests_per_minute, args.spike_rate, args.spike_ms)
+    server = FakeLLMServer(config, args.host, args.port)
+    print(f"Serving a fake OpenAI API at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Import-time regression check for the gitgrazer modules.
+
+Runs a fresh interpreter with `python -X importtime -c "import <module>"` a few times, reports the best
+cumulative import time and the slowest transitive imports, and exits non-zero when the time exceeds the budget or
+when a module that must stay lazy (the OpenAI SDK) was imported.
+
+Usage:
+    python benchmarks/import_benchmark.py --module formatters --budget-ms 250
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gitgrazer")
+FORBIDDEN_IMPORTS = ("openai",)
+
+
+def measure(module):
+    """Returns the (cumulative microseconds, {imported module: cumulative microseconds}) of importing `module`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SOURCE_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr}")
+    imports = {}
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = int(cumulative)
+    return imports[module], imports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="formatters")
+    parser.add_argument("--budget-ms", type=float, default=250.0)
+    parser.add_argument("--runs", type=int, default=5, help="the best of this many runs is reported")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best_us, imports = min(runs, key=lambda run: run[0])
+    print(f"import {args.module}: {best_us / 1000:.1f}ms (best of {args.runs}, budget {args.budget_ms:.0f}ms)")
+    for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    failures = [f"{name} is imported eagerly" for name in FORBIDDEN_IMPORTS if name in imports]
+    if best_us / 1000 > args.budget_ms:
+        failures.append(f"import time {best_us / 1000:.1f}ms exceeds the {args.budget_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Measures indexing throughput and query latency of the SQLite FTS5 `CommitIndex`.
+
+Synthetic `CommitOutput`s (messages, diff summaries and generated descriptions) are indexed into a fresh database,
+then keyword, author, date and combined queries are each run `--repeat` times and their median latency reported.
+
+Usage:
+    python benchmarks/index_benchmark.py --commits 200000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gitgrazer"))
+
+from index import CommitIndex  # noqa: E402
+from models import ChangeDescription, CommitOutput  # noqa: E402
+
+AUTHORS = ("Ada Lovelace", "Grace Hopper", "Linus Torvalds", "Margaret Hamilton", "Ken Thompson")
+TOPICS = ("parser", "cache", "client", "storage", "formatter", "config", "filters", "cli", "docs", "tests")
+VERBS = ("Fix", "Add", "Refactor", "Update", "Remove", "Improve", "Document")
+EPOCH = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def build_outputs(commits, seed):
+    rng = random.Random(seed)
+    for number in range(commits):
+        topic = rng.choice(TOPICS)
+        files = "".join(f"M src/{rng.choice(TOPICS)}/module_{rng.randint(0, 199)}.py\n"
+                        for _ in range(rng.randint(1, 4)))
+        yield CommitOutput(
+            commit_hash=f"{number:040x}",
+            author=rng.choice(AUTHORS),
+            date=EPOCH + datetime.timedelta(minutes=rng.randint(0, 5_000_000)),
+            message=f"{rng.choice(VERBS)} {topic} handling (PROJ-{rng.randint(1, 5000)})",
+            change_description=ChangeDescription(
+                content=f"The commit changes how the {topic} {rng.choice(VERBS).lower()}s "
+                        f"{rng.choice(TOPICS)} entries and adjusts {rng.choice(TOPICS)} tests.",
+                diff_summary=files,
+            ),
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    queries = {
+        "keyword": dict(text="PROJ-4242"),
+        "description": dict(text="cache tests", columns=["description"]),
+        "author": dict(author="Grace Hopper"),
+        "date range": dict(since=datetime.date(2019, 3, 1), until=datetime.date(2019, 3, 31)),
+        "combined": dict(text="parser", author="Ada Lovelace", since=datetime.date(2018, 1, 1),
+                         until=datetime.date(2020, 12, 31)),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        with CommitIndex(os.path.join(directory, "index.sqlite3"), batch_size=1000) as index:
+            started = time.perf_counter()
+            for commit_output in build_outputs(args.commits, args.seed):
+                index.add(commit_output)
+            index.optimize()
+            index_s = time.perf_counter() - started
+            print(f"indexed {len(index)} commits in {index_s:.2f}s ({len(index) / index_s:,.0f} commits/s)")
+            print(f"{'query':<12} {'results':>8} {'median ms':>10}")
+            for name, query in queries.items():
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    results = index.search(**query)
+                    timings.append(time.perf_counter() - started)
+                print(f"{name:<12} {len(results):>8} {statistics.median(timings) * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Compares MessageKeywordFilter's compiled matcher with the naive per-keyword substring scan.
+
+A synthetic corpus of commit messages is generated in which a small fraction mention one of the keywords
+(ticket IDs plus component tags). Both approaches must agree on every message.
+
+Usage:
+    python benchmarks/keyword_benchmark.py --messages 1000000 --keywords 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gitgrazer"))
+
+from matching import KeywordMatcher  # noqa: E402
+
+WORDS = ("fix", "add", "update", "remove", "refactor", "bump", "tests", "docs", "handle", "error", "config",
+         "client", "server", "parser", "cache", "login", "release", "merge", "branch", "typo", "cleanup")
+
+
+def build_corpus(messages, keywords, hit_rate, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(messages):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 14))]
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        corpus.append(" ".join(words).capitalize())
+    return corpus
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--keywords", type=int, default=500)
+    parser.add_argument("--hit-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    keywords = [f"proj-{number}" for number in range(1000, 1000 + args.keywords - 20)]
+    keywords += [f"[component-{number}]" for number in range(20)]
+    corpus = build_corpus(args.messages, keywords, args.hit_rate, args.seed)
+
+    started = time.perf_counter()
+    naive = [any(keyword in message.lower() for keyword in keywords) for message in corpus]
+    naive_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matcher = KeywordMatcher(keywords)
+    compiled_s = time.perf_counter() - started
+    started = time.perf_counter()
+    fast = [matcher.search(message) for message in corpus]
+    fast_s = time.perf_counter() - started
+
+    assert naive == fast, "compiled matcher disagrees with the naive scan"
+    print(f"{args.messages} messages, {len(keywords)} keywords, {sum(fast)} matches")
+    print(f"naive any(keyword in message): {naive_s:8.2f}s")
+    print(f"KeywordMatcher.search:         {fast_s:8.2f}s  (+{compiled_s * 1000:.1f}ms to compile)")
+    print(f"speedup:                       {naive_s / fast_s:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
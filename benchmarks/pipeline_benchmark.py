@@ -0,0 +1,210 @@
+"""
+Reproducible end-to-end benchmark of the gitgrazer pipeline.
+
+Generates a synthetic repository, starts a local fake OpenAI-compatible server, and times every stage of the
+pipeline separately: commit walk (GitPython, bulk `git log` and the process pool with patches), filtering, diffing, model calls, storage and
+formatting. For each stage it reports throughput and per-item latency percentiles, and it can save the results
+as JSON and compare them with an earlier run.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py --commits 2000 --llm-commits 100 --latency-ms 300 \\
+        --output results.json --compare baseline.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, "..", "src", "gitgrazer"))
+
+import git  # noqa: E402
+import utils  # noqa: E402
+from cache import SqliteChangeDescriptionCache  # noqa: E402
+from fake_llm_server import FakeLLMConfig, FakeLLMServer  # noqa: E402
+from filters import AuthorFilter, CommitSearchManager, MessageKeywordFilter  # noqa: E402
+from formatters import HTMLCommitOutputFormatter, TextCommitOutputFormatter  # noqa: E402
+from history import GitLogHistory  # noqa: E402
+from parallel import ParallelGitHistory  # noqa: E402
+from storage import SqliteCommitDataStorage  # noqa: E402
+from synthetic_repo import SyntheticRepoSpec, create_repo  # noqa: E402
+
+STAGES = ("walk", "walk_bulk", "walk_parallel", "filter", "diff", "llm", "storage", "format")
+
+
+class StageRecorder:
+    """Collects per-item latencies for one stage and summarizes them."""
+    def __init__(self):
+        self.samples = []
+        self.total = 0.0
+
+    def time(self, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        self.samples.append(elapsed)
+        self.total += elapsed
+        return result
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+        return {
+            "count": len(ordered),
+            "total_s": round(self.total, 6),
+            "throughput_per_s": round(len(ordered) / self.total, 2) if self.total else None,
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p90_ms": round(percentile(ordered, 90) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+            "max_ms": round(ordered[-1] * 1000, 3),
+        }
+
+
+def percentile(ordered, rank):
+    """The nearest-rank percentile of an ascending list."""
+    index = max(0, min(len(ordered) - 1, round(rank / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _timed_iteration(recorder, iterable):
+    """Records the time taken to produce each item of `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        elapsed = time.perf_counter() - started
+        recorder.samples.append(elapsed)
+        recorder.total += elapsed
+        yield item
+
+
+def run(args, workdir):
+    spec = SyntheticRepoSpec(args.commits, args.files, args.files_per_commit, args.diff_lines, args.binary_ratio,
+                             args.binary_size, args.seed)
+    repo_path = os.path.join(workdir, "repo")
+    setup_s = create_repo(repo_path, spec)
+    recorders = {stage: StageRecorder() for stage in STAGES}
+
+    repo = git.Repo(repo_path)
+    commits = list(_timed_iteration(recorders["walk"], repo.iter_commits("main")))
+    # Touch the lazily loaded fields so the walk includes the object reads the pipeline needs.
+    for commit in commits:
+        recorders["walk"].time(lambda c: (c.author.name, c.authored_datetime, c.message), commit)
+    list(_timed_iteration(recorders["walk_bulk"], GitLogHistory(repo_path).iter_commits("main")))
+    # Compare with walk + diff: the parallel walk also extracts every commit's patch.
+    list(_timed_iteration(recorders["walk_parallel"],
+                          ParallelGitHistory(repo_path, workers=args.workers).iter_commits("main")))
+
+    search_manager = CommitSearchManager()
+    search_manager.add_filter(AuthorFilter("Grace Hopper"))
+    search_manager.add_filter(MessageKeywordFilter(["cache", "parser"]))
+    for commit in commits:
+        recorders["filter"].time(search_manager.process_commits, [commit])
+
+    with_parents = [commit for commit in commits if commit.parents]
+    diffs = {commit.hexsha: recorders["diff"].time(utils.get_commit_diff, commit) for commit in with_parents}
+
+    fake_config = FakeLLMConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    outputs = []
+    with FakeLLMServer(fake_config) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        utils.set_description_cache(SqliteChangeDescriptionCache(os.path.join(workdir, "descriptions.sqlite3")))
+        for commit in with_parents[:args.llm_commits]:
+            try:
+                recorders["llm"].time(utils.generate_change_description, diffs[commit.hexsha])
+                outputs.append(utils.generate_commit_output(commit))  # Answered from the description cache
+            except Exception as error:  # Injected failures are part of the measurement
+                print(f"LLM call failed: {error}")
+        llm_requests, llm_errors = server.requests, server.errors
+
+    storage = SqliteCommitDataStorage(os.path.join(workdir, "processed.sqlite3"))
+    for commit in commits:
+        recorders["storage"].time(storage.save, commit.hexsha)
+    storage.close()
+
+    for formatter in (TextCommitOutputFormatter(), HTMLCommitOutputFormatter()):
+        for commit_output in outputs:
+            recorders["format"].time(formatter.format, commit_output)
+
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "gitgrazer_revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": spec.as_dict(),
+        "fake_llm": {**vars(fake_config), "requests": llm_requests, "errors": llm_errors},
+        "repo_setup_s": round(setup_s, 3),
+        "stages": {stage: recorder.summary() for stage, recorder in recorders.items()},
+    }
+
+
+def _revision():
+    result = subprocess.run(["git", "-C", BENCHMARK_DIR, "rev-parse", "--short", "HEAD"],
+                            capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def print_report(results, baseline=None):
+    print(f"{'stage':<10} {'count':>7} {'items/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+          + ("  p50 vs baseline" if baseline else ""))
+    for stage, summary in results["stages"].items():
+        if not summary["count"]:
+            continue
+        line = (f"{stage:<10} {summary['count']:>7} {summary['throughput_per_s'] or 0:>10.1f} "
+                f"{summary['p50_ms']:>9.3f} {summary['p90_ms']:>9.3f} {summary['p99_ms']:>9.3f} "
+                f"{summary['max_ms']:>9.3f}")
+        previous = (baseline or {}).get("stages", {}).get(stage, {})
+        if previous.get("p50_ms"):
+            line += f"  {(summary['p50_ms'] / previous['p50_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--files-per-commit", type=float, default=3)
+    parser.add_argument("--diff-lines", type=int, default=40)
+    parser.add_argument("--binary-ratio", type=float, default=0.02)
+    parser.add_argument("--binary-size", type=int, default=64 * 1024)
+    parser.add_argument("--llm-commits", type=int, default=100, help="number of commits sent to the fake model")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes of the parallel walk (default: CPUs)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a previous results JSON file to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="gitgrazer-bench-") as workdir:
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)  # Keep default storage/cache files out of the source tree
+        try:
+            results = run(args, workdir)
+        finally:
+            os.chdir(previous_cwd)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compares JsonCommitDataStorage with SqliteCommitDataStorage.
+
+For each size the benchmark saves N random hashes one by one (as a backfill does), reopens the storage and runs
+one bulk membership lookup over N hashes of which half are known. The JSON store rewrites the whole file on
+every save, so its save time grows quadratically; pass --json-limit to skip it above a given size.
+
+Usage:
+    python benchmarks/storage_benchmark.py --sizes 10000 100000
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gitgrazer"))
+
+from storage import JsonCommitDataStorage, SqliteCommitDataStorage  # noqa: E402
+
+
+def _bench(factory, hashes, probes):
+    started = time.perf_counter()
+    storage = factory()
+    for commit_hash in hashes:
+        storage.save(commit_hash)
+    storage.close()
+    saved = time.perf_counter()
+
+    storage = factory()
+    loaded = time.perf_counter()
+    found = storage.has_commits(probes)
+    looked_up = time.perf_counter()
+    storage.close()
+    assert len(found) == len(probes) // 2
+    return {"save_s": saved - started, "open_s": loaded - saved, "has_commits_s": looked_up - loaded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--json-limit", type=int, default=10_000,
+                        help="skip the JSON store for sizes above this many hashes")
+    args = parser.parse_args(argv)
+
+    print(f"{'storage':<8} {'hashes':>8} {'save s':>10} {'open s':>8} {'lookup s':>9}")
+    for size in args.sizes:
+        hashes = [secrets.token_hex(20) for _ in range(size)]
+        probes = hashes[: size // 2] + [secrets.token_hex(20) for _ in range(size - size // 2)]
+        with tempfile.TemporaryDirectory() as directory:
+            candidates = [
+                ("sqlite", lambda: SqliteCommitDataStorage(os.path.join(directory, "commits.sqlite3"))),
+            ]
+            if size <= args.json_limit:
+                candidates.insert(0, ("json", lambda: JsonCommitDataStorage(os.path.join(directory, "commits.json"))))
+            for name, factory in candidates:
+                result = _bench(factory, hashes, probes)
+                print(f"{name:<8} {size:>8} {result['save_s']:>10.3f} {result['open_s']:>8.3f} "
+                      f"{result['has_commits_s']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Generates synthetic git repositories of configurable size for benchmarking.
+
+History is written with a single `git fast-import` stream, so even 100k-commit repositories are created in
+seconds. Generation is deterministic for a given seed.
+
+Usage:
+    python benchmarks/synthetic_repo.py /tmp/synthetic --commits 5000 --files-per-commit 3 --diff-lines 40
+"""
+import argparse
+import os
+import random
+import subprocess
+import time
+
+AUTHORS = ("Ada Lovelace", "Grace Hopper", "Linus Torvalds", "Margaret Hamilton", "Ken Thompson")
+TOPICS = ("parser", "cache", "client", "storage", "formatter", "config", "filters", "cli", "docs", "tests")
+VERBS = ("Fix", "Add", "Refactor", "Update", "Remove", "Improve", "Document")
+
+
+class SyntheticRepoSpec:
+    """
+    The shape of a synthetic repository.
+
+    :param commits: The number of commits on the branch.
+    :param files: The number of distinct files the history touches.
+    :param files_per_commit: The average number of files changed per commit.
+    :param diff_lines: The average number of lines written per changed text file.
+    :param binary_ratio: The fraction of changed files that are binary blobs.
+    :param binary_size: The size in bytes of each binary blob.
+    :param seed: The random seed.
+    """
+    def __init__(self, commits=1000, files=200, files_per_commit=3, diff_lines=40, binary_ratio=0.02,
+                 binary_size=64 * 1024, seed=0):
+        self.commits = commits
+        self.files = files
+        self.files_per_commit = files_per_commit
+        self.diff_lines = diff_lines
+        self.binary_ratio = binary_ratio
+        self.binary_size = binary_size
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _data(payload: bytes) -> bytes:
+    return b"data %d\n%s\n" % (len(payload), payload)
+
+
+def _text_blob(rng, path, lines):
+    return "".join(f"{path}:{number}: {rng.choice(VERBS).lower()} {rng.choice(TOPICS)} {rng.random():.6f}\n"
+                   for number in range(lines)).encode()
+
+
+def fast_import_stream(spec: SyntheticRepoSpec, branch="main"):
+    """Yields the `git fast-import` input for `spec` in chunks."""
+    rng = random.Random(spec.seed)
+    paths = [f"src/{rng.choice(TOPICS)}/module_{number}.py" for number in range(spec.files)]
+    binary_paths = [f"assets/blob_{number}.bin" for number in range(max(1, spec.files // 20))]
+    timestamp = 1_600_000_000
+    for number in range(1, spec.commits + 1):
+        timestamp += rng.randint(60, 6 * 3600)
+        author = rng.choice(AUTHORS)
+        ident = f"{author} <{author.split()[0].lower()}@example.com> {timestamp} +0000".encode()
+        message = f"{rng.choice(VERBS)} {rng.choice(TOPICS)} handling (PROJ-{rng.randint(1, 5000)})\n".encode()
+        chunk = [b"commit refs/heads/%s\n" % branch.encode(), b"mark :%d\n" % number,
+                 b"author " + ident + b"\n", b"committer " + ident + b"\n", _data(message)]
+        if number > 1:
+            chunk.append(b"from :%d\n" % (number - 1))
+        changed = max(1, round(rng.expovariate(1 / spec.files_per_commit)))
+        for _ in range(changed):
+            if rng.random() < spec.binary_ratio:
+                payload = rng.randbytes(spec.binary_size)
+                path = rng.choice(binary_paths)
+            else:
+                path = rng.choice(paths)
+                payload = _text_blob(rng, path, max(1, round(rng.expovariate(1 / spec.diff_lines))))
+            chunk.append(b"M 100644 inline %s\n" % path.encode())
+            chunk.append(_data(payload))
+        yield b"".join(chunk) + b"\n"
+
+
+def create_repo(path, spec: SyntheticRepoSpec, branch="main"):
+    """Creates (or overwrites the branch of) a repository at `path` following `spec`; returns the elapsed seconds."""
+    started = time.perf_counter()
+    os.makedirs(path, exist_ok=True)
+    subprocess.run(["git", "init", "-q", "-b", branch, path], check=True)
+    process = subprocess.Popen(["git", "-C", path, "fast-import", "--quiet", "--force"], stdin=subprocess.PIPE)
+    try:
+        for chunk in fast_import_stream(spec, branch):
+            process.stdin.write(chunk)
+    finally:
+        process.stdin.close()
+    if process.wait():
+        raise RuntimeError(f"git fast-import failed with exit code {process.returncode}")
+    subprocess.run(["git", "-C", path, "checkout", "-q", "-f", branch], check=True)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--commits", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--files-per-commit", type=float, default=3)
+    parser.add_argument("--diff-lines", type=int, default=40)
+    parser.add_argument("--binary-ratio", type=float, default=0.02)
+    parser.add_argument("--binary-size", type=int, default=64 * 1024)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    spec = SyntheticRepoSpec(args.commits, args.files, args.files_per_commit, args.diff_lines, args.binary_ratio,
+                             args.binary_size, args.seed)
+    elapsed = create_repo(args.path, spec)
+    print(f"Created {args.commits} commits in {args.path} ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
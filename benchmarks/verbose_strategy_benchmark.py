@@ -0,0 +1,101 @@
+"""
+Measures the peak RSS of verbose change descriptions on a commit with very large files.
+
+The benchmark builds a repository whose last commit modifies a large text file and a large binary file (each
+`--size-mb` MiB), then describes that commit in fresh processes:
+    - naive: the previous approach, reading and decoding both full blobs of every file and concatenating strings;
+    - verbose: `VerboseChangeDescriptionStrategy`, which reads blobs in pieces and stops at its byte caps.
+Each process reports its own peak RSS (ru_maxrss), so the numbers do not include the benchmark itself.
+Requires GitPython.
+
+Usage:
+    python benchmarks/verbose_strategy_benchmark.py --size-mb 300
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "gitgrazer")
+WRITE_SIZE = 1 << 20
+
+
+def create_repo(path, size_mb):
+    """Creates a repository whose HEAD commit modifies a `size_mb` MiB text file and binary file."""
+    def git(*args):
+        subprocess.run(["git", "-C", path, *args], check=True, stdout=subprocess.DEVNULL)
+
+    git("init", "-q")
+    git("config", "user.name", "Benchmark")
+    git("config", "user.email", "benchmark@example.com")
+    for revision in (0, 1):
+        with open(os.path.join(path, "large.txt"), "w") as file:
+            for block in range(size_mb):
+                lines = (f"block {block} line {line} revision {revision if line % 997 == 0 else 0}\n"
+                         for line in range(WRITE_SIZE // 32))
+                file.write("".join(lines))
+        with open(os.path.join(path, "large.bin"), "wb") as file:
+            for block in range(size_mb):
+                file.write(bytes([revision]) * 16 + b"\0" * (WRITE_SIZE - 16))
+        git("add", "large.txt", "large.bin")
+        git("commit", "-q", "-m", f"Revision {revision}")
+
+
+def describe_naive(diff):
+    description = ""
+    for change in diff:
+        description += f"File Modified: {change.b_path}\n"
+        description += f"+ {change.b_blob.data_stream.read().decode(errors='replace')} \n"
+        description += f"- {change.a_blob.data_stream.read().decode(errors='replace')} \n"
+    return description
+
+
+def run_child(mode, repo_path):
+    sys.path.insert(0, SOURCE_DIR)
+    import git
+    from strategies import VerboseChangeDescriptionStrategy
+    commit = git.Repo(repo_path).head.commit
+    diff = commit.parents[0].diff(commit)
+    started = time.perf_counter()
+    if mode == "naive":
+        description = describe_naive(diff)
+    else:
+        with VerboseChangeDescriptionStrategy() as strategy:
+            description = strategy.generate(diff)
+    elapsed = time.perf_counter() - started
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    print(json.dumps({"mode": mode, "seconds": elapsed, "peak_rss_mib": peak_kib / 1024,
+                      "description_chars": len(description)}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=300, help="size of each large file in MiB")
+    parser.add_argument("--modes", nargs="+", default=["verbose", "naive"], choices=["verbose", "naive"])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "REPO"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        run_child(*args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Creating a repository with two {args.size_mb} MiB files...")
+        create_repo(directory, args.size_mb)
+        print(f"{'mode':<8} {'seconds':>9} {'peak RSS MiB':>13} {'chars':>12}")
+        for mode in args.modes:
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, directory],
+                                       capture_output=True, text=True)
+            if completed.returncode:
+                print(f"{mode:<8} failed: {completed.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(completed.stdout)
+            print(f"{mode:<8} {result['seconds']:>9.2f} {result['peak_rss_mib']:>13.1f} "
+                  f"{result['description_chars']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import json
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import utils
+from cache import description_cache_key
+from models import ChangeDescription
+from payloads import estimate_tokens
+
+BATCH_TEMPLATE = (
+    "Below are the git diffs of {{count}} separate commits, each introduced by a line of the form "
+    "'### Commit <id>'.\n"
+    "{{commits}}\n"
+    "Analyze each commit on its own. For every commit, explain what was added, removed or altered, the likely "
+    "purpose of the changes and their impact on the project's functionality, in a clear, narrative form. "
+    "Respond with only a JSON object mapping each commit id to its analysis as a string, for example "
+    '{"c1": "...", "c2": "..."}, with no other text.')
+
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def batch_cache_key(request) -> str:
+    """Returns the cache key of a batched answer to a single-chunk `utils.DescriptionRequest`."""
+    return description_cache_key(utils.MODEL, utils.SYSTEM_PROMPT, BATCH_TEMPLATE, request.chunks[0])
+
+
+class BatchChangeDescriber:
+    """
+    Describes many small commits with one model request per batch instead of one request per commit.
+
+    Commits whose whole payload fits in `small_commit_tokens` are packed, in order, into batches of up to
+    `max_batch_size` commits and `token_budget` payload tokens. The model is asked for a JSON object keyed by
+    per-batch commit ids. Its answers are handed to the regular pipeline through `utils.BATCH_ANSWERS`, which
+    `utils.generate_change_description` consults before asking the model, and persisted in the change description
+    cache under `batch_cache_key`. That key includes `BATCH_TEMPLATE`, so an answer from the shared batch prompt
+    only ever stands in for a single request's answer in runs that batch, which load it back without a request;
+    runs without batching never see it. Commits missing from an answer, or all commits of a batch whose answer
+    cannot be parsed, fall back to single requests. Large commits, commits already cached and repeats of an
+    already described patch (see `utils.patch_key`) and trivial commits (see `utils.TRIVIAL_CLASSIFIER`) are
+    left to the regular path.
+
+    :param token_budget: The maximum estimated payload tokens per batch request.
+    :type token_budget: int
+    :param max_batch_size: The maximum number of commits per batch request.
+    :type max_batch_size: int
+    :param small_commit_tokens: The payload size up to which a commit is batched.
+    :type small_commit_tokens: int
+    :param max_in_flight: The number of batch requests sent concurrently.
+    :type max_in_flight: int
+
+    :ivar batch_requests: Batch requests sent.
+    :ivar batched_commits: Commits described through a batch request.
+    :ivar fallbacks: Commits that needed a single request after all.
+
+    Example usage:
+        describer = BatchChangeDescriber(max_batch_size=8)
+        describer.prefetch(commits)
+        for commit in commits:
+            print(formatter.format(commit))  # Served from the batch answers
+    """
+    def __init__(self, token_budget=3000, max_batch_size=10, small_commit_tokens=300, max_in_flight=1):
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.small_commit_tokens = small_commit_tokens
+        self.max_in_flight = max_in_flight
+        self.batch_requests = 0
+        self.batched_commits = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    @property
+    def requests_saved(self):
+        return self.batched_commits - self.batch_requests
+
+    def prefetch(self, commits):
+        """Describes the small, not yet cached commits among `commits` in batches."""
+        cache = utils.get_description_cache()
+        candidates = []
+        seen_patches = set()
+        seen_keys = set()  # Identical payloads are sent once; the cache serves the repeats
+        for commit in commits:
+            if not commit.parents:
+                continue
+            patch_id = utils.patch_key(commit)
+            if patch_id is not None:
+                if patch_id in seen_patches or cache.get_by_patch_id(patch_id) is not None:
+                    continue  # Reused from the commit that introduced the patch
+                seen_patches.add(patch_id)
+            diff = utils.get_commit_diff(commit)
+            if utils.TRIVIAL_CLASSIFIER is not None and utils.TRIVIAL_CLASSIFIER.classify(diff) is not None:
+                continue  # Described by rule, without the model
+            request = utils.plan_change_description(diff)
+            if len(request.chunks) != 1 or request.cache_key in seen_keys or cache.contains(request.cache_key):
+                continue
+            seen_keys.add(request.cache_key)
+            batched = cache.get(batch_cache_key(request))
+            if batched is not None:
+                utils.BATCH_ANSWERS[request.cache_key] = batched  # Answered by a batch of an earlier run
+                continue
+            tokens = estimate_tokens(request.chunks[0])
+            if tokens <= self.small_commit_tokens:
+                candidates.append((request, tokens))
+        batches = self._pack(candidates)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            list(executor.map(self._describe_batch, batches))
+
+    def _pack(self, candidates):
+        batches, current, current_tokens = [], [], 0
+        for request, tokens in candidates:
+            if current and (len(current) == self.max_batch_size or current_tokens + tokens > self.token_budget):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(request)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _describe_batch(self, requests):
+        if len(requests) == 1:
+            return  # Nothing to share; the regular path sends the same single request
+        ids = [f"c{number}" for number in range(1, len(requests) + 1)]
+        sections = "\n".join(f"### Commit {commit_id}\n{request.chunks[0]}"
+                             for commit_id, request in zip(ids, requests))
+        prompt = BATCH_TEMPLATE.replace("{{count}}", str(len(requests))).replace("{{commits}}", sections)
+        with self._lock:
+            self.batch_requests += 1
+        try:
+            answers = self._parse(utils.complete(prompt))
+        except Exception as e:
+            print(f"Batch of {len(requests)} commits could not be described, falling back to single requests: {e}",
+                  file=sys.stderr)
+            answers = {}
+        cache = utils.get_description_cache()
+        described = 0
+        for commit_id, request in zip(ids, requests):
+            content = answers.get(commit_id)
+            if isinstance(content, str) and content.strip():
+                change_description = ChangeDescription(content=content.strip(), diff_summary=request.diff_summary)
+                cache.put(batch_cache_key(request), change_description)
+                utils.BATCH_ANSWERS[request.cache_key] = change_description
+                described += 1
+            # Otherwise it stays uncached and generate_change_description issues the single request for it.
+        with self._lock:
+            self.batched_commits += described
+            self.fallbacks += len(requests) - described
+
+    @staticmethod
+    def _parse(answer) -> dict:
+        match = _JSON_OBJECT.search(answer)
+        if not match:
+            raise ValueError("the answer contains no JSON object")
+        parsed = json.loads(match.group(0))
+        if not isinstance(parsed, dict):
+            raise ValueError("the answer is not a JSON object")
+        return parsed
@@ -0,0 +1,266 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from models import ChangeDescription
+
+
+def description_cache_key(model, system_prompt, template, diff_payload) -> str:
+    """
+    Builds the content address of a change description request.
+
+    Every input that influences the model's answer is part of the key, so changing the model or either prompt
+    naturally invalidates earlier entries.
+    """
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, template, diff_payload):
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so that moving text between parts cannot produce the same key.
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class ChangeDescriptionCache(ABC):
+    """
+    Abstract base class for change description caches.
+
+    :ivar hits: The number of lookups answered from the cache.
+    :ivar misses: The number of lookups that were not in the cache.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def get(self, key) -> ChangeDescription:
+        pass
+
+    @abstractmethod
+    def put(self, key, change_description: ChangeDescription):
+        pass
+
+    @abstractmethod
+    def contains(self, key) -> bool:
+        """Returns whether `key` is cached, without counting a hit or miss; for planning ahead of the lookups."""
+        pass
+
+    def get_by_patch_id(self, patch_id):
+        """
+        Returns `(commit_hash, change_description)` for the first commit described with this patch id, or None.
+
+        Caches without patch id support never find one, so every commit is described on its own.
+        """
+        return None
+
+    def link_patch_id(self, patch_id, commit_hash, key):
+        """Records that `commit_hash`, whose patch id is `patch_id`, was described by the entry at `key`."""
+        pass
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class SqliteChangeDescriptionCache(ChangeDescriptionCache):
+    """
+    A persistent, content-addressed cache of change descriptions backed by a SQLite database.
+
+    Entries are evicted when they are older than `max_age_seconds` or, least recently used first, when the cache
+    holds more than `max_entries` descriptions. Patch ids are linked to the entry describing them, so commits with
+    the same patch (cherry-picks, rebases) can reuse it. The cache is safe to share between threads.
+
+    :param filepath: The path to the SQLite database file.
+    :type filepath: str
+    :param max_entries: The maximum number of cached descriptions, or None for no limit.
+    :type max_entries: int
+    :param max_age_seconds: The maximum age of a cached description, or None for no limit.
+    :type max_age_seconds: float
+
+    Example usage:
+        cache = SqliteChangeDescriptionCache('change_descriptions.sqlite3')
+        key = description_cache_key(model, system_prompt, template, diff_summary)
+        change_description = cache.get(key)
+        if change_description is None:
+            change_description = ...  # Ask the model
+            cache.put(key, change_description)
+    """
+    EVICTION_INTERVAL = 100  # Number of writes between eviction sweeps
+
+    def __init__(self, filepath='change_descriptions.sqlite3', max_entries=50_000, max_age_seconds=None):
+        super().__init__()
+        self.filepath = filepath
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._writes_since_eviction = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filepath, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS change_descriptions ("
+            " key TEXT PRIMARY KEY,"
+            " content TEXT NOT NULL,"
+            " diff_summary TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS change_descriptions_accessed_at ON change_descriptions (accessed_at)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS patch_descriptions ("
+            " patch_id TEXT PRIMARY KEY,"
+            " commit_hash TEXT NOT NULL,"
+            " key TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get(self, key) -> ChangeDescription:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, diff_summary, created_at FROM change_descriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[2], now):
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE change_descriptions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return ChangeDescription(content=row[0], diff_summary=row[1])
+
+    def put(self, key, change_description: ChangeDescription):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO change_descriptions (key, content, diff_summary, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, change_description.content, change_description.diff_summary, now, now),
+            )
+            self._writes_since_eviction += 1
+            if self._writes_since_eviction >= self.EVICTION_INTERVAL:
+                self._evict(now)
+            self._connection.commit()
+
+    def contains(self, key) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT created_at FROM change_descriptions WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None and not self._is_expired(row[0], time.time())
+
+    def get_by_patch_id(self, patch_id):
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT p.commit_hash, d.key, d.content, d.diff_summary, d.created_at FROM patch_descriptions p"
+                " JOIN change_descriptions d ON d.key = p.key WHERE p.patch_id = ?", (patch_id,)
+            ).fetchone()
+            if row is None or self._is_expired(row[4], now):
+                return None
+            self._connection.execute("UPDATE change_descriptions SET accessed_at = ? WHERE key = ?", (now, row[1]))
+            self._connection.commit()
+        return row[0], ChangeDescription(content=row[2], diff_summary=row[3])
+
+    def link_patch_id(self, patch_id, commit_hash, key):
+        with self._lock:
+            # The first commit stays the origin unless its description has been evicted in the meantime.
+            self._connection.execute(
+                "INSERT INTO patch_descriptions (patch_id, commit_hash, key) VALUES (?, ?, ?)"
+                " ON CONFLICT (patch_id) DO UPDATE SET commit_hash = excluded.commit_hash, key = excluded.key"
+                " WHERE patch_descriptions.key NOT IN (SELECT key FROM change_descriptions)",
+                (patch_id, commit_hash, key),
+            )
+            self._connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM change_descriptions").fetchone()[0]
+
+    def evict(self):
+        with self._lock:
+            self._evict(time.time())
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _is_expired(self, created_at, now):
+        return self.max_age_seconds is not None and now - created_at > self.max_age_seconds
+
+    def _evict(self, now):
+        self._writes_since_eviction = 0
+        if self.max_age_seconds is not None:
+            self._connection.execute(
+                "DELETE FROM change_descriptions WHERE created_at < ?", (now - self.max_age_seconds,)
+            )
+        if self.max_entries is not None:
+            self._connection.execute(
+                "DELETE FROM change_descriptions WHERE key IN ("
+                " SELECT key FROM change_descriptions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+class LRUCache:
+    """
+    A bounded, thread-safe, in-memory least-recently-used cache.
+
+    `get_or_compute` guarantees that concurrent callers asking for the same key share a single computation, which
+    is what lets the command, strategy and formatters of one run reuse a commit's diff and output.
+
+    :param maxsize: The maximum number of entries kept.
+    :type maxsize: int
+
+    Example usage:
+        diffs = LRUCache(maxsize=256)
+        diff = diffs.get_or_compute(commit.hexsha, lambda: commit.parents[0].diff(commit))
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                # Another thread may have finished the computation while we waited for the key lock.
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+            try:
+                value = compute()
+                with self._lock:
+                    self._entries[key] = value
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,176 @@
+import numpy as np
+
+MATERIALIZE_CHUNK_SIZE = 256  # Surviving rows turned into full commits per history lookup
+MESSAGE_SEPARATOR = "\0"  # Joins the messages of the buffer; keywords never contain it
+
+
+def _changed_paths(commit):
+    # CommitRecords carry their changes; GitPython commits only offer the (slower) stats.
+    changes = getattr(commit, "changes", None)
+    if changes is not None:
+        return list(dict.fromkeys(change.b_path for change in changes))
+    return list(commit.stats.files)
+
+
+class CommitTable:
+    """
+    A columnar, in-memory index of a commit history for ad hoc queries over the whole history at once.
+
+    Each commit is a row; its attributes are kept in NumPy columns rather than in commit objects:
+        - `hexshas`: the commit hashes (bytes);
+        - `author_ids`: indexes into the interned `authors` names;
+        - `timestamps`: the author dates as epoch seconds;
+        - `author_days`: the author dates as proleptic ordinals of the author's local date, as `DateFilter` uses;
+        - `file_counts`: the number of changed files;
+        - `message_offsets`: the start of each message in `message_buffer`, the messages joined by a NUL;
+        - `path_offsets`/`path_ids`: the changed files of row i, as indexes into the interned `paths`, are
+          `path_ids[path_offsets[i]:path_offsets[i + 1]]`.
+
+    Filters evaluate against the whole table with their `mask` method, returning one boolean per row, so
+    `CommitSearchManager.search_table` can AND them in a single vectorized pass and only turn the surviving rows
+    back into commits. Rows keep the order the commits were given in (newest first for a history walk).
+
+    Building a table walks the whole history, so it pays off when it is kept and queried many times, not for a
+    single search, which `CommitSearchManager.search` answers by pushing the filters down into git. Build it from
+    `GitLogHistory` records: GitPython commits have their changed paths read with one `git diff` per commit.
+
+    Example usage:
+        table = CommitTable.from_commits(GitLogHistory('.').iter_commits('main'))
+        recent = table.date_mask(datetime.date(2024, 1, 1), datetime.date.today()) & table.author_mask('Ada')
+        for commit in table.materialize(table.rows(recent), history):
+            print(commit.hexsha)
+    """
+    def __init__(self, hexshas, author_ids, authors, timestamps, author_days, file_counts, message_buffer,
+                 message_offsets, path_offsets, path_ids, paths):
+        self.hexshas = hexshas
+        self.author_ids = author_ids
+        self.authors = authors
+        self.timestamps = timestamps
+        self.author_days = author_days
+        self.file_counts = file_counts
+        self.message_buffer = message_buffer
+        self.message_offsets = message_offsets
+        self.path_offsets = path_offsets
+        self.path_ids = path_ids
+        self.paths = paths
+        self._author_index = {name: index for index, name in enumerate(authors)}
+        self._folded = None  # The lower-cased message buffer and its offsets, built on the first such query
+
+    @classmethod
+    def from_commits(cls, commits) -> "CommitTable":
+        """
+        Builds a table from GitPython commits or `CommitRecord`s, e.g. the records of `GitLogHistory.iter_commits`.
+
+        The commits are consumed one at a time and only their columns are kept.
+        """
+        hexshas, author_ids, timestamps, author_days, file_counts = [], [], [], [], []
+        messages, path_offsets, path_ids = [], [0], []
+        author_index, path_index = {}, {}
+        for commit in commits:
+            hexshas.append(commit.hexsha)
+            author_ids.append(author_index.setdefault(commit.author.name, len(author_index)))
+            authored = commit.authored_datetime
+            timestamps.append(int(authored.timestamp()))
+            author_days.append(authored.date().toordinal())
+            messages.append(commit.message)
+            paths = _changed_paths(commit)
+            file_counts.append(len(paths))
+            path_ids.extend(path_index.setdefault(path, len(path_index)) for path in paths)
+            path_offsets.append(len(path_ids))
+        return cls(
+            hexshas=np.array(hexshas, dtype="S") if hexshas else np.empty(0, dtype="S40"),
+            author_ids=np.array(author_ids, dtype=np.int32),
+            authors=list(author_index),
+            timestamps=np.array(timestamps, dtype=np.int64),
+            author_days=np.array(author_days, dtype=np.int32),
+            file_counts=np.array(file_counts, dtype=np.int32),
+            message_buffer=MESSAGE_SEPARATOR.join(messages),
+            message_offsets=cls._offsets(messages),
+            path_offsets=np.array(path_offsets, dtype=np.int64),
+            path_ids=np.array(path_ids, dtype=np.int32),
+            paths=list(path_index),
+        )
+
+    def __len__(self):
+        return len(self.hexshas)
+
+    def hexsha(self, row) -> str:
+        return self.hexshas[row].decode()
+
+    def message(self, row) -> str:
+        start = self.message_offsets[row]
+        end = self.message_offsets[row + 1] - 1 if row + 1 < len(self) else len(self.message_buffer)
+        return self.message_buffer[start:end]
+
+    def author_mask(self, author_name):
+        """Rows authored by exactly `author_name`."""
+        author_id = self._author_index.get(author_name)
+        if author_id is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.author_ids == author_id
+
+    def date_mask(self, start_date, end_date):
+        """Rows whose local author date lies in `start_date`..`end_date`, both inclusive."""
+        return (self.author_days >= start_date.toordinal()) & (self.author_days <= end_date.toordinal())
+
+    def message_mask(self, matcher):
+        """
+        Rows whose message `matcher` (a `matching.KeywordMatcher`) finds a keyword in.
+
+        Plain keywords are searched for in the whole buffer in one pass and each occurrence is mapped back to its
+        row with a binary search over the offsets. Regular expressions could match across messages, so they are
+        applied message by message.
+        """
+        if matcher.regex:
+            return np.fromiter((matcher.search(self.message(row)) for row in range(len(self))), dtype=bool,
+                               count=len(self))
+        buffer, offsets = self._message_search_buffer(matcher.ignore_case)
+        starts = np.fromiter(matcher.iter_match_starts(buffer), dtype=np.int64)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[np.searchsorted(offsets, starts, side="right") - 1] = True
+        return mask
+
+    def path_mask(self, predicate):
+        """Rows changing at least one path `predicate` accepts; the predicate is called once per distinct path."""
+        accepted = np.fromiter((predicate(path) for path in self.paths), dtype=bool, count=len(self.paths))
+        # Running count of accepted changes; a row matches when the count grows over its slice.
+        counts = np.concatenate(([0], np.cumsum(accepted[self.path_ids])))
+        return counts[self.path_offsets[1:]] > counts[self.path_offsets[:-1]]
+
+    def rows(self, mask=None):
+        """The indexes of the rows selected by `mask`, or of all rows."""
+        if mask is None:
+            return np.arange(len(self))
+        return np.flatnonzero(mask)
+
+    def materialize(self, rows, history, chunk_size=MATERIALIZE_CHUNK_SIZE):
+        """
+        Yields the full commit of each row in `rows`, in that order, read from `history`.
+
+        `history` is a `git.Repo` or a `GitLogHistory`; the latter reads each chunk of commits with one `git log`.
+        """
+        for start in range(0, len(rows), chunk_size):
+            commit_hashes = [self.hexsha(row) for row in rows[start:start + chunk_size]]
+            if hasattr(history, "iter_records"):
+                yield from history.iter_records(commit_hashes)
+            else:
+                for commit_hash in commit_hashes:
+                    yield history.commit(commit_hash)
+
+    def _message_search_buffer(self, ignore_case):
+        if not ignore_case:
+            return self.message_buffer, self.message_offsets
+        if self._folded is None:
+            folded = self.message_buffer.lower()
+            if len(folded) == len(self.message_buffer):
+                self._folded = folded, self.message_offsets
+            else:
+                # A few characters lower-case to several; recompute the offsets of the folded messages.
+                messages = [self.message(row).lower() for row in range(len(self))]
+                self._folded = MESSAGE_SEPARATOR.join(messages), self._offsets(messages)
+        return self._folded
+
+    @staticmethod
+    def _offsets(messages):
+        lengths = np.fromiter((len(message) + 1 for message in messages), dtype=np.int64, count=len(messages))
+        return np.concatenate(([0], np.cumsum(lengths)))[:-1].astype(np.int64)
@@ -1,4 +1,6 @@
+import sys
 import git
+import utils
 from abc import ABC, abstractmethod
 from storage import CommitDataStorage
 
@@ -58,34 +60,42 @@ class CommitCommand(Command):
         commit (Commit): The commit object to be processed.
         storage (CommitDataStorage): The data storage object used to store processed commits.
         change_strategy: The object responsible for generating change descriptions.
+        echo (bool): Whether the commit and its changes are printed to stdout. Disable it when stdout carries
+            structured output (JSON Lines, HTML).
 
     Methods:
         execute(): Executes the command.
 
     """
-    def __init__(self, commit, storage: CommitDataStorage, change_strategy):
+    def __init__(self, commit, storage: CommitDataStorage, change_strategy, echo=True):
         self.commit = commit
         self.storage = storage
         self.change_strategy = change_strategy
+        self.echo = echo
 
     def execute(self):
         if self.storage.has_commit(self.commit.hexsha):
-            print(f"Commit {self.commit.hexsha} has already been processed.")
+            print(f"Commit {self.commit.hexsha} has already been processed.", file=sys.stderr)
             return
+        if self.echo:
+            self._echo()
+        self.storage.save(self.commit.hexsha)
 
+    def _echo(self):
+        with utils.git_lock(self.commit):  # Output threads may be reading other commits from the same repository
+            author, date, message, parents = (self.commit.author.name, self.commit.authored_datetime,
+                                              self.commit.message.strip(), self.commit.parents)
         print("-" * 40)
         print("Commit Hash:", self.commit.hexsha)
-        print("Author:", self.commit.author.name)
-        print("Date:", self.commit.authored_datetime)
-        print("Message:", self.commit.message.strip())
+        print("Author:", author)
+        print("Date:", date)
+        print("Message:", message)
 
-        if self.commit.parents:
-            diff = self.commit.parents[0].diff(self.commit)
+        if parents:
+            diff = utils.get_commit_diff(self.commit)  # Shared with the formatters' output generation
             change_description = self.change_strategy.generate(diff)
             print("\nChanges:\n", change_description)
 
-        self.storage.save(self.commit.hexsha)
-
     # Example Usage: Adding Error Handling
 #command = CommitCommand(commit, storage, strategy)
 #decorated_command = ErrorHandlingCommandDecorator(command)
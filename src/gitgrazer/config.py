@@ -27,23 +27,36 @@ class AppConfig(ConfigBase):
                  config_keys=['OPENAI_API_KEY']):  # Add the keys of additional configurations here
         self.config_file = config_file
         self.config_keys = config_keys
+        self._loaded = False
 
     def load_configuration(self):
+        # The singleton is shared by every ConfigManager, so the environment and file are only consulted once.
+        if self._loaded:
+            return
+        self._loaded = True
+        config_data = None
         for key in self.config_keys:
             env_value = os.getenv(key)
             if env_value:
                 self.CONFIGS[key] = env_value
             else:
-                try:
-                    with open(self.config_file, 'r') as f:
-                        config_data = json.load(f)
-                        if key in config_data:
-                            self.CONFIGS[key] = config_data.get(key)
-                        else:
-                            print(f"No value found for {key} in environment variables or config file")
-                except FileNotFoundError:
-                    print(f'Config file "{self.config_file}" not found, and {key} env var not set')
-                    break
+                if config_data is None:
+                    config_data = self._read_config_file()
+                    if config_data is None:
+                        print(f'Config file "{self.config_file}" not found, and {key} env var not set')
+                        break
+                if key in config_data:
+                    self.CONFIGS[key] = config_data.get(key)
+                else:
+                    print(f"No value found for {key} in environment variables or config file")
+
+    def _read_config_file(self):
+        """Parses the config file once; returns None if it does not exist."""
+        try:
+            with open(self.config_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
 
     def get_config_value(self, key):
         return self.CONFIGS.get(key, None)
@@ -0,0 +1,349 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import selectors
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POLL_INTERVAL = 10.0  # Seconds between tip checks of every repository; the only trigger where inotify is unavailable
+CONTROL_HOST = "127.0.0.1"  # The control endpoint is never exposed beyond the local machine
+CONTROL_PORT = 8787
+READ_SIZE = 1 << 16
+
+# inotify(7) constants; the flags of inotify_init1 equal their O_* counterparts.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+REF_EVENTS = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len; followed by a NUL-padded name of `len` bytes
+TOP_LEVEL_REFS = ("packed-refs", "HEAD")  # The only files of the git directory itself that move refs
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") and hasattr(libc, "inotify_add_watch") else None
+
+
+class RefWatcher:
+    """
+    Notices ref updates of one repository through inotify, where available.
+
+    The directory tree under `refs/` is watched recursively (new directories, e.g. for a new remote or a
+    `feature/` branch prefix, are added as they appear), together with `packed-refs` and `HEAD` in the git
+    directory itself. Lock files git writes while updating a ref are ignored, so one update reports one change.
+    Without inotify (other platforms, or libc without it) `fileno` is None and the owner has to poll.
+
+    :param git_dir: The git directory holding the refs (`git.Repo.common_dir` for linked worktrees).
+    :type git_dir: str
+    :param use_inotify: Whether to use inotify when it is available.
+    :type use_inotify: bool
+    """
+    def __init__(self, git_dir, use_inotify=True):
+        self.git_dir = git_dir
+        self._fd = None
+        self._libc = _load_inotify() if use_inotify else None
+        self._watches = {}  # Watch descriptor -> watched directory
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+                self._add_watch(git_dir)
+                self._watch_tree(os.path.join(git_dir, "refs"))
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._fd is not None else "poll"
+
+    def fileno(self):
+        """The inotify file descriptor to wait on, or None when polling."""
+        return self._fd
+
+    def read_events(self) -> bool:
+        """Drains the pending events and returns whether any of them may have moved a ref."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0").decode(
+                    errors="surrogateescape")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed = True
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None or name.endswith(".lock"):
+                    continue
+                if directory == self.git_dir:
+                    changed = changed or name in TOP_LEVEL_REFS
+                    continue
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(os.path.join(directory, name))
+                changed = True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _watch_tree(self, root):
+        for directory, _, _ in os.walk(root):
+            self._add_watch(directory)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), REF_EVENTS)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+
+class WatchedRepository:
+    """
+    A repository kept open by the daemon: its `git.Repo` handle, ref watcher, output writer and dead letters,
+    plus the status reported by the control endpoint.
+
+    :param spec: The `multirepo.RepositorySpec` of the repository.
+    :param repo: The open `git.Repo`.
+    :param output_writer: The writer new commits are appended to.
+    :param dead_letters: The repository's `scheduler.DeadLetterQueue`.
+    :param use_inotify: Whether the ref watcher may use inotify.
+    """
+    def __init__(self, spec, repo, output_writer, dead_letters, use_inotify=True):
+        self.spec = spec
+        self.repo = repo
+        self.output_writer = output_writer
+        self.dead_letters = dead_letters
+        self.watcher = RefWatcher(getattr(repo, "common_dir", repo.git_dir), use_inotify=use_inotify)
+        self.tip = None  # The last tip processed successfully
+        self.processed = 0
+        self.cycles = 0
+        self.last_checked_at = None
+        self.last_processed_at = None
+        self.last_error = None
+        self.running = False  # Guarded by the daemon's lock, like `dirty`
+        self.dirty = False
+
+    def status(self) -> dict:
+        return {
+            "name": self.spec.name, "path": self.spec.path, "ref": self.spec.ref, "watch": self.watcher.mode,
+            "tip": self.tip, "processed_commits": self.processed, "cycles": self.cycles,
+            "last_checked_at": self.last_checked_at, "last_processed_at": self.last_processed_at,
+            "last_error": self.last_error, "running": self.running,
+            "dead_lettered": len(self.dead_letters),
+        }
+
+
+class WatchDaemon:
+    """
+    A long-running process that keeps repositories, storage and the model client open and processes commits as
+    they land.
+
+    One selector waits on the inotify descriptors of all repositories; every `poll_interval` seconds the tips of
+    all repositories are checked as well, which is the only trigger for repositories without inotify and a
+    safety net for the others. A repository whose tip moved is handed to a pool of `workers` threads running
+    `process_new_commits(watched)`, which is expected to process only the new commits (e.g. with an incremental
+    walk) and return how many it processed. Updates arriving while a repository is being processed are coalesced
+    into one more run. Errors are recorded in the repository's status and retried on the next trigger.
+
+    A small HTTP endpoint on `127.0.0.1:control_port` (None to disable) serves:
+        GET /status   JSON status of the daemon and every repository, plus any `status_extras()` sections;
+        GET /metrics  the `metrics` in the Prometheus text format;
+        POST /scan    checks every repository immediately.
+
+    :param repositories: The `WatchedRepository` objects to watch.
+    :param process_new_commits: The callable processing the new commits of one `WatchedRepository`.
+    :param workers: The number of repositories processed concurrently.
+    :param poll_interval: The seconds between tip checks of every repository.
+    :param control_port: The port of the control endpoint, or None.
+    :param metrics: The `instrumentation.Metrics` registry the daemon counts into and `/metrics` serves.
+    :param status_extras: Optional callable returning more sections of `/status`, e.g. model request stats.
+
+    Example usage:
+        daemon = WatchDaemon([watched], functools.partial(main.process_new_commits, ...), metrics=Metrics())
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        daemon.run()  # Returns once stopped
+    """
+    def __init__(self, repositories, process_new_commits, workers=4, poll_interval=POLL_INTERVAL,
+                 control_port=CONTROL_PORT, metrics=None, status_extras=None):
+        self.repositories = list(repositories)
+        self.process_new_commits = process_new_commits
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.control_port = control_port
+        self.metrics = metrics
+        self.status_extras = status_extras
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)  # A full pipe already holds a pending wake-up; never block on it
+        self._scan_requested = False
+        self._executor = None
+        self._server = None
+
+    def run(self):
+        """Watches and processes until `stop` is called; every repository is caught up first."""
+        self.started_at = time.time()
+        if self.control_port is not None:
+            self._server = ThreadingHTTPServer((CONTROL_HOST, self.control_port), _control_handler(self))
+            threading.Thread(target=self._server.serve_forever, name="gitgrazer-control", daemon=True).start()
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_read, selectors.EVENT_READ, None)
+        for watched in self.repositories:
+            if watched.watcher.fileno() is not None:
+                selector.register(watched.watcher.fileno(), selectors.EVENT_READ, watched)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gitgrazer-watch")
+        try:
+            next_poll = 0.0
+            while not self._stopped.is_set():
+                now = time.monotonic()
+                if now >= next_poll or self._take_scan_request():
+                    for watched in self.repositories:
+                        self._schedule(watched)
+                    next_poll = now + self.poll_interval
+                for key, _ in selector.select(max(0.0, next_poll - time.monotonic())):
+                    if key.data is None:
+                        self._drain_wake_pipe()
+                    elif key.data.watcher.read_events():
+                        self._schedule(key.data)
+        finally:
+            selector.close()
+            self._executor.shutdown(wait=True)
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+            for watched in self.repositories:
+                watched.watcher.close()
+            os.close(self._wake_read)
+            os.close(self._wake_write)
+
+    def stop(self):
+        """Stops the daemon; the commits being processed are finished first. Safe to call from signal handlers."""
+        self._stopped.set()
+        self._wake()
+
+    def scan_now(self):
+        """Checks every repository at once instead of waiting for an event or the next poll."""
+        with self._lock:
+            self._scan_requested = True
+        self._wake()
+
+    def status(self) -> dict:
+        with self._lock:
+            repositories = [watched.status() for watched in self.repositories]
+        status = {
+            "started_at": self.started_at,
+            "uptime_s": time.time() - self.started_at if self.started_at else 0.0,
+            "poll_interval_s": self.poll_interval,
+            "repositories": repositories,
+        }
+        if self.status_extras:
+            status.update(self.status_extras())
+        return status
+
+    def _schedule(self, watched):
+        with self._lock:
+            if watched.running:
+                watched.dirty = True
+                return
+            watched.running = True
+        self._executor.submit(self._process, watched)
+
+    def _process(self, watched):
+        while True:
+            self._cycle(watched)
+            with self._lock:
+                if not watched.dirty or self._stopped.is_set():
+                    watched.running = False
+                    return
+                watched.dirty = False
+
+    def _cycle(self, watched):
+        watched.cycles += 1
+        watched.last_checked_at = time.time()
+        try:
+            tip = watched.repo.commit(watched.spec.ref).hexsha
+            if tip == watched.tip:
+                return
+            started = time.perf_counter()
+            processed = self.process_new_commits(watched)
+        except Exception as e:
+            watched.last_error = f"{type(e).__name__}: {e}"
+            if self.metrics:
+                self.metrics.increment("daemon.errors")
+            return
+        watched.tip = tip
+        watched.last_error = None
+        if processed:
+            watched.processed += processed
+            watched.last_processed_at = time.time()
+            if self.metrics:
+                self.metrics.record("daemon.cycle", time.perf_counter() - started, label=watched.spec.name)
+                self.metrics.increment("daemon.commits_processed", processed)
+
+    def _take_scan_request(self):
+        with self._lock:
+            requested, self._scan_requested = self._scan_requested, False
+        return requested
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # A wake-up is already pending, or the daemon has shut down
+
+    def _drain_wake_pipe(self):
+        try:
+            while os.read(self._wake_read, READ_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+
+
+def _control_handler(daemon: WatchDaemon):
+    class ControlHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/status":
+                self._respond(200, "application/json", json.dumps(daemon.status(), indent=2, default=str))
+            elif self.path == "/metrics" and daemon.metrics is not None:
+                self._respond(200, "text/plain; version=0.0.4", daemon.metrics.to_prometheus())
+            else:
+                self._respond(404, "text/plain", "Not found\n")
+
+        def do_POST(self):
+            if self.path == "/scan":
+                daemon.scan_now()
+                self._respond(202, "text/plain", "Scan requested\n")
+            else:
+                self._respond(404, "text/plain", "Not found\n")
+
+        def _respond(self, status, content_type, body):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the daemon's own output
+
+    return ControlHandler
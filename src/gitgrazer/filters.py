@@ -1,17 +1,65 @@
 from abc import ABC, abstractmethod
 import datetime
+import git
+from matching import KeywordMatcher
+
+# Characters with a special meaning in git's default (POSIX basic) regular expressions.
+_BRE_SPECIAL_CHARACTERS = set('\\.[]*^$')
+
+
+def _escape_bre(text, ignore_case=False):
+    """Escapes `text` for use as a literal in a git basic regular expression, optionally matching any case."""
+    escaped = []
+    for character in text:
+        if ignore_case and character.lower() != character.upper():
+            escaped.append(f"[{character.lower()}{character.upper()}]")
+        elif character in _BRE_SPECIAL_CHARACTERS:
+            escaped.append("\\" + character)
+        else:
+            escaped.append(character)
+    return "".join(escaped)
+
 
 class CommitFilter(ABC):
     """
     Abstract base class for commit filters.
 
-    The CommitFilter class defines the interface for implementing commit filters.
+    The CommitFilter class defines the interface for implementing commit filters. Filters that git can evaluate
+    natively also override `rev_list_args` so that `CommitSearchManager.search` can push them down into
+    `git rev-list`; `is_match` remains the fallback for everything else. Filters that can be evaluated over a
+    whole `columnar.CommitTable` at once override `mask` for `CommitSearchManager.search_table`.
+
+    :cvar pushdown_is_exact: Whether the rev-list arguments select exactly the commits `is_match` accepts. When
+        False, the pushed-down arguments only narrow the walk and `is_match` is still applied afterwards to the
+        commits `needs_recheck` names.
 
     """
+    pushdown_is_exact = True
+
     @abstractmethod
     def is_match(self, commit) -> bool:
         pass
 
+    def rev_list_args(self):
+        """
+        Returns the GitPython `iter_commits` keyword arguments implementing this filter, or None when the filter
+        can only be evaluated in Python.
+        """
+        return None
+
+    def needs_recheck(self, commit) -> bool:
+        """
+        Whether a commit selected by the pushed-down arguments of an inexact filter still has to pass `is_match`.
+        """
+        return True
+
+    def mask(self, table):
+        """
+        Returns a boolean array selecting the rows of `table` (a `columnar.CommitTable`) this filter accepts, or
+        None when the filter can only be evaluated on materialized commits with `is_match`.
+        """
+        return None
+
 class AuthorFilter(CommitFilter):
     """
     Represents a filter that checks if a commit's author name matches a given author name.
@@ -25,6 +73,14 @@ class AuthorFilter(CommitFilter):
     def is_match(self, commit):
         return commit.author.name == self.author_name
 
+    def rev_list_args(self):
+        # git matches --author against "Name <email>", so anchoring on both sides makes the match exact.
+        # --basic-regexp pins the pattern syntax whatever grep.patternType the user configured.
+        return {"author": f"^{_escape_bre(self.author_name)} <", "basic_regexp": True}
+
+    def mask(self, table):
+        return table.author_mask(self.author_name)
+
 class DateFilter(CommitFilter):
     """
     A filter used to match commits within a specific date range.
@@ -34,6 +90,10 @@ class DateFilter(CommitFilter):
     :param end_date: The end date of the range.
     :type end_date: datetime.date
     """
+    # git's --since/--until compare committer dates, while this filter uses author dates, so only a conservative
+    # lower bound is pushed down and is_match still decides.
+    pushdown_is_exact = False
+
     def __init__(self, start_date: datetime.date, end_date: datetime.date):
         self.start_date = start_date
         self.end_date = end_date
@@ -42,11 +102,26 @@ class DateFilter(CommitFilter):
         commit_date = commit.authored_datetime.date()
         return self.start_date <= commit_date <= self.end_date
 
+    def rev_list_args(self):
+        # A commit is committed no earlier than it is authored; the extra day absorbs timezone differences.
+        since = self.start_date - datetime.timedelta(days=1)
+        return {"since": f"{since.isoformat()} 00:00:00"}
+
+    def mask(self, table):
+        return table.date_mask(self.start_date, self.end_date)
+
 class MessageKeywordFilter(CommitFilter):
     """A filter that matches commits based on specific keywords in their commit messages.
 
+    The keywords are compiled once into a `matching.KeywordMatcher`, so each message is scanned in a single pass
+    no matter how many keywords (ticket IDs, component tags, ...) are loaded.
+
     :param keywords: A list of keywords to search for in commit messages.
     :type keywords: list of str
+    :param whole_word: Whether keywords must match whole words rather than any substring.
+    :type whole_word: bool
+    :param regex: Whether keywords are regular expressions.
+    :type regex: bool
 
     :inherits: CommitFilter
 
@@ -55,13 +130,73 @@ class MessageKeywordFilter(CommitFilter):
     >>> commit = Commit('Fixed a bug in the login functionality')
     >>> filter.is_match(commit)
     True
+    >>> filter.matched_keywords(commit)
+    ['bug', 'fix']
     """
-    def __init__(self, keywords):
-        self.keywords = keywords
+    def __init__(self, keywords, whole_word=False, regex=False):
+        self.keywords = list(keywords)  # The matcher ignores case itself and reports matches in these spellings
+        self.whole_word = whole_word
+        self.regex = regex
+        self._matcher = KeywordMatcher(self.keywords, ignore_case=True, whole_word=whole_word, regex=regex)
 
     def is_match(self, commit):
-        message = commit.message.lower()  # Case-insensitive search
-        return any(keyword in message for keyword in self.keywords)
+        return self._matcher.search(commit.message)
+
+    def matched_keywords(self, commit):
+        return self._matcher.matches(commit.message)
+
+    def rev_list_args(self):
+        # Multiple --grep patterns are OR-ed by git. Case-insensitivity is spelled out per character rather than
+        # with --regexp-ignore-case, which would also make any pushed-down --author pattern case-insensitive.
+        # Keywords spanning lines, word-boundary and regex matching are only evaluated in Python.
+        if not self.keywords or self.whole_word or self.regex or any("\n" in keyword for keyword in self.keywords):
+            return None
+        return {"grep": [_escape_bre(keyword, ignore_case=True) for keyword in self.keywords], "basic_regexp": True}
+
+    def mask(self, table):
+        return table.message_mask(self._matcher)
+
+
+class PathFilter(CommitFilter):
+    """
+    A filter that matches commits touching at least one of the given paths.
+
+    Paths name files or directories relative to the repository root. When pushed down they become git pathspecs
+    walked with `--full-history`, which keeps every commit touching them. `is_match` compares a merge with its
+    first parent only, whereas git also keeps merges that differ from any other parent, so merges are rechecked.
+
+    :param paths: The paths to filter for.
+    :type paths: list of str
+    """
+    pushdown_is_exact = False
+
+    def __init__(self, paths):
+        self.paths = [path.rstrip("/") for path in paths]
+
+    def is_match(self, commit):
+        return any(self._touches(changed) for changed in self._changed_paths(commit))
+
+    def rev_list_args(self):
+        return {"paths": list(self.paths), "full_history": True}
+
+    def needs_recheck(self, commit):
+        return len(commit.parents) > 1
+
+    def mask(self, table):
+        return table.path_mask(self._touches)
+
+    @staticmethod
+    def _changed_paths(commit):
+        # Both sides of every change, so a renamed file matches its old and its new path. The keys of
+        # `commit.stats.files` would name it "old => new" instead.
+        changes = getattr(commit, "changes", None)  # Already extracted by the bulk git log parser
+        if changes is None:
+            changes = commit.parents[0].diff(commit) if commit.parents else commit.diff(git.NULL_TREE)
+        for change in changes:
+            yield from {path for path in (change.a_path, change.b_path) if path}
+
+    def _touches(self, changed_path):
+        return any(changed_path == path or changed_path.startswith(path + "/") for path in self.paths)
 
 class CommitObserver(ABC):
     """
@@ -104,3 +239,85 @@ class CommitSearchManager:
                     observer.on_commit_match(commit)
                 return True
         return False
+
+    def compile_rev_list_args(self):
+        """
+        Splits the registered filters into git-side and Python-side work.
+
+        :return: A tuple of the `iter_commits` keyword arguments for all filters git can evaluate, and the list
+            of filters that still have to be checked with `is_match`. A filter whose arguments would clash with
+            an earlier one (git OR-s repeated --author/--grep options, whereas filters are AND-ed) stays in Python.
+        """
+        rev_list_args, python_filters, narrowing_filters = self._split_filters()
+        return rev_list_args, python_filters + narrowing_filters
+
+    def _split_filters(self):
+        # Filters evaluated in Python only, and pushed-down filters whose matches `is_match` may still reject.
+        rev_list_args = {}
+        python_filters = []
+        narrowing_filters = []
+        for commit_filter in self._filters:
+            args = commit_filter.rev_list_args()
+            if args is None or any(key in rev_list_args and rev_list_args[key] != value for key, value in args.items()):
+                python_filters.append(commit_filter)
+                continue
+            rev_list_args.update(args)
+            if not commit_filter.pushdown_is_exact:
+                narrowing_filters.append(commit_filter)
+        return rev_list_args, python_filters, narrowing_filters
+
+    def search(self, repo, rev="HEAD", **kwargs):
+        """
+        Yields the commits reachable from `rev` that match every filter, notifying observers of each match.
+
+        Filters are pushed down into `git rev-list` where possible, so git skips non-matching commits natively.
+        `max_count` limits the number of *matching* commits returned: it is passed to git when git evaluates every
+        filter exactly, and counted here when some commits are still checked in Python.
+
+        :param repo: A `git.Repo`, or any object offering a compatible `iter_commits`.
+        :param rev: The revision or range to walk.
+        :param kwargs: Additional `iter_commits` keyword arguments, e.g. `max_count`.
+        """
+        rev_list_args, python_filters, narrowing_filters = self._split_filters()
+        max_count = kwargs.pop("max_count", None) if python_filters or narrowing_filters else None
+        matched = 0
+        for commit in repo.iter_commits(rev, **{**rev_list_args, **kwargs}):
+            if max_count is not None and matched >= max_count:
+                return
+            if not all(f.is_match(commit) for f in python_filters) \
+                    or not all(f.is_match(commit) for f in narrowing_filters if f.needs_recheck(commit)):
+                continue
+            for observer in self._observers:
+                observer.on_commit_match(commit)
+            matched += 1
+            yield commit
+
+    def search_table(self, table, history, max_count=None):
+        """
+        Yields the commits of `table` (a `columnar.CommitTable`) that match every filter, notifying observers of
+        each match.
+
+        The masks of all filters supporting them are AND-ed over the whole table in one vectorized pass; only the
+        surviving rows are read from `history` as full commits, and the remaining filters are applied to those.
+
+        :param table: The columnar index of the history to search.
+        :param history: A `git.Repo` or `GitLogHistory` the commits of the table are read from.
+        :param max_count: The maximum number of matching commits to yield.
+        """
+        combined = None
+        residual_filters = []
+        for commit_filter in self._filters:
+            mask = commit_filter.mask(table)
+            if mask is None:
+                residual_filters.append(commit_filter)
+            else:
+                combined = mask if combined is None else combined & mask
+        matched = 0
+        for commit in table.materialize(table.rows(combined), history):
+            if max_count is not None and matched >= max_count:
+                return
+            if all(f.is_match(commit) for f in residual_filters):
+                for observer in self._observers:
+                    observer.on_commit_match(commit)
+                matched += 1
+                yield commit
@@ -1,7 +1,12 @@
+import html
+import sys
 from abc import ABC, abstractmethod
 from models import CommitOutput, ChangeDescription
+from payloads import summarize_diff
 import utils
 
+WRITE_BUFFER_SIZE = 1 << 16  # Buffer of files opened by the writers; rendered commits are written, never collected
+
 
 class CommitOutputFormatter(ABC):
     """
@@ -14,7 +19,10 @@ class CommitOutputFormatter(ABC):
     def format(self, commit) -> str:
         pass
 
-    def _build_output(self, commit) -> ChangeDescription:
+    def _build_output(self, commit) -> CommitOutput:
+        # Outputs built ahead of time (e.g. by the concurrent pipeline) are formatted as-is.
+        if isinstance(commit, CommitOutput):
+            return commit
         return utils.generate_commit_output(commit)
 
 
@@ -34,19 +42,30 @@ class TextCommitOutputFormatter(CommitOutputFormatter):
 
     def format(self, commit: CommitOutput) -> str:
         commit_output = self._build_output(commit)
-        output_parts = [
-            self.SEPARATOR,
-            f"Commit Hash: {commit_output.commit_hash}",
-            f"Author: {commit_output.author}",
-            f"Date: {commit_output.date}",
-            f"Message: {commit_output.message.strip()}",
-            f"Diff Summary: {commit_output.diff_summary}"
-            f"Changes: {commit_output.change_description}",
-
-        ]
+        description = commit_output.change_description
+        diff_summary = description.diff_summary if description is not None else commit_output.diff_summary
+        output_parts = self.header_lines(commit_output.commit_hash, commit_output.author, commit_output.date,
+                                         commit_output.message, diff_summary)
+        output_parts[-1] += description.content if description is not None else "None"
+        if commit_output.reused_from:
+            output_parts.append(f"Description reused from: {commit_output.reused_from}")
         formatted_output = "\n".join(output_parts)
         return formatted_output
 
+    def header_lines(self, commit_hash, author, date, message, diff_summary) -> list:
+        """Returns the lines of a commit up to its description, the last one being the `Changes: ` prefix."""
+        if diff_summary is not None:
+            diff_summary = diff_summary.rstrip("\n")
+        return [
+            self.SEPARATOR,
+            f"Commit Hash: {commit_hash}",
+            f"Author: {author}",
+            f"Date: {date}",
+            f"Message: {message.strip()}",
+            f"Diff Summary: {diff_summary}",
+            "Changes: ",
+        ]
+
 
 class HTMLCommitOutputFormatter(CommitOutputFormatter):
     """
@@ -73,6 +92,192 @@ class HTMLCommitOutputFormatter(CommitOutputFormatter):
         return utils.sanitize_for_html(commit_info)
 
 
+class CommitOutputWriter(ABC):
+    """
+    Abstract base class for writers streaming formatted commits to a file or stdout.
+
+    Each commit is rendered and written as soon as `write` is called, so memory stays flat however many commits
+    are written. Header and footer (if the format has them) are written exactly once, on the first `write` (or
+    `open`) and on `close`. Files are opened with a large buffer; interactive streams are flushed after every
+    commit so output appears as commits complete.
+
+    :param output: A file path, an open text stream, or None for stdout.
+    :param flush_every: Flush after this many commits; defaults to 1 for terminals and 0 (never) otherwise.
+    :type flush_every: int
+    :param append: Whether a file path is appended to instead of truncated.
+    :type append: bool
+
+    Example usage:
+        with TextCommitOutputWriter("history.txt") as writer:
+            for commit in commits:
+                writer.write(commit)
+    """
+    def __init__(self, output=None, flush_every=None, append=False):
+        if isinstance(output, str):
+            self._stream = open(output, "a" if append else "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+            self._owns_stream = True
+        else:
+            self._stream = output if output is not None else sys.stdout
+            self._owns_stream = False
+        if flush_every is None:
+            flush_every = 1 if getattr(self._stream, "isatty", lambda: False)() else 0
+        self.flush_every = flush_every
+        self.written = 0
+        self._opened = False
+        self._closed = False
+
+    def open(self):
+        if not self._opened:
+            self._opened = True
+            self._stream.write(self._header())
+
+    def write(self, commit):
+        """Renders and writes one commit (a git commit or a prebuilt `CommitOutput`)."""
+        text = self._render(self._build_output(commit))  # Rendered first, so a failing commit writes nothing
+        self.open()
+        self._stream.write(text)
+        self.written += 1
+        if self.flush_every and self.written % self.flush_every == 0:
+            self._stream.flush()
+
+    def flush(self):
+        """Flushes the commits written so far, e.g. at the end of a watch cycle."""
+        if not self._closed:
+            self._stream.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.open()
+        self._stream.write(self._footer())
+        if self._owns_stream:
+            self._stream.close()
+        else:
+            self._stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @abstractmethod
+    def _render(self, commit_output: CommitOutput) -> str:
+        pass
+
+    def _header(self) -> str:
+        return ""
+
+    def _footer(self) -> str:
+        return ""
+
+    @staticmethod
+    def _build_output(commit) -> CommitOutput:
+        if isinstance(commit, CommitOutput):
+            return commit
+        return utils.generate_commit_output(commit)
+
+
+class TextCommitOutputWriter(CommitOutputWriter):
+    """
+    Writes commits in the format of `TextCommitOutputFormatter`, one block per commit.
+
+    With `stream_tokens`, a commit's metadata is written immediately and its description follows token by token as
+    the model produces it, so the first bytes appear well before the answer is complete. Commits already built
+    (`CommitOutput`) and descriptions that need no model call are written whole.
+
+    :param stream_tokens: Whether to stream model answers into the output.
+    :type stream_tokens: bool
+    """
+    def __init__(self, output=None, flush_every=None, stream_tokens=False, append=False):
+        super().__init__(output, flush_every, append)
+        self.stream_tokens = stream_tokens
+        self._formatter = TextCommitOutputFormatter()
+
+    def write(self, commit):
+        if not self.stream_tokens or isinstance(commit, CommitOutput):
+            return super().write(commit)
+        self.open()
+        # The diff is memoized, so summarizing it up front costs no second diff when the description is built.
+        diff_summary = summarize_diff(utils.get_commit_diff(commit)) if commit.parents else None
+        self._stream.write("\n".join(self._formatter.header_lines(commit.hexsha, commit.author.name,
+                                                                  commit.authored_datetime, commit.message,
+                                                                  diff_summary)))
+        self._stream.flush()
+        streamed = []
+
+        def forward(token):
+            streamed.append(token)
+            self._stream.write(token)
+            self._stream.flush()
+        try:
+            commit_output = utils.generate_commit_output(commit, on_token=forward)
+        except Exception as e:
+            self._stream.write(f"\n[Description failed: {e}]\n")
+            raise
+        description = commit_output.change_description
+        if not streamed:
+            self._stream.write(description.content if description is not None else "None")
+        self._stream.write("\n")
+        if commit_output.reused_from:
+            self._stream.write(f"Description reused from: {commit_output.reused_from}\n")
+        self.written += 1
+        self._stream.flush()
+
+    def _render(self, commit_output: CommitOutput) -> str:
+        return self._formatter.format(commit_output) + "\n"
+
+
+class HTMLCommitOutputWriter(CommitOutputWriter):
+    """
+    Writes a complete, self-contained HTML report: the document head once, a section per commit, and a footer
+    with the number of commits once the writer is closed.
+
+    :param title: The title of the report.
+    :type title: str
+    """
+    def __init__(self, output=None, flush_every=None, title="Commit history", append=False):
+        super().__init__(output, flush_every, append)
+        self.title = title
+
+    def _header(self) -> str:
+        title = html.escape(self.title)
+        return (
+            "<!DOCTYPE html>\n<html lang='en'>\n<head>\n<meta charset='utf-8'>\n"
+            f"<title>{title}</title>\n"
+            "<style>\n"
+            "body { font-family: sans-serif; max-width: 60rem; margin: 2rem auto; line-height: 1.4; }\n"
+            ".commit { border-top: 1px solid #ccc; padding: 0.5rem 0; }\n"
+            ".commit h2 { font-family: monospace; font-size: 1rem; }\n"
+            ".commit dt { font-weight: bold; }\n"
+            "</style>\n</head>\n<body>\n"
+            f"<h1>{title}</h1>\n"
+        )
+
+    def _render(self, commit_output: CommitOutput) -> str:
+        fields = [("Author", commit_output.author), ("Date", commit_output.date),
+                  ("Message", commit_output.message)]
+        description = commit_output.change_description
+        if description is not None:
+            fields += [("Files", description.diff_summary), ("Changes", description.content)]
+        if commit_output.reused_from:
+            fields.append(("Description reused from", commit_output.reused_from))
+        items = "".join(f"<dt>{name}</dt><dd>{utils.sanitize_for_html(html.escape(str(value)).strip())}</dd>\n"
+                        for name, value in fields)
+        return (f"<section class='commit'>\n<h2>{html.escape(commit_output.commit_hash)}</h2>\n"
+                f"<dl>\n{items}</dl>\n</section>\n")
+
+    def _footer(self) -> str:
+        return f"<footer><p>{self.written} commits</p></footer>\n</body>\n</html>\n"
+
+
+class JsonLinesCommitOutputWriter(CommitOutputWriter):
+    """Writes one JSON object per line and commit, the serialized `CommitOutput`, for downstream tooling."""
+    def _render(self, commit_output: CommitOutput) -> str:
+        return commit_output.model_dump_json() + "\n"
+
+
 class CommitOutputFactory:
     """
     CommitOutputFactory
@@ -103,6 +308,7 @@ class CommitOutputFactory:
 
     Methods:
         get_formatter: Gets the formatter for a given output type.
+        get_writer: Gets the streaming writer for a given output type ("text", "html" or "jsonl").
 
     Exceptions:
         ValueError: Raised when an invalid output type is provided.
@@ -110,6 +316,7 @@ class CommitOutputFactory:
     Usage:
         output_factory = CommitOutputFactory()
         output_formatter = output_factory.get_formatter("text")
+        output_writer = output_factory.get_writer("html", "report.html")
     """
     @staticmethod
     def get_formatter(output_type: str) -> CommitOutputFormatter:
@@ -119,3 +326,15 @@ class CommitOutputFactory:
             return HTMLCommitOutputFormatter()
         else:
             raise ValueError("Invalid output type")
+
+    @staticmethod
+    def get_writer(output_type: str, output=None, stream_tokens=False, flush_every=None,
+                   append=False) -> CommitOutputWriter:
+        if output_type == "text":
+            return TextCommitOutputWriter(output, flush_every, stream_tokens=stream_tokens, append=append)
+        elif output_type == "html":
+            return HTMLCommitOutputWriter(output, flush_every, append=append)
+        elif output_type == "jsonl":
+            return JsonLinesCommitOutputWriter(output, flush_every, append=append)
+        else:
+            raise ValueError("Invalid output type")
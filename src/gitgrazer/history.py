@@ -0,0 +1,307 @@
+import datetime
+import subprocess
+from typing import NamedTuple
+
+# Control characters used to delimit records and fields; they do not occur in commit metadata in practice.
+RECORD_SEPARATOR = "\x1e"
+FIELD_SEPARATOR = "\x1f"
+LOG_FORMAT = "%x1e%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%B%x1f"
+HEADER_FIELDS = 6
+READ_SIZE = 1 << 16
+
+
+class Author(NamedTuple):
+    """The subset of GitPython's `Actor` used by filters, commands and formatters."""
+    name: str
+    email: str
+
+
+class CommitStats(NamedTuple):
+    """The subset of GitPython's `Stats`: per-file line counts keyed by path, plus their totals."""
+    total: dict
+    files: dict
+
+
+class FileChange:
+    """
+    A single file change of a commit, as reported by `git log --raw --numstat`.
+
+    The attribute names mirror GitPython's `Diff`, so a list of `FileChange` objects can be passed wherever a
+    `DiffIndex` is expected (change description strategies, `utils.generate_change_description`). As with
+    GitPython, `a_path` and `b_path` are both set unless the file was renamed or copied.
+
+    :ivar insertions: The number of added lines, or None for binary files.
+    :ivar deletions: The number of removed lines, or None for binary files.
+    :ivar diff: The patch text (bytes) when it was extracted, as in GitPython's `create_patch=True` diffs.
+    """
+    __slots__ = ("change_type", "a_path", "b_path", "a_mode", "b_mode", "a_blob_id", "b_blob_id", "score",
+                 "insertions", "deletions", "diff")
+
+    def __init__(self, change_type, a_path, b_path, a_mode=None, b_mode=None, a_blob_id=None, b_blob_id=None,
+                 score=None):
+        self.change_type = change_type
+        self.a_path = a_path
+        self.b_path = b_path
+        self.a_mode = a_mode
+        self.b_mode = b_mode
+        self.a_blob_id = a_blob_id
+        self.b_blob_id = b_blob_id
+        self.score = score
+        self.insertions = 0
+        self.deletions = 0
+        self.diff = None
+
+    @property
+    def new_file(self):
+        return self.change_type == "A"
+
+    @property
+    def deleted_file(self):
+        return self.change_type == "D"
+
+    @property
+    def renamed_file(self):
+        return self.change_type == "R"
+
+    @property
+    def binary(self):
+        return self.insertions is None
+
+    def __repr__(self):
+        return f"FileChange({self.change_type} {self.a_path!r} -> {self.b_path!r})"
+
+
+class CommitRecord:
+    """
+    A lightweight, fully materialized commit produced by `GitLogHistory`.
+
+    It offers the attributes of GitPython's `Commit` that the filters, `CommitCommand` and the formatters use
+    (`hexsha`, `parents`, `author`, `authored_datetime`, `message`, `stats`), plus the first-parent file
+    `changes`, so no further object database access is needed. Parents are hex SHAs rather than commit objects.
+
+    :ivar repo_path: The repository the record was read from, when its changes carry no patch text; descriptions
+        then read the patch from there (see `utils.get_commit_diff`).
+    """
+    __slots__ = ("hexsha", "parents", "author", "authored_datetime", "message", "changes", "repo_path")
+
+    def __init__(self, hexsha, parents, author, authored_datetime, message, changes, repo_path=None):
+        self.hexsha = hexsha
+        self.parents = parents
+        self.author = author
+        self.authored_datetime = authored_datetime
+        self.message = message
+        self.changes = changes
+        self.repo_path = repo_path
+
+    @property
+    def summary(self):
+        return self.message.split("\n", 1)[0]
+
+    @property
+    def stats(self) -> CommitStats:
+        files = {}
+        for change in self.changes:
+            insertions = change.insertions or 0
+            deletions = change.deletions or 0
+            files[change.b_path] = {"insertions": insertions, "deletions": deletions, "lines": insertions + deletions}
+        total = {
+            "insertions": sum(f["insertions"] for f in files.values()),
+            "deletions": sum(f["deletions"] for f in files.values()),
+            "lines": sum(f["lines"] for f in files.values()),
+            "files": len(files),
+        }
+        return CommitStats(total=total, files=files)
+
+    def __repr__(self):
+        return f"CommitRecord({self.hexsha})"
+
+
+def parse_log_record(record: str) -> CommitRecord:
+    """Parses one `LOG_FORMAT` record (without its leading separator) followed by its raw and numstat entries."""
+    fields = record.split(FIELD_SEPARATOR, HEADER_FIELDS)
+    hexsha, parents, author_name, author_email, authored_date, message = fields[:HEADER_FIELDS]
+    changes = _parse_changes(fields[HEADER_FIELDS] if len(fields) > HEADER_FIELDS else "")
+    return CommitRecord(
+        hexsha=hexsha,
+        parents=parents.split() if parents else [],
+        author=Author(author_name, author_email),
+        authored_datetime=datetime.datetime.fromisoformat(authored_date),
+        message=message,
+        changes=changes,
+    )
+
+
+def _parse_changes(payload):
+    tokens = payload.split("\0")
+    changes = []
+    by_path = {}
+    numstat_index = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i].lstrip("\n")
+        i += 1
+        if not token:
+            continue
+        if token.startswith(":"):
+            # ":<a_mode> <b_mode> <a_blob> <b_blob> <status>[score]" followed by one or two paths.
+            a_mode, b_mode, a_blob_id, b_blob_id, status = token[1:].split(" ")
+            change_type, score = status[0], status[1:]
+            if change_type in "RC":
+                a_path, b_path = tokens[i], tokens[i + 1]
+                i += 2
+            else:
+                a_path = b_path = tokens[i]
+                i += 1
+            change = FileChange(change_type, a_path, b_path, a_mode, b_mode,
+                                None if change_type == "A" else a_blob_id,
+                                None if change_type == "D" else b_blob_id,
+                                int(score) if score else None)
+            changes.append(change)
+            by_path.setdefault(b_path, change)
+        else:
+            # "<insertions>\t<deletions>\t<path>", or with an empty path followed by the old and new paths.
+            insertions, deletions, path = token.split("\t", 2)
+            if not path:
+                path = tokens[i + 1]
+                i += 2
+            # numstat entries come in the same order as the raw entries; fall back to a path lookup otherwise.
+            change = changes[numstat_index] if numstat_index < len(changes) else None
+            if change is None or change.b_path != path:
+                change = by_path.get(path)
+            numstat_index += 1
+            if change is not None:
+                change.insertions = None if insertions == "-" else int(insertions)
+                change.deletions = None if deletions == "-" else int(deletions)
+    return changes
+
+
+def _to_cli_options(options):
+    """Turns GitPython-style keyword arguments (`max_count=10`, `grep=[...]`) into git command line options."""
+    arguments = []
+    for key, value in options.items():
+        if value is None or value is False:
+            continue
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            arguments.append(flag)
+        elif isinstance(value, (list, tuple)):
+            arguments.extend(f"{flag}={item}" for item in value)
+        else:
+            arguments.append(f"{flag}={value}")
+    return arguments
+
+
+class GitLogHistory:
+    """
+    Bulk history extraction through a single streamed `git log --raw --numstat -z` process.
+
+    Instead of one `git cat-file`/`diff-tree` round trip per commit, the whole walk is produced by one git
+    process and parsed incrementally into `CommitRecord` objects that already carry their first-parent file
+    changes and line counts. `iter_commits` accepts the same revision and keyword arguments as
+    `git.Repo.iter_commits`, so an instance can be passed to `CommitSearchManager.search` in place of a repo.
+
+    Merge commits are diffed against their first parent (`--diff-merges=first-parent`, git 2.31 or newer),
+    matching `utils.get_commit_diff`. The log carries no patches: the records serve walks, filters and metadata,
+    and the patches of the commits that are described are read like in the default mode, so both modes send the
+    same payloads to the model and share cache entries.
+
+    :param repo_path: The path of the repository (or any directory inside its work tree).
+    :type repo_path: str
+    :param git_executable: The git binary to run.
+    :type git_executable: str
+
+    Example usage:
+        history = GitLogHistory('.')
+        for record in history.iter_commits('main', max_count=100):
+            print(record.hexsha, [change.b_path for change in record.changes])
+    """
+    def __init__(self, repo_path='.', git_executable='git'):
+        self.repo_path = repo_path
+        self.git_executable = git_executable
+
+    def commit(self, rev="HEAD") -> CommitRecord:
+        """Returns the record of a single revision, like `git.Repo.commit`."""
+        for record in self.iter_commits(rev, max_count=1):
+            return record
+        raise ValueError(f"Revision {rev!r} does not name a commit")
+
+    def close(self):
+        """Releases the resources of the history. `GitLogHistory` holds none; subclasses may."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_ancestor(self, ancestor_rev, rev) -> bool:
+        """Returns whether `ancestor_rev` is an ancestor of `rev`, like `git.Repo.is_ancestor`."""
+        result = subprocess.run(
+            [self.git_executable, "-C", self.repo_path, "merge-base", "--is-ancestor", ancestor_rev, rev],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        if result.returncode > 1:
+            raise RuntimeError(f"git merge-base failed: {result.stderr.decode(errors='replace')}")
+        return result.returncode == 0
+
+    def iter_commits(self, rev="HEAD", paths=None, **kwargs):
+        arguments = [*_to_cli_options(kwargs), rev, "--"]
+        if paths:
+            # --full-diff keeps the records' file changes complete; the paths only select the commits.
+            arguments = ["--full-diff", *arguments, *([paths] if isinstance(paths, str) else paths)]
+        yield from self._log(arguments)
+
+    def iter_records(self, commit_hashes):
+        """
+        Yields the records of the given commits, in the given order, from a single `git log` without walking
+        their ancestry (the commits are passed on stdin).
+        """
+        revisions = "".join(f"{commit_hash}\n" for commit_hash in commit_hashes)
+        if revisions:
+            yield from self._log(["--no-walk=unsorted", "--stdin"], revisions)
+
+    def _log(self, arguments, stdin=None):
+        command = [
+            self.git_executable, "-C", self.repo_path, "log", "-z", "--raw", "--numstat", "--no-abbrev", "-M",
+            "--diff-merges=first-parent", "--no-color", "--no-ext-diff", f"--format={LOG_FORMAT}", *arguments,
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE if stdin is not None else None,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if stdin is not None:
+            # git log reads every revision from stdin before it writes any output, so this cannot deadlock.
+            process.stdin.write(stdin.encode())
+            process.stdin.close()
+        try:
+            for record in self._parse_stream(process.stdout):
+                record.repo_path = self.repo_path
+                yield record
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read()
+            return_code = process.wait()
+        if return_code:
+            raise RuntimeError(f"git log failed with exit code {return_code}: {stderr.decode(errors='replace')}")
+
+    @staticmethod
+    def _parse_stream(stream):
+        separator = RECORD_SEPARATOR.encode()
+        pending = []  # Chunks of the record currently being received
+        while True:
+            chunk = stream.read(READ_SIZE)
+            if not chunk:
+                break
+            if separator not in chunk:
+                pending.append(chunk)
+                continue
+            pieces = chunk.split(separator)
+            pending.append(pieces[0])
+            records = [b"".join(pending), *pieces[1:-1]]
+            # The last piece may be incomplete; keep it until the next separator (or EOF) arrives.
+            pending = [pieces[-1]]
+            for record in records:
+                if record:
+                    yield parse_log_record(record.decode("utf-8", "surrogateescape"))
+        record = b"".join(pending)
+        if record:
+            yield parse_log_record(record.decode("utf-8", "surrogateescape"))
@@ -0,0 +1,76 @@
+from typing import NamedTuple, Optional
+from storage import CommitDataStorage
+
+# How many commits to look back from the new tip when a ref's history was rewritten.
+RESCAN_LIMIT = 200
+
+
+class IncrementalWalk(NamedTuple):
+    """
+    The part of a ref's history that still needs processing.
+
+    :ivar ref: The ref being walked.
+    :ivar tip: The hexsha the ref pointed to when the walk was planned; record it with `complete` afterwards.
+    :ivar rev: The revision or range to pass to `iter_commits`/`CommitSearchManager.search`, or None if the ref
+        has not moved since the last run.
+    :ivar max_count: The bound to pass along with `rev`, or None for an unbounded range.
+    :ivar rescan: True when the previous watermark is not an ancestor of the tip (a force-push or rewrite), in
+        which case the walk may include commits that were already processed.
+    :ivar watermark_key: The key the watermark is stored under, or None to use `ref`.
+    """
+    ref: str
+    tip: str
+    rev: Optional[str]
+    max_count: Optional[int]
+    rescan: bool
+    watermark_key: Optional[str] = None
+
+
+def plan_incremental_walk(repo, ref, storage: CommitDataStorage, rescan_limit=RESCAN_LIMIT,
+                          initial_limit=None, watermark_key=None) -> IncrementalWalk:
+    """
+    Plans a walk over only the commits that arrived on `ref` since the last recorded watermark.
+
+    :param repo: A `git.Repo` or `history.GitLogHistory`.
+    :param ref: The ref to walk, e.g. 'main'.
+    :param storage: The storage holding the per-ref watermarks.
+    :param rescan_limit: The number of commits rescanned from the tip when history was rewritten.
+    :param initial_limit: The number of commits walked on the first run of a ref, or None for all of them.
+    :param watermark_key: The key of the watermark in `storage`, defaulting to `ref`; set it when one storage is
+        shared by several repositories, whose ref names collide.
+    :return: The planned `IncrementalWalk`.
+    """
+    tip = repo.commit(ref).hexsha
+    watermark = storage.get_watermark(watermark_key or ref)
+    if watermark is None:
+        return IncrementalWalk(ref, tip, tip, initial_limit, rescan=False, watermark_key=watermark_key)
+    if watermark == tip:
+        return IncrementalWalk(ref, tip, None, None, rescan=False, watermark_key=watermark_key)
+    try:
+        fast_forward = repo.is_ancestor(watermark, tip)
+    except Exception:
+        # The old tip is gone entirely, e.g. garbage collected after a force-push.
+        fast_forward = False
+    if fast_forward:
+        return IncrementalWalk(ref, tip, f"{watermark}..{tip}", None, rescan=False, watermark_key=watermark_key)
+    return IncrementalWalk(ref, tip, tip, rescan_limit, rescan=True, watermark_key=watermark_key)
+
+
+def iter_incremental_commits(search_manager, repo, walk: IncrementalWalk, storage: CommitDataStorage):
+    """
+    Yields the matching commits of `walk`, skipping ones the storage already holds when rescanning.
+
+    The membership check is a single bulk `has_commits` call over the (bounded) rescan window.
+    """
+    if walk.rev is None:
+        return
+    commits = list(search_manager.search(repo, walk.rev, max_count=walk.max_count))
+    if walk.rescan:
+        processed = storage.has_commits(commit.hexsha for commit in commits)
+        commits = [commit for commit in commits if commit.hexsha not in processed]
+    yield from commits
+
+
+def complete(walk: IncrementalWalk, storage: CommitDataStorage):
+    """Records the walked tip as the ref's new watermark once its commits have been processed."""
+    storage.set_watermark(walk.watermark_key or walk.ref, walk.tip)
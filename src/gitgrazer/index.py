@@ -0,0 +1,272 @@
+import datetime
+import sqlite3
+import threading
+import time
+from models import ChangeDescription, CommitOutput
+import utils
+
+SEARCH_COLUMNS = ("message", "diff_summary", "description")
+UPSERT = (
+    "INSERT INTO commits (commit_hash, author, authored_at, authored_timestamp, authored_date, message,"
+    " diff_summary, description, reused_from) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (commit_hash) DO UPDATE SET author = excluded.author,"
+    " authored_at = excluded.authored_at, authored_timestamp = excluded.authored_timestamp,"
+    " authored_date = excluded.authored_date,"
+    " message = excluded.message, diff_summary = COALESCE(excluded.diff_summary, diff_summary),"
+    " description = COALESCE(excluded.description, description),"
+    " reused_from = COALESCE(excluded.reused_from, reused_from)"
+)
+
+
+def fts_query(text, columns=None) -> str:
+    """
+    Turns free text into an FTS5 query matching rows that contain every word of `text`, in any order.
+
+    Each word is quoted, so punctuation (`PROJ-123`, `utils.py`) is matched literally instead of being parsed as
+    FTS5 syntax. `columns` restricts the match to some of `SEARCH_COLUMNS`.
+    """
+    words = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+    if columns:
+        return f"{{{' '.join(columns)}}} : ({words})"
+    return words
+
+
+class CommitIndex:
+    """
+    A persistent full-text index of commits and their generated descriptions, backed by SQLite FTS5.
+
+    Every indexed `CommitOutput` is stored as a row (hash, author, author date, message, diff summary and change
+    description) and mirrored into an FTS5 table by triggers, so keyword queries over messages, diff summaries and
+    generated descriptions, optionally narrowed by author and date, are answered from the index alone, without
+    walking git or asking the model. Indexing a commit again replaces its row; a missing description keeps the one
+    already indexed. Writes are buffered and grouped into short transactions of `batch_size` rows (or flushed with the
+    first add after `max_batch_seconds`), as in `SqliteCommitDataStorage`; queries flush the buffer first.
+
+    :param filepath: The path to the SQLite database file.
+    :type filepath: str
+    :param batch_size: The number of indexed commits grouped into one transaction.
+    :type batch_size: int
+    :param max_batch_seconds: The age at which buffered commits are flushed regardless of their number.
+    :type max_batch_seconds: float
+
+    Example usage:
+        with CommitIndex('commit_index.sqlite3') as index:
+            index.add(commit_output)
+            for commit_output in index.search('token refresh', author='Ada Lovelace', limit=10):
+                print(commit_output.commit_hash, commit_output.message)
+    """
+    def __init__(self, filepath='commit_index.sqlite3', batch_size=100, max_batch_seconds=1.0):
+        self.filepath = filepath
+        self.batch_size = batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self._pending = []  # Rows not yet written
+        self._batch_started = None
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(filepath, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS commits ("
+            " id INTEGER PRIMARY KEY,"
+            " commit_hash TEXT NOT NULL UNIQUE,"
+            " author TEXT NOT NULL,"
+            " authored_at TEXT,"
+            " authored_timestamp INTEGER,"
+            " authored_date TEXT,"
+            " message TEXT NOT NULL,"
+            " diff_summary TEXT,"
+            " description TEXT,"
+            " reused_from TEXT)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS commits_author ON commits (author COLLATE NOCASE, authored_timestamp)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS commits_authored_date ON commits (authored_date)")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS commits_authored_timestamp ON commits (authored_timestamp)"
+        )
+        try:
+            self._connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS commits_fts USING fts5("
+                " message, diff_summary, description, content='commits', content_rowid='id',"
+                " tokenize='porter unicode61')"
+            )
+        except sqlite3.OperationalError as e:
+            self._connection.close()
+            raise RuntimeError(f"The commit index needs SQLite with FTS5 support: {e}") from e
+        # External content table: the triggers keep the full-text index in step with the rows.
+        self._connection.executescript(
+            "CREATE TRIGGER IF NOT EXISTS commits_ai AFTER INSERT ON commits BEGIN"
+            " INSERT INTO commits_fts (rowid, message, diff_summary, description)"
+            " VALUES (new.id, new.message, new.diff_summary, new.description); END;"
+            "CREATE TRIGGER IF NOT EXISTS commits_ad AFTER DELETE ON commits BEGIN"
+            " INSERT INTO commits_fts (commits_fts, rowid, message, diff_summary, description)"
+            " VALUES ('delete', old.id, old.message, old.diff_summary, old.description); END;"
+            "CREATE TRIGGER IF NOT EXISTS commits_au AFTER UPDATE ON commits BEGIN"
+            " INSERT INTO commits_fts (commits_fts, rowid, message, diff_summary, description)"
+            " VALUES ('delete', old.id, old.message, old.diff_summary, old.description);"
+            " INSERT INTO commits_fts (rowid, message, diff_summary, description)"
+            " VALUES (new.id, new.message, new.diff_summary, new.description); END;"
+        )
+        self._connection.commit()
+
+    def add(self, commit_output: CommitOutput):
+        """Indexes (or re-indexes) one commit output."""
+        row = self._row(commit_output)
+        with self._lock:
+            self._pending.append(row)
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+            if len(self._pending) >= self.batch_size \
+                    or time.monotonic() - self._batch_started >= self.max_batch_seconds:
+                self.flush()
+
+    def has_commit(self, commit_hash) -> bool:
+        with self._lock:
+            self.flush()
+            row = self._connection.execute("SELECT 1 FROM commits WHERE commit_hash = ?", (commit_hash,)).fetchone()
+        return row is not None
+
+    def search(self, text=None, author=None, since=None, until=None, columns=None, limit=20) -> list:
+        """
+        Returns the indexed commits matching every given criterion as `CommitOutput`s, best matches first when
+        searching text and newest first otherwise.
+
+        :param text: Words that must all occur in the message, diff summary or description (see `fts_query`).
+        :param author: The author name, compared ignoring case.
+        :param since: The first local author date (`datetime.date`) to include.
+        :param until: The last local author date (`datetime.date`) to include.
+        :param columns: Restricts `text` to some of `SEARCH_COLUMNS`, e.g. `['description']`.
+        :param limit: The maximum number of results, or None for all.
+        """
+        conditions, parameters = [], []
+        query = "FROM commits c"
+        if text and text.strip():
+            query += " JOIN commits_fts ON commits_fts.rowid = c.id"
+            conditions.append("commits_fts MATCH ?")
+            parameters.append(fts_query(text, columns))
+            order = "commits_fts.rank"
+        else:
+            order = "c.authored_timestamp DESC"
+        if author:
+            conditions.append("c.author = ? COLLATE NOCASE")
+            parameters.append(author)
+        if since:
+            conditions.append("c.authored_date >= ?")
+            parameters.append(since.isoformat())
+        if until:
+            conditions.append("c.authored_date <= ?")
+            parameters.append(until.isoformat())
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {order} LIMIT ?"
+        parameters.append(-1 if limit is None else limit)
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(
+                "SELECT c.commit_hash, c.author, c.authored_at, c.message, c.diff_summary, c.description,"
+                f" c.reused_from {query}", parameters
+            ).fetchall()
+        return [self._to_output(row) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._connection.execute("SELECT COUNT(*) FROM commits").fetchone()[0]
+
+    def optimize(self):
+        """Merges the full-text index segments; worth running after a large backfill."""
+        with self._lock:
+            self.flush()
+            self._connection.execute("INSERT INTO commits_fts (commits_fts) VALUES ('optimize')")
+            self._connection.commit()
+
+    def flush(self):
+        with self._lock:
+            # The write transaction is opened only once the whole batch is ready to be written.
+            self._connection.executemany(UPSERT, self._pending)
+            self._connection.commit()
+            self._pending.clear()
+            self._batch_started = None
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _row(commit_output: CommitOutput):
+        date = commit_output.date
+        if isinstance(date, datetime.datetime):
+            authored_at, timestamp, authored_date = date.isoformat(), int(date.timestamp()), date.date().isoformat()
+        else:
+            authored_at = str(date) if date is not None else None
+            timestamp, authored_date = None, authored_at[:10] if authored_at else None
+        description = commit_output.change_description
+        if description is not None:
+            diff_summary, content = description.diff_summary, description.content
+        else:
+            diff_summary, content = commit_output.diff_summary, None
+        return (commit_output.commit_hash, commit_output.author, authored_at, timestamp, authored_date,
+                commit_output.message, diff_summary, content, commit_output.reused_from)
+
+    @staticmethod
+    def _to_output(row) -> CommitOutput:
+        commit_hash, author, authored_at, message, diff_summary, description, reused_from = row
+        try:
+            date = datetime.datetime.fromisoformat(authored_at) if authored_at else None
+        except ValueError:
+            date = authored_at
+        return CommitOutput(
+            commit_hash=commit_hash,
+            author=author,
+            date=date,
+            message=message,
+            change_description=ChangeDescription(content=description, diff_summary=diff_summary or "")
+            if description is not None else None,
+            diff_summary=diff_summary,
+            reused_from=reused_from,
+        )
+
+
+class IndexingCommitOutputWriter:
+    """
+    Wraps a `formatters.CommitOutputWriter` so that every commit written is also added to a `CommitIndex`.
+
+    The output is built once per run (`utils.generate_commit_output` memoizes it), so indexing a commit after the
+    wrapped writer rendered it costs no second diff or model call. Commits the writer fails on are not indexed.
+
+    :param writer: The writer to wrap.
+    :param index: The index to add the written commits to.
+    :type index: CommitIndex
+    """
+    def __init__(self, writer, index: CommitIndex):
+        self._writer = writer
+        self.index = index
+
+    def write(self, commit):
+        self._writer.write(commit)
+        self.index.add(commit if isinstance(commit, CommitOutput) else utils.generate_commit_output(commit))
+
+    def flush(self):
+        self._writer.flush()
+        self.index.flush()
+
+    def close(self):
+        self._writer.close()
+        self.index.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
@@ -0,0 +1,326 @@
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from commands import Command
+
+SLOWEST_KEPT = 5  # Slowest labelled samples kept per stage, e.g. the commits with the worst tail latency
+QUANTILES = (0.5, 0.9, 0.99)
+SAMPLES_KEPT = 10_000  # Most recent samples per stage the quantiles are computed from; bounds long-running processes
+
+
+class StageStats:
+    """Latency totals, recent samples, error count and slowest labelled samples of one stage."""
+    def __init__(self):
+        self.samples = collections.deque(maxlen=SAMPLES_KEPT)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.slowest = []
+
+    def add(self, seconds, label=None, error=False):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if error:
+            self.errors += 1
+        if label is not None:
+            self.slowest.append((seconds, label))
+            self.slowest.sort(reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def quantile(self, q):
+        ordered = sorted(self.samples)
+        return ordered[max(0, min(len(ordered) - 1, round(q * len(ordered)) - 1))]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_s": self.total,
+            "mean_s": self.total / self.count,
+            **{f"p{round(q * 100)}_s": self.quantile(q) for q in QUANTILES},
+            "max_s": self.max,
+            "slowest": [{"label": label, "seconds": seconds} for seconds, label in self.slowest],
+        }
+
+
+class Metrics:
+    """
+    A thread-safe registry of per-stage timings, counters and gauges for one run.
+
+    Stages are timed with `measure`; the end-of-run report is available as a dict (`report`), as JSON
+    (`write_report`) and in the Prometheus text exposition format (`to_prometheus`/`write_prometheus`), the
+    latter suitable for node_exporter's textfile collector.
+
+    Example usage:
+        metrics = Metrics()
+        with metrics.measure("storage.save", label=commit.hexsha):
+            storage.save(commit.hexsha)
+        metrics.increment("commits.processed")
+        metrics.write_report("metrics.json")
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._counters = {}
+        self._gauges = {}
+        self._started = time.time()
+
+    @contextlib.contextmanager
+    def measure(self, stage, label=None):
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, label=label, error=error)
+
+    def record(self, stage, seconds, label=None, error=False):
+        with self._lock:
+            self._stages.setdefault(stage, StageStats()).add(seconds, label, error)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def set_gauge(self, gauge, value):
+        with self._lock:
+            self._gauges[gauge] = value
+
+    def max_gauge(self, gauge, value):
+        with self._lock:
+            self._gauges[gauge] = max(value, self._gauges.get(gauge, value))
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self._started,
+                "duration_s": time.time() - self._started,
+                "stages": {stage: stats.summary() for stage, stats in sorted(self._stages.items())},
+                "counters": dict(sorted(self._counters.items())),
+                "gauges": dict(sorted(self._gauges.items())),
+            }
+
+    def write_report(self, path):
+        _write_atomically(path, json.dumps(self.report(), indent=2, default=str))
+
+    def to_prometheus(self, prefix="gitgrazer") -> str:
+        report = self.report()
+        lines = [f"# HELP {prefix}_stage_duration_seconds Time spent per pipeline stage call.",
+                 f"# TYPE {prefix}_stage_duration_seconds summary"]
+        for stage, summary in report["stages"].items():
+            for q in QUANTILES:
+                lines.append(f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} '
+                             f'{summary[f"p{round(q * 100)}_s"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {summary["total_s"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {summary["count"]}')
+        lines += [f"# HELP {prefix}_stage_errors_total Pipeline stage calls that raised.",
+                  f"# TYPE {prefix}_stage_errors_total counter"]
+        lines += [f'{prefix}_stage_errors_total{{stage="{stage}"}} {summary["errors"]}'
+                  for stage, summary in report["stages"].items()]
+        lines += [f"# HELP {prefix}_events_total Pipeline event counters.", f"# TYPE {prefix}_events_total counter"]
+        lines += [f'{prefix}_events_total{{name="{name}"}} {value}' for name, value in report["counters"].items()]
+        lines += [f"# HELP {prefix}_gauge Pipeline gauges.", f"# TYPE {prefix}_gauge gauge"]
+        lines += [f'{prefix}_gauge{{name="{name}"}} {value}' for name, value in report["gauges"].items()]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="gitgrazer"):
+        _write_atomically(path, self.to_prometheus(prefix))
+
+
+def _write_atomically(path, text):
+    # Scrapers and readers must never see a half-written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, delete=False, suffix=".tmp") as file:
+        file.write(text)
+    os.replace(file.name, path)
+
+
+class Profiler:
+    """
+    Optional cProfile and tracemalloc capture, switched on only around the instrumented calls.
+
+    Captures may run on several threads at once (concurrent output generation): each thread profiles into its own
+    cProfile profile, and the reports merge them.
+
+    :param cpu: Whether to collect a cProfile profile.
+    :param memory: Whether to trace allocations with tracemalloc (recording each call's peak).
+    """
+    def __init__(self, cpu=False, memory=False):
+        self.cpu = cpu
+        self.memory = memory
+        self._profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def capture(self, metrics: Metrics, stage):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        profile = self._thread_profile() if self.cpu else None
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            if self.memory:
+                metrics.max_gauge(f"{stage}.peak_bytes", tracemalloc.get_traced_memory()[1])
+
+    def cpu_report(self, limit=25, sort="cumulative") -> str:
+        stream = io.StringIO()
+        stats = self._stats(stream)
+        if stats is None:
+            return ""
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump_cpu_stats(self, path):
+        stats = self._stats()
+        if stats is not None:
+            stats.dump_stats(path)
+
+    def _thread_profile(self):
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def _stats(self, stream=None):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        return pstats.Stats(*profiles, stream=stream)
+
+
+class InstrumentedCommandDecorator(Command):
+    """
+    A decorator that times a wrapped command, counts successes and failures, and optionally profiles it.
+
+    Samples are labelled with the commit hash when the wrapped command has one, so the report names the commits
+    with the worst tail latency. Exceptions are recorded and re-raised; combine with
+    `ErrorHandlingCommandDecorator` on the outside to keep the run going.
+
+    :param wrapped_command: The command to be wrapped.
+    :type wrapped_command: Command
+    :param metrics: The registry receiving the measurements.
+    :type metrics: Metrics
+    :param profiler: An optional profiler active while the command executes.
+    :type profiler: Profiler
+    :param stage: The stage name the command is reported under.
+    :type stage: str
+    """
+    def __init__(self, wrapped_command: Command, metrics: Metrics, profiler: Profiler = None,
+                 stage="command.execute"):
+        self._wrapped_command = wrapped_command
+        self._metrics = metrics
+        self._profiler = profiler
+        self._stage = stage
+
+    def execute(self):
+        commit = getattr(self._wrapped_command, "commit", None)
+        label = getattr(commit, "hexsha", None)
+        capture = self._profiler.capture(self._metrics, self._stage) if self._profiler else contextlib.nullcontext()
+        try:
+            with capture, self._metrics.measure(self._stage, label=label):
+                self._wrapped_command.execute()
+        except Exception:
+            self._metrics.increment(f"{self._stage}.failed")
+            raise
+        self._metrics.increment(f"{self._stage}.succeeded")
+
+
+def instrument_methods(target, metrics: Metrics, stage_prefix, methods):
+    """
+    Times calls to selected methods of an object (strategy, storage, writer, ...) in place.
+
+    Each method the object has is shadowed by a timed wrapper stored on the instance, so the object keeps its
+    type, special methods (`with storage:`) and identity; `isinstance` checks and every other attribute are
+    unaffected. Returns `target`.
+
+    :param target: The object to instrument.
+    :param metrics: The registry receiving the measurements.
+    :param stage_prefix: The prefix of the stage names, e.g. 'storage' gives 'storage.save'.
+    :param methods: The names of the methods to time.
+    """
+    for name in methods:
+        method = getattr(target, name, None)
+        if callable(method):
+            setattr(target, name, timed(method, metrics, f"{stage_prefix}.{name}"))
+    return target
+
+
+def timed(function, metrics: Metrics, stage):
+    """Returns a wrapper of `function` that records each call under `stage`."""
+    def wrapper(*args, **kwargs):
+        with metrics.measure(stage):
+            return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def instrument_module_function(module, name, metrics: Metrics, stage=None):
+    """
+    Replaces `module.<name>` with a timed wrapper; callers resolving the name at call time (including the module
+    itself) are measured. Returns a function restoring the original.
+    """
+    original = getattr(module, name)
+    setattr(module, name, timed(original, metrics, stage or f"{module.__name__}.{name}"))
+    return lambda: setattr(module, name, original)
+
+
+def instrument_commit_outputs(metrics: Metrics, profiler: Profiler = None, stage="commit.output"):
+    """
+    Times, and optionally profiles, building each commit's output: its diff, the model call and everything else
+    the writers wait for. Samples are labelled with the commit hash, so the report names the commits with the
+    worst tail latency. Outputs are built at most once per run (see `utils.generate_commit_output`), so repeated
+    lookups of the same commit are not counted. Returns a function restoring the original.
+
+    With concurrent output generation, the tracemalloc peaks of overlapping builds are not separated.
+    """
+    import utils
+    original = utils._build_commit_output
+
+    def build_commit_output(commit, on_token=None):
+        capture = profiler.capture(metrics, stage) if profiler else contextlib.nullcontext()
+        with capture, metrics.measure(stage, label=commit.hexsha):
+            return original(commit, on_token)
+    build_commit_output.__wrapped__ = original
+    utils._build_commit_output = build_commit_output
+    return lambda: setattr(utils, "_build_commit_output", original)
+
+
+def instrument_pipeline(metrics: Metrics, change_strategy, storage, output_format):
+    """
+    Instruments the standard pipeline stages: strategy `generate`, storage `save`, formatter `format` (or writer
+    `write`) and `utils.generate_change_description` (the model call).
+
+    :return: The instrumented strategy, storage and formatter, plus a function undoing the module patch.
+    """
+    import utils
+    restore = instrument_module_function(utils, "generate_change_description", metrics)
+    return (
+        instrument_methods(change_strategy, metrics, "strategy", ["generate"]),
+        instrument_methods(storage, metrics, "storage", ["save", "save_output", "get_outputs", "flush"]),
+        instrument_methods(output_format, metrics, "formatter", ["format", "write"]),
+        restore,
+    )
@@ -1,57 +1,560 @@
+import argparse
+import datetime
+import functools
+import os
+import signal
+import sys
+import time
 import git
+import utils
 from commands import CommitCommand
-from storage import JsonCommitDataStorage
+from storage import SqliteCommitDataStorage
 from strategies import BasicChangeDescriptionStrategy
 from filters import CommitSearchManager, AuthorFilter
 from formatters import CommitOutputFactory, TextCommitOutputFormatter
+from pipeline import ConcurrentCommitPipeline
+from history import GitLogHistory
+from parallel import ParallelGitHistory
+from index import CommitIndex, IndexingCommitOutputWriter, SEARCH_COLUMNS
+import incremental
+from batching import BatchChangeDescriber
+from scheduler import DeadLetterQueue, RateLimitScheduler
+from patchid import compute_patch_ids
+from multirepo import OUTPUT_EXTENSIONS, REPOSITORY_WORKERS, MultiRepoScanner, RepositoryReport, load_manifest, \
+    RepositorySpec, summarize, write_summary
+from daemon import CONTROL_PORT, POLL_INTERVAL, WatchDaemon, WatchedRepository
+from instrumentation import InstrumentedCommandDecorator, Metrics, Profiler, instrument_commit_outputs, \
+    instrument_methods, instrument_pipeline
 
 TEXT_FORMAT = "text"
 SAMPLE_AUTHOR = "Joshua Magady"
 REPOSITORY_PATH = '../../'
 MAX_COMMITS = 10
+MAX_IN_FLIGHT = 1  # Values above 1 enable the concurrent pipeline
+BRANCH = 'main'
+BATCH_WINDOW = 64  # Commits prefetched per batching round
+RENDER_CHUNK_SIZE = 512  # Stored outputs read per storage query when rendering
 
 
-def setup():
+def setup(output_type=TEXT_FORMAT, output=None, stream_tokens=False, repository_path=REPOSITORY_PATH):
     """
     Setup the necessary components for the method to execute.
 
+    :param output_type: The output format: "text", "html" or "jsonl", or None when every repository is written to
+        an output file of its own.
+    :param output: The path the output is written to, or None for stdout.
+    :param stream_tokens: Whether the text output streams model answers as they are generated.
+    :param repository_path: The repository to open, or None when the repositories come from a manifest.
+
     :return: a tuple containing:
-        - repository: An instance of the git.Repo class representing the repository at the specified path.
-        - commit_storage: An instance of the JsonCommitDataStorage class.
+        - repository: An instance of the git.Repo class representing the repository at the specified path, or None.
+        - commit_storage: An instance of the SqliteCommitDataStorage class.
         - description_strategy: An instance of the BasicChangeDescriptionStrategy class.
         - search_manager: An instance of the CommitSearchManager class.
-        - output_format: An instance of the formatter object from the CommitOutputFactory.get_formatter method.
+        - output_writer: An instance of the writer object from the CommitOutputFactory.get_writer method, or None.
     """
-    repository = git.Repo(REPOSITORY_PATH)
-    commit_storage = JsonCommitDataStorage()
+    repository = git.Repo(repository_path) if repository_path else None
+    commit_storage = SqliteCommitDataStorage()
     description_strategy = BasicChangeDescriptionStrategy()
     search_manager = CommitSearchManager()
     search_manager.add_filter(AuthorFilter(SAMPLE_AUTHOR))
-    output_format = CommitOutputFactory.get_formatter(TEXT_FORMAT)
-    return repository, commit_storage, description_strategy, search_manager, output_format
+    output_writer = CommitOutputFactory.get_writer(output_type, output, stream_tokens=stream_tokens) \
+        if output_type else None
+    return repository, commit_storage, description_strategy, search_manager, output_writer
 
 
-def process_commits(commits, commit_storage, description_strategy, search_manager, output_format):
+def process_commits(commits, commit_storage, description_strategy, output_writer, command_decorator=None,
+                    dead_letters=None, echo=True):
     """
     Process commits in reverse order.
 
+    Commits whose complete output is already in `commit_storage` are written from storage, without diffing or
+    asking the model; the output of every other commit is stored once it has been written. A commit is saved as
+    processed only after its output was written, so a dead-lettered commit is never marked processed.
 
-    :param commits: List of commits to process.
+    :param commits: List of matched commits to process, as returned by `CommitSearchManager.search`.
     :param commit_storage: Object representing commit storage.
     :param description_strategy: Object representing description strategy.
-    :param search_manager: Object representing search manager.
-    :param output_format: Output format for each commit.
+    :param output_writer: Writer streaming each formatted commit to the output.
+    :param command_decorator: Optional callable wrapping each `CommitCommand`, e.g. with instrumentation.
+    :param dead_letters: Optional `DeadLetterQueue` receiving the commits whose output could not be built; without
+        one, the first failure ends the run.
+    :param echo: Whether each `CommitCommand` prints the commit to stdout; disable it when stdout is the output.
     :return: None
     """
+    stored_outputs = commit_storage.get_outputs(commit.hexsha for commit in commits)
     for commit in commits[::-1]:
-        if search_manager.process_commits([commit]):
-            command = CommitCommand(commit, commit_storage, description_strategy)
-            command.execute()
-            output = output_format.format(commit)
-            print(output)
+        stored_output = stored_outputs.get(commit.hexsha)
+        try:
+            output_writer.write(stored_output or commit)
+        except Exception as e:
+            if dead_letters is None:
+                raise
+            record_dead_letter(dead_letters, commit, e)
+            continue
+        command = CommitCommand(commit, commit_storage, description_strategy, echo=echo)
+        if command_decorator:
+            command = command_decorator(command)
+        command.execute()  # The description comes from the cache the writer filled
+        if stored_output is None:
+            commit_storage.save_output(utils.generate_commit_output(commit))  # Memoized: built by the writer
+        if dead_letters is not None:
+            dead_letters.remove(commit.hexsha)
+
+
+def process_commits_concurrently(commits, commit_storage, description_strategy, output_writer,
+                                 max_in_flight=MAX_IN_FLIGHT, command_decorator=None, dead_letters=None, echo=True):
+    """
+    Process commits in reverse order, building up to `max_in_flight` commit outputs concurrently.
+
+    The commit command and formatting still run on the calling thread in history order; only the model-bound
+    output generation is pipelined, so the written output is identical to `process_commits`. As there, stored
+    outputs are reused, new ones are stored, and failed commits are dead-lettered without being saved.
+
+    :param commits: List of matched commits to process, as returned by `CommitSearchManager.search`.
+    :param commit_storage: Object representing commit storage.
+    :param description_strategy: Object representing description strategy.
+    :param output_writer: Writer streaming each formatted commit to the output.
+    :param max_in_flight: The maximum number of outputs generated concurrently.
+    :param command_decorator: Optional callable wrapping each `CommitCommand`, e.g. with instrumentation.
+    :param dead_letters: Optional `DeadLetterQueue` receiving the commits whose output could not be built; without
+        one, the first failure ends the run.
+    :param echo: Whether each `CommitCommand` prints the commit to stdout; disable it when stdout is the output.
+    :return: None
+    """
+    stored_outputs = commit_storage.get_outputs(commit.hexsha for commit in commits)
+    pipeline = ConcurrentCommitPipeline(
+        max_in_flight=max_in_flight,
+        build_output=lambda commit: stored_outputs.get(commit.hexsha) or utils.generate_commit_output(commit),
+    )
+    for commit, commit_output in pipeline.run(commits[::-1], return_exceptions=dead_letters is not None):
+        if isinstance(commit_output, Exception):
+            record_dead_letter(dead_letters, commit, commit_output)
+            continue
+        output_writer.write(commit_output)
+        command = CommitCommand(commit, commit_storage, description_strategy, echo=echo)
+        if command_decorator:
+            command = command_decorator(command)
+        command.execute()
+        if commit.hexsha not in stored_outputs:
+            commit_storage.save_output(commit_output)
+        if dead_letters is not None:
+            dead_letters.remove(commit.hexsha)
+
+
+def render_stored(commit_storage, output_writer, commit_hashes=None):
+    """
+    Writes stored commit outputs without touching the commits themselves or the model.
+
+    :param commit_storage: The storage holding the outputs of earlier runs.
+    :param output_writer: Writer streaming each formatted commit to the output.
+    :param commit_hashes: The commits to write, in order; defaults to every stored output, oldest first.
+    :return: The hashes of `commit_hashes` without a stored output, which are skipped.
+    """
+    if commit_hashes is None:
+        for commit_output in commit_storage.iter_outputs():
+            output_writer.write(commit_output)
+        return []
+    missing = []
+    for start in range(0, len(commit_hashes), RENDER_CHUNK_SIZE):
+        chunk = commit_hashes[start:start + RENDER_CHUNK_SIZE]
+        stored_outputs = commit_storage.get_outputs(chunk)
+        for commit_hash in chunk:
+            if commit_hash in stored_outputs:
+                output_writer.write(stored_outputs[commit_hash])
+            else:
+                missing.append(commit_hash)
+    return missing
+
+
+def record_dead_letter(dead_letters, commit, error):
+    print(f"Could not describe commit {commit.hexsha}, it will be retried on the next run: {error}", file=sys.stderr)
+    dead_letters.add(commit.hexsha, error)
+
+
+def with_dead_letters(commits, history, dead_letters):
+    """
+    Returns `commits` (newest first) followed by the dead-lettered commits of previous runs that are not among them,
+    so those are processed first. Entries that no longer resolve to a commit are dropped.
+    """
+    known = {commit.hexsha for commit in commits}
+    retried = []
+    for commit_hash in dead_letters.commit_hashes():
+        if commit_hash in known:
+            continue
+        try:
+            retried.append(history.commit(commit_hash))
+        except Exception:
+            print(f"Dropping dead-lettered commit {commit_hash}: it is no longer in the repository.", file=sys.stderr)
+            dead_letters.remove(commit_hash)
+    return commits + retried
+
+
+def scan_repository(spec, commit_storage, description_strategy, search_manager, output_type=TEXT_FORMAT,
+                    output_dir='.', commit_index=None, incremental_walk=False, patch_dedup=True,
+                    max_in_flight=MAX_IN_FLIGHT, command_decorator=None) -> RepositoryReport:
+    """
+    Processes the matching commits of one manifest repository into its own output file.
+
+    The storage, strategy, search manager and index are shared by all repositories of a run; the output file
+    (`<name>.<format>`) and dead letter queue (`<name>.dead_letters.json`) live in `output_dir`. Watermarks of
+    incremental walks are keyed by repository path and ref, so refs of different repositories never collide.
+
+    :param spec: The `multirepo.RepositorySpec` to scan.
+    :return: The `multirepo.RepositoryReport` of the scan.
+    """
+    repo = git.Repo(spec.path)
+    output_path = os.path.join(output_dir, f"{spec.name}.{OUTPUT_EXTENSIONS[output_type]}")
+    dead_letters = DeadLetterQueue(os.path.join(output_dir, f"{spec.name}.dead_letters.json"))
+    if incremental_walk:
+        walk = incremental.plan_incremental_walk(repo, spec.ref, commit_storage, initial_limit=spec.max_count,
+                                                 watermark_key=f"{spec.path}:{spec.ref}")
+        commits = list(incremental.iter_incremental_commits(search_manager, repo, walk, commit_storage))
+    else:
+        commits = list(search_manager.search(repo, spec.ref, max_count=spec.max_count))
+    commits = with_dead_letters(commits, repo, dead_letters)
+    if patch_dedup:
+        utils.register_patch_ids(spec.path, compute_patch_ids(spec.path, [commit.hexsha for commit in commits]))
+    output_writer = CommitOutputFactory.get_writer(output_type, output_path)
+    if commit_index is not None:
+        output_writer = IndexingCommitOutputWriter(output_writer, commit_index)
+    with output_writer:
+        if max_in_flight > 1:
+            process_commits_concurrently(commits, commit_storage, description_strategy, output_writer,
+                                         max_in_flight=max_in_flight, command_decorator=command_decorator,
+                                         dead_letters=dead_letters)
+        else:
+            process_commits(commits, commit_storage, description_strategy, output_writer,
+                            command_decorator=command_decorator, dead_letters=dead_letters)
+    if incremental_walk:
+        incremental.complete(walk, commit_storage)
+    return RepositoryReport(spec.name, spec.path, spec.ref, commits=len(commits), written=output_writer.written,
+                            dead_lettered=len(dead_letters), output=output_path)
+
+
+def print_repository_report(report: RepositoryReport):
+    if report.error:
+        print(f"[{report.name}] failed after {report.seconds:.1f}s: {report.error}")
+    else:
+        print(f"[{report.name}] {report.written}/{report.commits} commits written to {report.output} "
+              f"in {report.seconds:.1f}s ({report.dead_lettered} dead-lettered)")
+
+
+def open_watched_repository(spec, output_type=TEXT_FORMAT, output_dir='.', commit_index=None) -> WatchedRepository:
+    """
+    Opens one repository for the watch daemon, with its output (`<name>.<format>`) and dead letter queue
+    (`<name>.dead_letters.json`) in `output_dir`. Outputs are appended to and flushed after every commit, so a
+    restarted daemon continues the same file and readers see commits as soon as they are described.
+    """
+    output_writer = CommitOutputFactory.get_writer(
+        output_type, os.path.join(output_dir, f"{spec.name}.{OUTPUT_EXTENSIONS[output_type]}"), flush_every=1,
+        append=True)
+    if commit_index is not None:
+        output_writer = IndexingCommitOutputWriter(output_writer, commit_index)
+    dead_letters = DeadLetterQueue(os.path.join(output_dir, f"{spec.name}.dead_letters.json"))
+    return WatchedRepository(spec, git.Repo(spec.path), output_writer, dead_letters)
+
+
+def process_new_commits(watched: WatchedRepository, commit_storage, description_strategy, search_manager,
+                        patch_dedup=True, max_in_flight=MAX_IN_FLIGHT, command_decorator=None) -> int:
+    """
+    Processes the commits that landed on a watched repository's ref since its last watermark, for `WatchDaemon`.
+
+    The walk is always incremental and keyed like `scan_repository`'s, so a daemon picks up where manifest runs
+    (or a previous daemon) stopped; commits dead-lettered earlier are retried with the new ones.
+
+    :return: The number of commits processed.
+    """
+    spec = watched.spec
+    walk = incremental.plan_incremental_walk(watched.repo, spec.ref, commit_storage, initial_limit=spec.max_count,
+                                             watermark_key=f"{spec.path}:{spec.ref}")
+    if walk.rescan:
+        print(f"[{spec.name}] History of {spec.ref} was rewritten; rescanning the last {walk.max_count} commits.")
+    commits = list(incremental.iter_incremental_commits(search_manager, watched.repo, walk, commit_storage))
+    commits = with_dead_letters(commits, watched.repo, watched.dead_letters)
+    if commits and patch_dedup:
+        utils.register_patch_ids(spec.path, compute_patch_ids(spec.path, [commit.hexsha for commit in commits]))
+    written = watched.output_writer.written
+    if max_in_flight > 1:
+        process_commits_concurrently(commits, commit_storage, description_strategy, watched.output_writer,
+                                     max_in_flight=max_in_flight, command_decorator=command_decorator,
+                                     dead_letters=watched.dead_letters)
+    else:
+        process_commits(commits, commit_storage, description_strategy, watched.output_writer,
+                        command_decorator=command_decorator, dead_letters=watched.dead_letters)
+    # Commits and index entries are buffered in batches; a quiet daemon would otherwise hold them indefinitely.
+    watched.output_writer.flush()
+    incremental.complete(walk, commit_storage)
+    if commits:
+        print(f"[{spec.name}] {watched.output_writer.written - written}/{len(commits)} new commits written "
+              f"({len(watched.dead_letters)} dead-lettered)")
+    return len(commits)
+
+
+def search_index(args):
+    """Answers a `--search` query from the commit index alone and writes the matches in the chosen format."""
+    with CommitIndex(args.index) as index:
+        started = time.perf_counter()
+        matches = index.search(args.search, author=args.search_author, since=args.search_since,
+                               until=args.search_until, columns=args.search_in, limit=args.search_limit)
+        elapsed = time.perf_counter() - started
+    with CommitOutputFactory.get_writer(args.format, args.output) as output_writer:
+        for commit_output in matches:
+            output_writer.write(commit_output)
+    print(f"{len(matches)} matching commits in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Walk a repository's history and describe each commit.")
+    parser.add_argument("--format", choices=["text", "html", "jsonl"], default=TEXT_FORMAT,
+                        help="output format: plain text, a complete HTML report or JSON Lines")
+    parser.add_argument("--output", metavar="PATH", help="write the output to PATH instead of stdout")
+    parser.add_argument("--stream", action="store_true",
+                        help="show model answers token by token as they arrive (text output, one commit at a time)")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="number of commit descriptions requested from the model concurrently")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="extract commits and their diffs in this many processes (1 disables the process pool)")
+    parser.add_argument("--bulk-history", action="store_true",
+                        help="extract history with a single streamed git log instead of per-commit object lookups")
+    parser.add_argument("--render", metavar="RANGE", nargs="?", const="",
+                        help="only write the stored outputs of RANGE (e.g. v1.0..main), or of every processed commit, "
+                             "without diffing or asking the model")
+    parser.add_argument("--manifest", metavar="PATH",
+                        help="scan every repository listed in the JSON manifest at PATH instead of one repository")
+    parser.add_argument("--output-dir", metavar="DIR", default="gitgrazer-output",
+                        help="where --manifest writes one output file per repository and the summary")
+    parser.add_argument("--repo-workers", type=int, default=REPOSITORY_WORKERS,
+                        help="number of --manifest repositories scanned concurrently")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process new commits of the repository (or --manifest repositories) "
+                             "as they land, appending to --output-dir")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="seconds between --watch checks of every ref (a fallback where inotify is unavailable)")
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT,
+                        help="serve --watch status and metrics on this localhost port (0 disables the endpoint)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only walk commits added to the branch since the last incremental run")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="describe up to this many small commits per model request (0 disables batching)")
+    parser.add_argument("--requests-per-minute", type=int, default=utils.REQUESTS_PER_MINUTE,
+                        help="the model request budget per minute (default: unlimited)")
+    parser.add_argument("--tokens-per-minute", type=int, default=utils.TOKENS_PER_MINUTE,
+                        help="the model token budget per minute (default: unlimited)")
+    parser.add_argument("--dead-letters", metavar="PATH", default="dead_letters.json",
+                        help="where commits that could not be described are kept for the next run")
+    parser.add_argument("--no-patch-dedup", action="store_true",
+                        help="describe every commit, even when another commit already introduced the same patch")
+    parser.add_argument("--no-fast-path", action="store_true",
+                        help="send trivial commits (lockfiles, formatting, version bumps, ...) to the model too")
+    parser.add_argument("--index", metavar="PATH", default="commit_index.sqlite3",
+                        help="the full-text index every described commit is added to")
+    parser.add_argument("--no-index", action="store_true", help="do not add described commits to the index")
+    parser.add_argument("--search", metavar="WORDS",
+                        help="list the indexed commits containing all WORDS instead of walking the history")
+    parser.add_argument("--search-in", nargs="+", choices=SEARCH_COLUMNS,
+                        help="only match --search WORDS in these fields (default: all)")
+    parser.add_argument("--search-author", metavar="NAME", help="only list indexed commits by this author")
+    parser.add_argument("--search-since", metavar="YYYY-MM-DD", type=datetime.date.fromisoformat,
+                        help="only list indexed commits authored on or after this date")
+    parser.add_argument("--search-until", metavar="YYYY-MM-DD", type=datetime.date.fromisoformat,
+                        help="only list indexed commits authored on or before this date")
+    parser.add_argument("--search-limit", type=int, default=20, help="the maximum number of indexed commits listed")
+    parser.add_argument("--metrics-report", metavar="PATH",
+                        help="write per-stage timings and counters as JSON at the end of the run")
+    parser.add_argument("--prometheus", metavar="PATH",
+                        help="write the end-of-run metrics in the Prometheus text format")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="profile commit commands with cProfile and dump the stats to PATH")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record the peak traced memory of commit commands with tracemalloc")
+    args = parser.parse_args(argv)
+    if args.output and (args.watch or args.manifest):
+        parser.error("--output cannot be combined with --watch or --manifest, which write one file per repository "
+                     "to --output-dir")
+    return args
 
 
 if __name__ == "__main__":
-    repo, commit_storage, change_strategy, filter_manager, output_formatter = setup()
-    commits = list(repo.iter_commits('main', max_count=MAX_COMMITS))
-    process_commits(commits, commit_storage, change_strategy, filter_manager, output_formatter)
+    args = parse_args()
+    if args.search is not None or args.search_author or args.search_since or args.search_until:
+        # Answered from the index alone: no repository, storage or model is touched.
+        search_index(args)
+        raise SystemExit()
+    if args.stream and (args.format != TEXT_FORMAT or args.max_in_flight > 1):
+        raise SystemExit("--stream needs the text format and --max-in-flight 1")
+    if args.manifest and (args.render is not None or args.stream or args.workers > 1 or args.bulk_history
+                          or args.batch_size > 1):
+        raise SystemExit("--manifest cannot be combined with --render, --stream, --workers, --bulk-history "
+                         "or --batch-size")
+    if args.watch and (args.render is not None or args.stream or args.workers > 1 or args.bulk_history
+                       or args.batch_size > 1 or args.format == "html"):
+        raise SystemExit("--watch cannot be combined with --render, --stream, --workers, --bulk-history, "
+                         "--batch-size or the html format")
+    # Manifest and watch runs write every repository to a file of its own, opened when the repository is.
+    repo, commit_storage, change_strategy, filter_manager, output_writer = setup(
+        None if args.manifest or args.watch else args.format, args.output, stream_tokens=args.stream,
+        repository_path=None if args.manifest or args.watch else REPOSITORY_PATH)
+    metrics = None
+    command_decorator = None
+    if args.metrics_report or args.prometheus or args.profile or args.trace_memory or args.watch:
+        metrics = Metrics()  # Also served by the --watch control endpoint
+        profiler = Profiler(cpu=bool(args.profile), memory=args.trace_memory)
+        change_strategy, commit_storage, output_writer, _ = instrument_pipeline(
+            metrics, change_strategy, commit_storage, output_writer)
+        # Commands only check, echo and save; the diff and the model call happen when outputs are built.
+        instrument_commit_outputs(metrics, profiler)
+        command_decorator = functools.partial(InstrumentedCommandDecorator, metrics=metrics)
+    if args.render is not None:
+        # Only the range is resolved with git; every output comes from storage.
+        commit_hashes = repo.git.rev_list("--reverse", args.render).split() if args.render else None
+        missing = render_stored(commit_storage, output_writer, commit_hashes)
+        output_writer.close()
+        commit_storage.close()
+        if missing:
+            print(f"{len(missing)} commits of {args.render} have no stored output; process them first.",
+                  file=sys.stderr)
+        raise SystemExit()
+    commit_index = None if args.no_index else CommitIndex(args.index)
+    if commit_index is not None and output_writer is not None:
+        output_writer = IndexingCommitOutputWriter(output_writer, commit_index)
+    utils.set_scheduler(RateLimitScheduler(max_concurrency=utils.MAX_CONCURRENCY,
+                                           requests_per_minute=args.requests_per_minute,
+                                           tokens_per_minute=args.tokens_per_minute, max_retries=utils.MAX_RETRIES))
+    dead_letters = DeadLetterQueue(args.dead_letters)
+    if args.no_fast_path:
+        utils.TRIVIAL_CLASSIFIER = None
+    if args.watch:
+        # Repositories, storage, index and model client stay open; only commits landing on the refs are processed.
+        os.makedirs(args.output_dir, exist_ok=True)
+        specs = load_manifest(args.manifest, default_ref=BRANCH, default_max_count=MAX_COMMITS) if args.manifest \
+            else [RepositorySpec(os.path.basename(os.path.abspath(REPOSITORY_PATH)), os.path.abspath(REPOSITORY_PATH),
+                                 BRANCH, MAX_COMMITS)]
+        watched_repositories = [open_watched_repository(spec, args.format, args.output_dir, commit_index)
+                                for spec in specs]
+        for watched in watched_repositories:
+            instrument_methods(watched.output_writer, metrics, "formatter", ["format", "write"])
+        process = functools.partial(process_new_commits, commit_storage=commit_storage,
+                                    description_strategy=change_strategy, search_manager=filter_manager,
+                                    patch_dedup=not args.no_patch_dedup, max_in_flight=args.max_in_flight,
+                                    command_decorator=command_decorator)
+        daemon = WatchDaemon(watched_repositories, process, workers=args.repo_workers,
+                             poll_interval=args.poll_interval, control_port=args.control_port or None,
+                             metrics=metrics, status_extras=lambda: {
+                                 "model_requests": utils.get_scheduler().stats(),
+                                 "description_cache": utils.get_description_cache().stats()})
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+        modes = ", ".join(f"{watched.spec.name} ({watched.watcher.mode})" for watched in watched_repositories)
+        print(f"Watching {modes}" + (f"; control endpoint on http://127.0.0.1:{args.control_port}"
+                                     if args.control_port else ""), flush=True)
+        daemon.run()
+        for watched in watched_repositories:
+            watched.output_writer.close()
+        commit_storage.close()
+        if commit_index is not None:
+            commit_index.close()
+        print(f"Stopped after processing {sum(watched.processed for watched in watched_repositories)} commits")
+        raise SystemExit()
+    if args.manifest:
+        # One storage, description cache, index and rate-limit scheduler for all repositories.
+        os.makedirs(args.output_dir, exist_ok=True)
+        scan = functools.partial(scan_repository, commit_storage=commit_storage, description_strategy=change_strategy,
+                                 search_manager=filter_manager, output_type=args.format, output_dir=args.output_dir,
+                                 commit_index=commit_index, incremental_walk=args.incremental,
+                                 patch_dedup=not args.no_patch_dedup, max_in_flight=args.max_in_flight,
+                                 command_decorator=command_decorator)
+        reports = MultiRepoScanner(scan, workers=args.repo_workers).run(
+            load_manifest(args.manifest, default_ref=BRANCH, default_max_count=MAX_COMMITS),
+            on_report=print_repository_report)
+        commit_storage.close()
+        if commit_index is not None:
+            commit_index.close()
+        scheduler_stats = utils.get_scheduler().stats()
+        write_summary(os.path.join(args.output_dir, "summary.json"), reports, model_requests=scheduler_stats,
+                      description_cache=utils.get_description_cache().stats())
+        total = summarize(reports)
+        print(f"{total['repositories']} repositories ({total['failed_repositories']} failed): "
+              f"{total['written']}/{total['commits']} commits written, {total['dead_lettered']} dead-lettered; "
+              f"{scheduler_stats['retries']} model retries, {scheduler_stats['rate_limited']} rate limited")
+        if metrics and args.metrics_report:
+            metrics.write_report(args.metrics_report)
+        if metrics and args.prometheus:
+            metrics.write_prometheus(args.prometheus)
+        raise SystemExit(1 if total['failed_repositories'] else 0)
+    if args.workers > 1:
+        history = ParallelGitHistory(REPOSITORY_PATH, workers=args.workers)
+    elif args.bulk_history:
+        history = GitLogHistory(REPOSITORY_PATH)
+    else:
+        history = repo
+    if args.incremental:
+        walk = incremental.plan_incremental_walk(history, BRANCH, commit_storage, initial_limit=MAX_COMMITS)
+        if walk.rescan:
+            print(f"History of {BRANCH} was rewritten; rescanning the last {walk.max_count} commits.", file=sys.stderr)
+        commits = list(incremental.iter_incremental_commits(filter_manager, history, walk, commit_storage))
+    else:
+        # Filters are pushed down into git rev-list, so only matching commits are ever materialized.
+        commits = list(filter_manager.search(history, BRANCH, max_count=MAX_COMMITS))
+    commits = with_dead_letters(commits, history, dead_letters)
+    if history is not repo:
+        history.close()  # The records carry everything the commands need
+    if not args.no_patch_dedup:
+        # Cherry-picks and rebased commits reuse the description of the first commit with the same patch.
+        patch_ids = compute_patch_ids(REPOSITORY_PATH, [commit.hexsha for commit in commits])
+        utils.register_patch_ids(REPOSITORY_PATH, patch_ids)
+    # The commands echo each commit to stdout, unless stdout already carries the JSON Lines or HTML output.
+    echo = args.format == TEXT_FORMAT or args.output is not None
+    describer = BatchChangeDescriber(max_batch_size=args.batch_size,
+                                     max_in_flight=args.max_in_flight) if args.batch_size > 1 else None
+    # Commits are processed oldest first; with batching, each window's small commits are described up front.
+    windows = [commits[max(0, end - BATCH_WINDOW):end] for end in range(len(commits), 0, -BATCH_WINDOW)] \
+        if describer else [commits]
+    for window in windows:
+        if describer:
+            describer.prefetch(window[::-1])
+        if args.max_in_flight > 1:
+            process_commits_concurrently(window, commit_storage, change_strategy, output_writer,
+                                         max_in_flight=args.max_in_flight, command_decorator=command_decorator,
+                                         dead_letters=dead_letters, echo=echo)
+        else:
+            process_commits(window, commit_storage, change_strategy, output_writer,
+                            command_decorator=command_decorator, dead_letters=dead_letters, echo=echo)
+    if describer:
+        print(f"Batching: {describer.batched_commits} commits in {describer.batch_requests} requests "
+              f"({describer.requests_saved} requests saved, {describer.fallbacks} fallbacks)", file=sys.stderr)
+    if args.incremental:
+        incremental.complete(walk, commit_storage)
+    output_writer.close()
+    commit_storage.close()
+    if commit_index is not None:
+        print(f"Commit index: {len(commit_index)} commits searchable with --search", file=sys.stderr)
+        commit_index.close()
+    cache_stats = utils.get_description_cache().stats()
+    print(f"Change description cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses", file=sys.stderr)
+    if utils.PATCH_IDS:
+        print(f"Patch-id dedup: {utils.patch_reuses} descriptions reused", file=sys.stderr)
+    if utils.TRIVIAL_CLASSIFIER is not None:
+        print(f"Fast path: {utils.TRIVIAL_CLASSIFIER.classified} trivial commits described without the model",
+              file=sys.stderr)
+    scheduler_stats = utils.get_scheduler().stats()
+    print(f"Model requests: {scheduler_stats['retries']} retries, {scheduler_stats['rate_limited']} rate limited, "
+          f"{scheduler_stats['failures']} failed; {len(dead_letters)} commits dead-lettered", file=sys.stderr)
+    if metrics:
+        metrics.increment("description_cache.hits", cache_stats['hits'])
+        metrics.increment("description_cache.misses", cache_stats['misses'])
+        metrics.set_gauge("commits.matched", len(commits))
+        metrics.increment("model.retries", scheduler_stats['retries'])
+        metrics.increment("patch_dedup.reused", utils.patch_reuses)
+        if utils.TRIVIAL_CLASSIFIER is not None:
+            metrics.increment("fast_path.classified", utils.TRIVIAL_CLASSIFIER.classified)
+        metrics.increment("model.rate_limited", scheduler_stats['rate_limited'])
+        metrics.set_gauge("model.concurrency_limit", scheduler_stats['concurrency_limit'])
+        metrics.set_gauge("commits.dead_lettered", len(dead_letters))
+        if args.metrics_report:
+            metrics.write_report(args.metrics_report)
+        if args.prometheus:
+            metrics.write_prometheus(args.prometheus)
+        if args.profile:
+            profiler.dump_cpu_stats(args.profile)
+            print(profiler.cpu_report(), file=sys.stderr)
@@ -0,0 +1,122 @@
+import re
+
+_TERMINAL = ""  # Trie key marking the end of a keyword; never a real (single character) edge
+
+
+class KeywordMatcher:
+    """
+    A multi-keyword matcher compiled once and applied to many texts in a single pass each.
+
+    Plain keywords are inserted into a trie which is emitted as one prefix-factored regular expression, so the
+    regex engine walks every position of the text once and follows only the trie branches the text allows,
+    instead of scanning the text once per keyword. Keywords are matched as substrings by default; with
+    `whole_word` they must not be adjacent to word characters. With `regex` each keyword is treated as a
+    regular expression and the patterns are combined into a single alternation.
+
+    :param keywords: The keywords (or patterns) to look for.
+    :type keywords: list of str
+    :param ignore_case: Whether matching ignores letter case.
+    :type ignore_case: bool
+    :param whole_word: Whether keywords must match whole words.
+    :type whole_word: bool
+    :param regex: Whether keywords are regular expressions.
+    :type regex: bool
+
+    Example usage:
+        matcher = KeywordMatcher(['PROJ-12', 'PROJ-123', 'auth'], whole_word=True)
+        matcher.search('Fix PROJ-123 login')  # True
+        matcher.matches('Fix PROJ-123 login')  # ['PROJ-123']
+    """
+    def __init__(self, keywords, ignore_case=True, whole_word=False, regex=False):
+        self.keywords = list(keywords)
+        self.ignore_case = ignore_case
+        self.whole_word = whole_word
+        self.regex = regex
+        if regex:
+            self._patterns = [re.compile(self._bounded(keyword), re.IGNORECASE if ignore_case else 0)
+                              for keyword in self.keywords]
+            combined = "|".join(f"(?:{keyword})" for keyword in self.keywords) or "(?!)"
+            self._search = re.compile(self._bounded(combined), re.IGNORECASE if ignore_case else 0)
+            return
+        # Several spellings may normalize to the same keyword when ignoring case; report all of them.
+        self._originals = {}
+        trie = {}
+        for keyword in self.keywords:
+            normalized = self._normalize(keyword)
+            self._originals.setdefault(normalized, []).append(keyword)
+            node = trie
+            for character in normalized:
+                node = node.setdefault(character, {})
+            node[_TERMINAL] = True
+        self._trie = trie
+        body = self._trie_pattern(trie) if trie else "(?!)"
+        self._search = re.compile(self._bounded(body))
+        # Zero-width lookahead so that overlapping occurrences at every start position are found.
+        self._scan = re.compile(f"(?=({self._bounded(body)}))")
+
+    def search(self, text) -> bool:
+        """Returns whether any keyword occurs in `text`."""
+        if not self.regex:
+            text = self._normalize(text)
+        return self._search.search(text) is not None
+
+    def iter_match_starts(self, text):
+        """
+        Yields the start index of each non-overlapping occurrence of any keyword in `text`, in one pass.
+
+        Used to match many texts at once: concatenate them with a separator no keyword contains and map the
+        positions back to texts.
+        """
+        if not self.regex:
+            text = self._normalize(text)
+        for match in self._search.finditer(text):
+            yield match.start()
+
+    def matches(self, text) -> list:
+        """Returns the keywords occurring in `text`, in the order they were given."""
+        if self.regex:
+            return [keyword for keyword, pattern in zip(self.keywords, self._patterns) if pattern.search(text)]
+        text = self._normalize(text)
+        found = set()
+        for match in self._scan.finditer(text):
+            # The regex reports the longest keyword at this position; shorter keywords that are prefixes of it
+            # are recovered by walking the trie along the matched text.
+            start = match.start()
+            node = self._trie
+            for offset, character in enumerate(match.group(1), start=1):
+                node = node[character]
+                if _TERMINAL in node and (not self.whole_word or not _is_word_at(text, start + offset)):
+                    found.add(text[start:start + offset])
+        matched = {keyword for normalized in found for keyword in self._originals[normalized]}
+        return [keyword for keyword in self.keywords if keyword in matched]
+
+    def _normalize(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _bounded(self, pattern):
+        return f"(?<!\\w)(?:{pattern})(?!\\w)" if self.whole_word else pattern
+
+    @staticmethod
+    def _trie_pattern(root):
+        # Emitted bottom-up with an explicit stack; recursing per character overflows on very long keywords.
+        patterns = {}
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for character, child in node.items() if character != _TERMINAL)
+                continue
+            alternatives = [re.escape(character) + patterns.pop(id(child))
+                            for character, child in sorted(node.items()) if character != _TERMINAL]
+            if not alternatives:
+                patterns[id(node)] = ""
+                continue
+            body = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+            # A keyword ending here makes the rest optional; the greedy '?' still prefers the longer keyword.
+            patterns[id(node)] = f"(?:{body})?" if _TERMINAL in node else body
+        return patterns[id(root)]
+
+
+def _is_word_at(text, index):
+    return index < len(text) and (text[index].isalnum() or text[index] == "_")
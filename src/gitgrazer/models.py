@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Any
+from typing import Any, Optional
 
 
 class ChangeDescription(BaseModel):
@@ -26,13 +26,15 @@ class CommitOutput(BaseModel):
         date (Any): The date of the commit.
         message (str): The commit message.
         change_description (str, optional): The description of the changes made in the commit.
+        reused_from (str, optional): The hash of the commit with the same patch whose description was reused.
 
     """
     commit_hash: str
     author: str
     date: Any
     message: str
-    change_description: ChangeDescription = None
-    diff_summary: str = None
+    change_description: Optional[ChangeDescription] = None
+    diff_summary: Optional[str] = None
+    reused_from: Optional[str] = None
 
 
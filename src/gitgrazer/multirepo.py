@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple, Optional
+
+REPOSITORY_WORKERS = 8  # Repositories scanned at once; the shared rate-limit scheduler bounds the model traffic
+OUTPUT_EXTENSIONS = {"text": "txt", "html": "html", "jsonl": "jsonl"}
+
+
+class RepositorySpec(NamedTuple):
+    """
+    One repository of a manifest.
+
+    :ivar name: A unique name, used for the repository's output files.
+    :ivar path: The path of the repository.
+    :ivar ref: The ref to walk.
+    :ivar max_count: The maximum number of matching commits to process, or None for all of them.
+    """
+    name: str
+    path: str
+    ref: str = "main"
+    max_count: Optional[int] = None
+
+
+class RepositoryReport(NamedTuple):
+    """
+    The outcome of scanning one repository.
+
+    :ivar commits: The number of matching commits processed.
+    :ivar written: The number of commits written to `output`.
+    :ivar dead_lettered: The number of commits left in the repository's dead letter queue.
+    :ivar seconds: The wall-clock time spent on the repository.
+    :ivar output: The path of the repository's output file.
+    :ivar error: Why the scan failed as a whole, or None.
+    """
+    name: str
+    path: str
+    ref: str
+    commits: int = 0
+    written: int = 0
+    dead_lettered: int = 0
+    seconds: float = 0.0
+    output: Optional[str] = None
+    error: Optional[str] = None
+
+
+def load_manifest(filepath, default_ref="main", default_max_count=None) -> list:
+    """
+    Reads the repositories to scan from a JSON manifest.
+
+    The manifest is either a list of entries or an object with a "repositories" list and optional "defaults"
+    (`ref`, `max_count`) applying to every entry. An entry is a path, or an object with a "path" and optional
+    "name", "ref" and "max_count". Relative paths are resolved against the manifest's directory, and names default
+    to the repository directory's name.
+
+    Example manifest:
+        {"defaults": {"ref": "main", "max_count": 50},
+         "repositories": ["../billing", {"path": "../auth", "ref": "release", "name": "auth-release"}]}
+
+    :return: A list of `RepositorySpec`, in manifest order.
+    :raises ValueError: When an entry has no path or two entries share a name.
+    """
+    with open(filepath, 'r') as file:
+        manifest = json.load(file)
+    if isinstance(manifest, list):
+        manifest = {"repositories": manifest}
+    defaults = manifest.get("defaults", {})
+    base_directory = os.path.dirname(os.path.abspath(filepath))
+    specs = []
+    for entry in manifest.get("repositories", []):
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        if not entry.get("path"):
+            raise ValueError(f"Manifest entry without a path: {entry!r}")
+        path = os.path.normpath(os.path.join(base_directory, os.path.expanduser(entry["path"])))
+        specs.append(RepositorySpec(
+            name=entry.get("name") or os.path.basename(path),
+            path=path,
+            ref=entry.get("ref", defaults.get("ref", default_ref)),
+            max_count=entry.get("max_count", defaults.get("max_count", default_max_count)),
+        ))
+    names = [spec.name for spec in specs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Repository names must be unique; give these entries a name: {', '.join(duplicates)}")
+    return specs
+
+
+class MultiRepoScanner:
+    """
+    Scans many repositories concurrently with a pool of worker threads.
+
+    Each worker runs `scan_repository` for one repository at a time. The storage, change description cache and
+    rate-limit scheduler are module-level or passed in by the caller, so every repository shares them: a commit
+    reachable from several repositories is described once, and the total model traffic stays within one budget
+    however many repositories are in flight. A repository that fails as a whole is reported and does not stop
+    the others.
+
+    :param scan_repository: The callable scanning one `RepositorySpec` and returning its `RepositoryReport`.
+    :param workers: The number of repositories scanned concurrently.
+    :type workers: int
+
+    Example usage:
+        scanner = MultiRepoScanner(functools.partial(main.scan_repository, ...), workers=8)
+        reports = scanner.run(load_manifest('repositories.json'), on_report=print)
+        write_summary('summary.json', reports)
+    """
+    def __init__(self, scan_repository, workers=REPOSITORY_WORKERS):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.scan_repository = scan_repository
+        self.workers = workers
+
+    def run(self, specs, on_report=None) -> list:
+        """
+        Scans every repository of `specs` and returns their reports in the same order.
+
+        :param on_report: Optional callable receiving each report as soon as its repository is done.
+        """
+        specs = list(specs)
+        reports = [None] * len(specs)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gitgrazer-repo") as executor:
+            futures = {executor.submit(self._scan, spec): index for index, spec in enumerate(specs)}
+            for future in as_completed(futures):
+                report = future.result()
+                reports[futures[future]] = report
+                if on_report:
+                    on_report(report)
+        return reports
+
+    def _scan(self, spec: RepositorySpec) -> RepositoryReport:
+        started = time.perf_counter()
+        try:
+            report = self.scan_repository(spec)
+        except Exception as e:
+            report = RepositoryReport(spec.name, spec.path, spec.ref, error=f"{type(e).__name__}: {e}")
+        return report._replace(seconds=time.perf_counter() - started)
+
+
+def summarize(reports) -> dict:
+    """Aggregates repository reports into totals."""
+    return {
+        "repositories": len(reports),
+        "failed_repositories": sum(1 for report in reports if report.error),
+        "commits": sum(report.commits for report in reports),
+        "written": sum(report.written for report in reports),
+        "dead_lettered": sum(report.dead_lettered for report in reports),
+        "repository_seconds": sum(report.seconds for report in reports),
+    }
+
+
+def write_summary(filepath, reports, **extra):
+    """Writes the per-repository reports and their totals (plus any `extra` sections) as JSON."""
+    summary = {"total": summarize(reports), "repositories": [report._asdict() for report in reports], **extra}
+    with open(filepath, 'w') as file:
+        json.dump(summary, file, indent=2)
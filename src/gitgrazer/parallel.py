@@ -0,0 +1,155 @@
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from history import Author, CommitRecord, FileChange, GitLogHistory, _to_cli_options
+from payloads import change_type_of
+
+CHUNK_SIZE = 64  # Commits per worker task; large enough to amortize pickling, small enough to balance the load
+
+_worker_repo = None  # The git.Repo of the current worker process
+
+
+def _init_worker(repo_path):
+    global _worker_repo
+    import git
+    _worker_repo = git.Repo(repo_path)
+
+
+def _extract_chunk(commit_hashes):
+    return extract_commits(_worker_repo, commit_hashes)
+
+
+def extract_commits(repo, commit_hashes) -> list:
+    """
+    Reads the metadata and first-parent patch of each commit through `repo` and returns picklable records.
+
+    Root commits are diffed against the empty tree. Every change carries its patch text in `diff`, so the
+    records can go straight to `utils.generate_change_description` without touching the repository again.
+    """
+    import git
+    records = []
+    for commit_hash in commit_hashes:
+        commit = repo.commit(commit_hash)
+        if commit.parents:
+            diff = commit.parents[0].diff(commit, create_patch=True)
+        else:
+            diff = commit.diff(git.NULL_TREE, create_patch=True)
+        records.append(CommitRecord(
+            hexsha=commit.hexsha,
+            parents=[parent.hexsha for parent in commit.parents],
+            author=Author(commit.author.name, commit.author.email),
+            authored_datetime=commit.authored_datetime,
+            message=commit.message,
+            changes=[_to_file_change(change) for change in diff],
+        ))
+    return records
+
+
+def _to_file_change(change) -> FileChange:
+    change_type = change_type_of(change)
+    file_change = FileChange(
+        change_type, change.a_path or change.b_path, change.b_path or change.a_path,
+        a_mode=oct(change.a_mode)[2:] if change.a_mode else None,
+        b_mode=oct(change.b_mode)[2:] if change.b_mode else None,
+        a_blob_id=change.a_blob.hexsha if change.a_blob else None,
+        b_blob_id=change.b_blob.hexsha if change.b_blob else None,
+    )
+    patch = change.diff or b""
+    file_change.diff = patch
+    if patch.startswith(b"Binary files") or b"\nBinary files" in patch[:200]:
+        file_change.insertions = file_change.deletions = None
+    else:
+        for line in patch.splitlines():  # GitPython patches start at the first hunk, without ---/+++ headers
+            if line.startswith(b"+"):
+                file_change.insertions += 1
+            elif line.startswith(b"-"):
+                file_change.deletions += 1
+    return file_change
+
+
+class ParallelGitHistory(GitLogHistory):
+    """
+    History extraction spread over a process pool, for large histories on multi-core machines.
+
+    The commits of a walk are listed with one `git rev-list` (accepting the same revision, path and keyword
+    arguments as `git.Repo.iter_commits`) and partitioned into chunks of `chunk_size` consecutive commits. Worker
+    processes, each with its own `git.Repo`, read the metadata and first-parent patches of their chunks, and the
+    records are yielded back in history order. At most two chunks per worker are queued at a time, so memory
+    stays bounded on long walks. Like `GitLogHistory`, an instance can be passed to `CommitSearchManager.search`.
+
+    The pool is started on first use and serves every walk and `commit` lookup of the instance; call `close` (or
+    use the instance as a context manager) to shut it down.
+
+    :param repo_path: The path of the repository.
+    :type repo_path: str
+    :param workers: The number of worker processes; defaults to the number of CPUs.
+    :type workers: int
+    :param chunk_size: The number of commits per worker task.
+    :type chunk_size: int
+    :param git_executable: The git binary to run.
+    :type git_executable: str
+
+    Example usage:
+        with ParallelGitHistory('.', workers=8) as history:
+            for record in history.iter_commits('main', max_count=10_000):
+                print(record.hexsha, record.stats.total)
+    """
+    def __init__(self, repo_path='.', workers=None, chunk_size=CHUNK_SIZE, git_executable='git'):
+        super().__init__(repo_path, git_executable)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def commit(self, rev="HEAD") -> CommitRecord:
+        return self._pool().submit(_extract_chunk, [rev]).result()[0]
+
+    def iter_commits(self, rev="HEAD", paths=None, **kwargs):
+        executor = self._pool()
+        pending = deque()
+        try:
+            for chunk in self._iter_chunks(rev, paths, kwargs):
+                pending.append(executor.submit(_extract_chunk, chunk))
+                if len(pending) >= 2 * self.workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                     initargs=(self.repo_path,))
+            return self._executor
+
+    def _iter_chunks(self, rev, paths, kwargs):
+        command = [self.git_executable, "-C", self.repo_path, "rev-list", *_to_cli_options(kwargs), rev, "--"]
+        if paths:
+            command.extend([paths] if isinstance(paths, str) else paths)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        chunk = []
+        try:
+            for line in process.stdout:
+                chunk.append(line.decode().strip())
+                if len(chunk) == self.chunk_size:
+                    yield chunk
+                    chunk = []
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read()
+            return_code = process.wait()
+        if return_code:
+            raise RuntimeError(f"git rev-list failed with exit code {return_code}: {stderr.decode(errors='replace')}")
+        if chunk:
+            yield chunk
@@ -0,0 +1,46 @@
+import subprocess
+
+
+def compute_patch_ids(repo_path, commit_hashes, git_executable='git') -> dict:
+    """
+    Computes the stable patch id of each commit, as `git patch-id --stable` does, in one bulk pass.
+
+    Commits with the same patch id introduce the same change, whatever their parents, line offsets or whitespace,
+    e.g. a cherry-pick onto a release branch or a rebased commit. The patches of all commits are streamed from one
+    `git log -p` straight into `git patch-id`, so the cost is two processes per call, not per commit. Merge and
+    empty commits have no patch and are left out of the result.
+
+    :param repo_path: The path of the repository.
+    :param commit_hashes: The hashes of the commits.
+    :param git_executable: The git binary to run.
+    :return: A dict mapping commit hashes to patch ids.
+
+    Example usage:
+        patch_ids = compute_patch_ids('.', [commit.hexsha for commit in commits])
+    """
+    commit_hashes = list(dict.fromkeys(commit_hashes))
+    if not commit_hashes:
+        return {}
+    log = subprocess.Popen(
+        [git_executable, "-C", repo_path, "log", "--no-walk=unsorted", "--stdin", "-p", "--no-color", "--no-ext-diff",
+         "--format=commit %H"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    patch_id = subprocess.Popen([git_executable, "-C", repo_path, "patch-id", "--stable"],
+                                stdin=log.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log.stdout.close()  # Owned by patch-id now, so it sees EOF when git log exits
+    # git log reads every revision from stdin before it writes any output, so this cannot deadlock.
+    log.stdin.write("".join(f"{commit_hash}\n" for commit_hash in commit_hashes).encode())
+    log.stdin.close()
+    output, patch_id_errors = patch_id.communicate()
+    log_errors = log.stderr.read()
+    log.stderr.close()
+    if log.wait():
+        raise RuntimeError(f"git log failed with exit code {log.returncode}: {log_errors.decode(errors='replace')}")
+    if patch_id.returncode:
+        raise RuntimeError(f"git patch-id failed with exit code {patch_id.returncode}: "
+                           f"{patch_id_errors.decode(errors='replace')}")
+    patch_ids = {}
+    for line in output.decode().splitlines():
+        patch, commit_hash = line.split()
+        patch_ids[commit_hash] = patch
+    return patch_ids
@@ -0,0 +1,134 @@
+import re
+
+try:  # Optional: exact counts for OpenAI models when tiktoken is installed
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4  # Heuristic used when tiktoken is unavailable; close enough for English text and code
+HUNK_HEADER = re.compile(r"^@@ .* @@", re.MULTILINE)
+
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of model tokens in `text` without any network access."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def change_type_of(change) -> str:
+    """
+    Returns the change type letter of a GitPython `Diff` or `history.FileChange`.
+
+    GitPython leaves `change_type` unset on diffs parsed from patch output, so it is derived from the flags then.
+    """
+    if change.change_type:
+        return change.change_type
+    if change.new_file:
+        return "A"
+    if change.deleted_file:
+        return "D"
+    if change.renamed_file:
+        return "R"
+    return "M"
+
+
+def path_of(change) -> str:
+    """Returns the most meaningful path of a change: the new path, or the old one for deletions."""
+    return change.b_path or change.a_path
+
+
+def summarize_diff(diff) -> str:
+    """The one-line-per-file summary of a diff, e.g. 'M src/app.py'."""
+    return "".join(f"{change_type_of(change)} {path_of(change)}\n" for change in diff)
+
+
+class DiffPayloadBuilder:
+    """
+    Builds the diff text sent to the model within a token budget.
+
+    Each file contributes a header line and, when the diff carries patches (GitPython `create_patch=True`), its
+    hunks. Hunks longer than `max_hunk_tokens` are trimmed, and files are packed in order into chunks of at most
+    `token_budget` tokens; a file too large for one chunk is split between hunks. At most `max_chunks` chunks are
+    produced: files that do not fit are collapsed into a single 'omitted' line, so the cost of a commit is bounded
+    however large its diff is.
+
+    :param token_budget: The maximum estimated tokens of diff text per chunk.
+    :type token_budget: int
+    :param max_hunk_tokens: The maximum estimated tokens kept per hunk.
+    :type max_hunk_tokens: int
+    :param max_chunks: The maximum number of chunks per commit.
+    :type max_chunks: int
+
+    Example usage:
+        builder = DiffPayloadBuilder(token_budget=3000)
+        chunks = builder.build(commit.parents[0].diff(commit, create_patch=True))
+    """
+    def __init__(self, token_budget=3000, max_hunk_tokens=400, max_chunks=8):
+        self.token_budget = token_budget
+        self.max_hunk_tokens = max_hunk_tokens
+        self.max_chunks = max_chunks
+
+    def build(self, diff) -> list:
+        """Returns the payload chunks for `diff`; a diff that fits the budget yields exactly one chunk."""
+        chunks = []
+        current, current_tokens = [], 0
+        files = list(diff)
+        for index, change in enumerate(files):
+            pieces = self._file_pieces(change)
+            for piece in pieces:
+                piece_tokens = estimate_tokens(piece)
+                if current and current_tokens + piece_tokens > self.token_budget:
+                    chunks.append("".join(current))
+                    current, current_tokens = [], 0
+                    if len(chunks) == self.max_chunks:
+                        return self._with_omitted(chunks, files[index:])
+                current.append(piece)
+                current_tokens += piece_tokens
+        if current or not chunks:
+            chunks.append("".join(current))
+        return chunks
+
+    def _file_pieces(self, change):
+        """The header of a file followed by its (trimmed) hunks; splitting only ever happens between pieces."""
+        header = f"{change_type_of(change)} {path_of(change)}"
+        if change_type_of(change) == "R" and change.a_path != change.b_path:
+            header += f" (from {change.a_path})"
+        patch = getattr(change, "diff", None)
+        if isinstance(patch, bytes):
+            patch = patch.decode("utf-8", "replace")
+        if not patch:
+            return [header + "\n"]
+        if patch.startswith("Binary files") or "\nBinary files" in patch[:200]:
+            return [header + " (binary)\n"]
+        hunk_starts = [match.start() for match in HUNK_HEADER.finditer(patch)] or [0]
+        hunks = [patch[start:end] for start, end in zip(hunk_starts, hunk_starts[1:] + [len(patch)])]
+        return [header + "\n"] + [self._trim(hunk) for hunk in hunks]
+
+    def _trim(self, hunk):
+        if not hunk.endswith("\n"):
+            hunk += "\n"
+        if estimate_tokens(hunk) <= self.max_hunk_tokens:
+            return hunk
+        kept, tokens = [], 0
+        lines = hunk.splitlines(keepends=True)
+        for line in lines:
+            line_tokens = estimate_tokens(line)
+            if kept and tokens + line_tokens > self.max_hunk_tokens:
+                break
+            kept.append(line)
+            tokens += line_tokens
+        kept.append(f"[... {len(lines) - len(kept)} more lines trimmed]\n")
+        return "".join(kept)
+
+    @staticmethod
+    def _with_omitted(chunks, remaining):
+        chunks[-1] += f"[... {len(remaining)} more files omitted: " \
+                      f"{', '.join(path_of(change) for change in remaining[:20])}" \
+                      f"{', ...' if len(remaining) > 20 else ''}]\n"
+        return chunks
@@ -0,0 +1,56 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import utils
+
+
+class ConcurrentCommitPipeline:
+    """
+    Builds `CommitOutput` objects for a sequence of commits with a bounded number of model requests in flight.
+
+    Building a commit's output is dominated by the network round trip to the model, so the work is handed to a
+    thread pool. At most `max_in_flight` commits are being built at any time, and results are yielded in the
+    same order as the input commits, which keeps the formatted output deterministic.
+
+    :param max_in_flight: The maximum number of commits being built concurrently.
+    :type max_in_flight: int
+    :param build_output: The callable turning a commit into a `CommitOutput`. Defaults to
+        `utils.generate_commit_output`.
+
+    Example usage:
+        pipeline = ConcurrentCommitPipeline(max_in_flight=8)
+        for commit, commit_output in pipeline.run(commits):
+            print(formatter.format(commit_output))
+    """
+    def __init__(self, max_in_flight: int = 4, build_output=None):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.build_output = build_output or utils.generate_commit_output
+
+    def run(self, commits, return_exceptions=False):
+        """
+        Yields `(commit, commit_output)` pairs in input order while keeping the pool saturated.
+
+        Exceptions raised while building an output are re-raised when that commit's turn comes, or yielded in place
+        of the output with `return_exceptions`, so one failed commit does not stop the others.
+        """
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="gitgrazer") as executor:
+            try:
+                for commit in commits:
+                    pending.append((commit, executor.submit(self.build_output, commit)))
+                    if len(pending) >= self.max_in_flight:
+                        yield self._result(*pending.popleft(), return_exceptions)
+                while pending:
+                    yield self._result(*pending.popleft(), return_exceptions)
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    @staticmethod
+    def _result(commit, future, return_exceptions):
+        if return_exceptions:
+            error = future.exception()
+            if error is not None:
+                return commit, error
+        return commit, future.result()
@@ -0,0 +1,259 @@
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset_duration(value):
+    """Parses OpenAI rate-limit reset values such as '20ms', '1s' or '6m0s' into seconds; None if unparsable."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers):
+    """Returns the server-requested delay from `retry-after-ms`/`retry-after` headers, or None."""
+    if not headers:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    try:
+        return float(headers.get("retry-after")) if headers.get("retry-after") else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """A per-minute budget refilled continuously; a budget of None never limits."""
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.available = float(per_minute) if per_minute else math.inf
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.per_minute:
+            self.available = min(self.per_minute, self.available + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (requests larger than the whole budget wait for a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.per_minute or amount)
+        return 0.0 if self.available >= amount else (amount - self.available) * 60 / self.per_minute
+
+    def take(self, amount):
+        self.available -= min(amount, self.per_minute or amount)
+
+
+class RetryableError(Exception):
+    """Raised by request callables to ask the scheduler for a retry, optionally after `retry_after` seconds."""
+    def __init__(self, message, retry_after=None, rate_limited=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited
+
+
+class StreamInterruptedError(Exception):
+    """
+    Raised when a streamed answer fails after part of it was passed on. It is never retried: the retry would pass
+    the beginning of a possibly different answer on a second time.
+    """
+
+
+def classify_error(error):
+    """
+    Returns `(retryable, rate_limited, retry_after)` for an exception raised by a model request.
+
+    Rate limits (429), timeouts, connection failures, conflicts and server errors are retried; anything else (bad
+    requests, authentication, ...) fails immediately.
+    """
+    if isinstance(error, RetryableError):
+        return True, error.rate_limited, error.retry_after
+    if isinstance(error, StreamInterruptedError):
+        return False, False, None
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    retry_after = retry_after_seconds(getattr(response, "headers", None))
+    if status == 429:
+        return True, True, retry_after
+    if status in (408, 409) or (status is not None and status >= 500):
+        return True, False, retry_after
+    if status is None and (isinstance(error, (TimeoutError, ConnectionError))
+                           or type(error).__name__ in ("APITimeoutError", "APIConnectionError")):
+        return True, False, None
+    return False, False, None
+
+
+class RateLimitScheduler:
+    """
+    Runs model requests under adaptive concurrency, per-minute budgets and retry with backoff.
+
+    Concurrency follows AIMD: every success raises the in-flight limit by 1/limit (about one extra slot per
+    round of requests), every rate limit or overload error halves it. Requests also wait for the per-minute
+    request and token budgets, and the whole scheduler pauses when the server says so (`retry-after`, or
+    `x-ratelimit-remaining-*` reaching zero before `x-ratelimit-reset-*`). Failed requests are retried with
+    full-jitter exponential backoff, never sooner than the server asked.
+
+    :param max_concurrency: The upper bound of the adaptive in-flight limit.
+    :param initial_concurrency: The starting in-flight limit.
+    :param requests_per_minute: The request budget, or None for no limit.
+    :param tokens_per_minute: The token budget, or None for no limit.
+    :param max_retries: The number of retries before a request fails permanently.
+    :param base_delay: The backoff base in seconds.
+    :param max_delay: The backoff cap in seconds.
+
+    Example usage:
+        scheduler = RateLimitScheduler(max_concurrency=8, requests_per_minute=500, tokens_per_minute=90_000)
+        content = scheduler.run(lambda: send_request(), tokens=1200)
+    """
+    def __init__(self, max_concurrency=8, initial_concurrency=2, requests_per_minute=None, tokens_per_minute=None,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._random = random.Random()
+
+    def run(self, request, tokens=0):
+        """
+        Calls `request()` under the scheduler's limits and returns its value.
+
+        `request` returns a `(value, headers)` pair; the headers (may be None) feed the rate-limit tracking. The
+        last error is re-raised once `max_retries` is exhausted or for errors that are not retryable.
+        """
+        attempt = 0
+        while True:
+            self._acquire(tokens)
+            try:
+                value, headers = request()
+            except Exception as error:
+                retryable, rate_limited, retry_after = classify_error(error)
+                self._release(success=False, overloaded=retryable, headers=None, retry_after=retry_after,
+                              rate_limited=rate_limited)
+                if not retryable or attempt >= self.max_retries:
+                    with self._condition:
+                        self.failures += 1
+                    raise
+                delay = self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                time.sleep(max(delay, retry_after or 0))
+                attempt += 1
+                with self._condition:
+                    self.retries += 1
+                continue
+            self._release(success=True, overloaded=False, headers=headers)
+            return value
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"concurrency_limit": round(self.limit, 2), "in_flight": self._in_flight, "retries": self.retries,
+                    "rate_limited": self.rate_limited, "failures": self.failures}
+
+    def _acquire(self, tokens):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._in_flight >= max(1, math.floor(self.limit)):
+                    wait = None  # Woken up when a request finishes
+                else:
+                    wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        self._requests.take(1)
+                        self._tokens.take(tokens)
+                        self._in_flight += 1
+                        return
+                self._condition.wait(timeout=wait)
+
+    def _release(self, success, overloaded, headers, retry_after=None, rate_limited=False):
+        with self._condition:
+            self._in_flight -= 1
+            if success:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif overloaded:
+                self.limit = max(1.0, self.limit / 2)
+            if rate_limited:
+                self.rate_limited += 1
+            pause = retry_after or 0
+            if headers:
+                for kind in ("requests", "tokens"):
+                    remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                    if remaining is not None and remaining.strip() == "0":
+                        pause = max(pause, parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}")) or 0)
+            if pause:
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            self._condition.notify_all()
+
+
+class DeadLetterQueue:
+    """
+    Commits whose description failed permanently, persisted so that the next run retries them.
+
+    :param filepath: The path of the JSON file holding the entries.
+    :type filepath: str
+
+    Example usage:
+        dead_letters = DeadLetterQueue()
+        for commit_hash in dead_letters.commit_hashes():
+            ...  # Reprocess
+            dead_letters.remove(commit_hash)
+    """
+    def __init__(self, filepath='dead_letters.json'):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as file:
+                self._entries = json.load(file)
+
+    def add(self, commit_hash, error):
+        with self._lock:
+            previous = self._entries.get(commit_hash, {})
+            self._entries[commit_hash] = {"error": f"{type(error).__name__}: {error}",
+                                          "attempts": previous.get("attempts", 0) + 1,
+                                          "failed_at": time.time()}
+            self._save()
+
+    def remove(self, commit_hash):
+        with self._lock:
+            if self._entries.pop(commit_hash, None) is not None:
+                self._save()
+
+    def commit_hashes(self):
+        with self._lock:
+            return list(self._entries)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.filepath))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as file:
+            json.dump(self._entries, file, indent=2)
+        os.replace(file.name, self.filepath)
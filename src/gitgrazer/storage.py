@@ -1,6 +1,41 @@
+import datetime
 import json
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
 from abc import ABC, abstractmethod
+from models import CommitOutput
+
+OUTPUT_COMPRESSION_LEVEL = 6  # zlib level of the stored outputs; descriptions are prose and compress well
+MAX_BATCH_SECONDS = 1.0  # Buffered saves older than this are flushed with the next save
+
+
+def encode_output(commit_output: CommitOutput) -> bytes:
+    """Serializes a commit output compactly: its JSON, zlib-compressed."""
+    return zlib.compress(commit_output.model_dump_json().encode("utf-8"), OUTPUT_COMPRESSION_LEVEL)
+
+
+def decode_output(data: bytes) -> CommitOutput:
+    return _restore_date(CommitOutput.model_validate_json(zlib.decompress(data)))
+
+
+def _restore_date(commit_output: CommitOutput) -> CommitOutput:
+    # `date` is untyped, so JSON round trips turn datetimes into ISO strings; render them as before.
+    if isinstance(commit_output.date, str):
+        try:
+            commit_output.date = datetime.datetime.fromisoformat(commit_output.date)
+        except ValueError:
+            pass
+    return commit_output
+
+
+def _authored_timestamp(commit_output: CommitOutput):
+    date = commit_output.date
+    return int(date.timestamp()) if isinstance(date, datetime.datetime) else None
+
 
 class CommitDataStorage(ABC):
     """
@@ -16,6 +51,51 @@ class CommitDataStorage(ABC):
     def has_commit(self, commit_hash):
         pass
 
+    def has_commits(self, commit_hashes) -> set:
+        """Returns the subset of `commit_hashes` that has already been processed."""
+        return {commit_hash for commit_hash in commit_hashes if self.has_commit(commit_hash)}
+
+    def get_watermark(self, ref):
+        """
+        Returns the last processed tip commit hash of `ref`, or None if the ref has not been processed yet.
+
+        Storages that do not keep watermarks always return None, so incremental walks start from scratch.
+        """
+        return None
+
+    def set_watermark(self, ref, commit_hash):
+        """Records `commit_hash` as the last processed tip of `ref`; storages without watermarks ignore it."""
+        pass
+
+    def save_output(self, commit_output: CommitOutput):
+        """
+        Keeps the complete output of a processed commit, so it can be rendered again without recomputation.
+
+        Storages that do not keep outputs only record the commit as processed.
+        """
+        self.save(commit_output.commit_hash)
+
+    def get_outputs(self, commit_hashes) -> dict:
+        """Returns the stored outputs of `commit_hashes` as a dict keyed by commit hash; unknown hashes are left out."""
+        return {}
+
+    def iter_outputs(self):
+        """Yields every stored output, oldest author date first."""
+        return iter(())
+
+    def flush(self):
+        """Persists any buffered writes. Storages that write through need not override this."""
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class JsonCommitDataStorage(CommitDataStorage):
     """
     This class is a implementation of the `CommitDataStorage` interface and provides functionality to store and retrieve processed commit data in a JSON file.
@@ -28,10 +108,10 @@ class JsonCommitDataStorage(CommitDataStorage):
             Parameters:
                 - filepath (str): The path to the JSON file to be used for storage. If not provided, the default value is 'processed_commits.json'.
 
-        - _load(self):
-            Loads the processed commits from the JSON file.
+        - _load(filepath, container):
+            Loads the processed commits (or the ref watermarks) from a JSON file.
             Returns:
-                - set: A set of processed commit hashes.
+                - container: A set of processed commit hashes, or a dict of watermarks keyed by ref.
 
         - save(self, commit_hash):
             Adds a commit hash to the list of processed commits and saves it to the JSON file.
@@ -45,6 +125,12 @@ class JsonCommitDataStorage(CommitDataStorage):
             Returns:
                 - bool: True if the commit hash is present, False otherwise.
 
+        - get_watermark(self, ref) / set_watermark(self, ref, commit_hash):
+            Reads or records the last processed tip of a ref, kept in a sibling '<name>.watermarks.json' file.
+
+        - save_output(self, commit_output) / get_outputs(self, commit_hashes) / iter_outputs(self):
+            Keeps or reads complete commit outputs, appended as JSON lines to a sibling '<name>.outputs.jsonl' file.
+
     Example usage:
         storage = JsonCommitDataStorage('processed_commits.json')
         storage.save('commit_1')
@@ -54,18 +140,225 @@ class JsonCommitDataStorage(CommitDataStorage):
     """
     def __init__(self, filepath='processed_commits.json'):
         self.filepath = filepath
-        self._processed_commits = self._load()
+        self.watermarks_filepath = os.path.splitext(filepath)[0] + '.watermarks.json'
+        self._processed_commits = self._load(self.filepath, set)
+        self._watermarks = self._load(self.watermarks_filepath, dict)
+        self.outputs_filepath = os.path.splitext(filepath)[0] + '.outputs.jsonl'
+        self._outputs = self._load_outputs(self.outputs_filepath)
 
-    def _load(self):
-        if os.path.exists(self.filepath):
-            with open(self.filepath, 'r') as file:
-                return set(json.load(file))
-        return set()
+    @staticmethod
+    def _load(filepath, container):
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as file:
+                return container(json.load(file))
+        return container()
+
+    @staticmethod
+    def _load_outputs(filepath):
+        # One serialized output per line, appended as commits are processed; later lines win.
+        outputs = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        commit_output = _restore_date(CommitOutput.model_validate_json(line))
+                        outputs[commit_output.commit_hash] = commit_output
+        return outputs
+
+    @staticmethod
+    def _dump(filepath, data):
+        # Write to a sibling temp file and swap it in, so a crash mid-write never leaves a truncated file behind.
+        directory = os.path.dirname(os.path.abspath(filepath))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as file:
+            json.dump(data, file)
+        os.replace(file.name, filepath)
 
     def save(self, commit_hash):
         self._processed_commits.add(commit_hash)
-        with open(self.filepath, 'w') as file:
-            json.dump(list(self._processed_commits), file)
+        self._dump(self.filepath, list(self._processed_commits))
 
     def has_commit(self, commit_hash):
         return commit_hash in self._processed_commits
+
+    def get_watermark(self, ref):
+        return self._watermarks.get(ref)
+
+    def set_watermark(self, ref, commit_hash):
+        self._watermarks[ref] = commit_hash
+        self._dump(self.watermarks_filepath, self._watermarks)
+
+    def save_output(self, commit_output: CommitOutput):
+        with open(self.outputs_filepath, 'a', encoding='utf-8') as file:
+            file.write(commit_output.model_dump_json() + '\n')
+        self._outputs[commit_output.commit_hash] = commit_output
+        if commit_output.commit_hash not in self._processed_commits:
+            self.save(commit_output.commit_hash)
+
+    def get_outputs(self, commit_hashes) -> dict:
+        return {commit_hash: self._outputs[commit_hash] for commit_hash in commit_hashes
+                if commit_hash in self._outputs}
+
+    def iter_outputs(self):
+        outputs = sorted(self._outputs.values(), key=lambda output: _authored_timestamp(output) or 0)
+        return iter(outputs)
+
+
+class SqliteCommitDataStorage(CommitDataStorage):
+    """
+    A `CommitDataStorage` backed by a SQLite database in WAL mode.
+
+    Unlike `JsonCommitDataStorage`, saving a commit appends a single row instead of rewriting every known hash,
+    so a backfill costs O(n) I/O. Saves are buffered in memory and written in one short transaction per
+    `batch_size` rows, or with the first save after `max_batch_seconds`; they are visible to this instance
+    immediately and to other processes once flushed. No transaction stays open between saves, so the write lock
+    is never held across model latency, and WAL mode plus a busy timeout lets several processes read and write
+    the same database safely. A crash loses at most the current unflushed batch. Complete commit outputs are
+    kept alongside, each compressed with `encode_output`.
+
+    :param filepath: The path to the SQLite database file.
+    :type filepath: str
+    :param batch_size: The number of saves grouped into one transaction.
+    :type batch_size: int
+    :param max_batch_seconds: The age at which buffered saves are flushed regardless of their number.
+    :type max_batch_seconds: float
+
+    Example usage:
+        with SqliteCommitDataStorage('processed_commits.sqlite3') as storage:
+            storage.save('commit_1')
+            storage.save('commit_2')
+            print(storage.has_commit('commit_1'))  # Output: True
+            print(storage.has_commits(['commit_2', 'commit_3']))  # Output: {'commit_2'}
+    """
+    # SQLite's default limit on host parameters in a single statement is 999 on older builds.
+    QUERY_CHUNK_SIZE = 900
+
+    def __init__(self, filepath='processed_commits.sqlite3', batch_size=100, max_batch_seconds=MAX_BATCH_SECONDS):
+        self.filepath = filepath
+        self.batch_size = batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self._pending_commits = {}  # Saved, not yet written hashes, in save order
+        self._pending_outputs = {}  # Commit hash -> row of `commit_outputs`, not yet written
+        self._batch_started = None
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(filepath, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS processed_commits (commit_hash TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks (ref TEXT PRIMARY KEY, commit_hash TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS commit_outputs ("
+            " commit_hash TEXT PRIMARY KEY,"
+            " authored_timestamp INTEGER,"
+            " output BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def save(self, commit_hash):
+        with self._lock:
+            self._pending_commits[commit_hash] = None
+            if self._batch_started is None:
+                self._batch_started = time.monotonic()
+            if len(self._pending_commits) >= self.batch_size \
+                    or time.monotonic() - self._batch_started >= self.max_batch_seconds:
+                self.flush()
+
+    def save_many(self, commit_hashes):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO processed_commits (commit_hash) VALUES (?)",
+                ((commit_hash,) for commit_hash in commit_hashes),
+            )
+            self.flush()
+
+    def has_commit(self, commit_hash):
+        with self._lock:
+            if commit_hash in self._pending_commits:
+                return True
+            row = self._connection.execute(
+                "SELECT 1 FROM processed_commits WHERE commit_hash = ?", (commit_hash,)
+            ).fetchone()
+        return row is not None
+
+    def has_commits(self, commit_hashes) -> set:
+        commit_hashes = list(commit_hashes)
+        with self._lock:
+            found = {commit_hash for commit_hash in commit_hashes if commit_hash in self._pending_commits}
+            for start in range(0, len(commit_hashes), self.QUERY_CHUNK_SIZE):
+                chunk = commit_hashes[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT commit_hash FROM processed_commits WHERE commit_hash IN ({placeholders})", chunk
+                )
+                found.update(row[0] for row in rows)
+        return found
+
+    def save_output(self, commit_output: CommitOutput):
+        row = (commit_output.commit_hash, _authored_timestamp(commit_output), encode_output(commit_output))
+        with self._lock:
+            self._pending_outputs[commit_output.commit_hash] = row
+            self.save(commit_output.commit_hash)
+
+    def get_outputs(self, commit_hashes) -> dict:
+        commit_hashes = list(commit_hashes)
+        with self._lock:
+            outputs = {commit_hash: decode_output(self._pending_outputs[commit_hash][2])
+                       for commit_hash in commit_hashes if commit_hash in self._pending_outputs}
+            for start in range(0, len(commit_hashes), self.QUERY_CHUNK_SIZE):
+                chunk = commit_hashes[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT commit_hash, output FROM commit_outputs WHERE commit_hash IN ({placeholders})", chunk
+                ).fetchall()
+                outputs.update((commit_hash, decode_output(data)) for commit_hash, data in rows)
+        return outputs
+
+    def iter_outputs(self):
+        with self._lock:
+            self.flush()
+            rows = self._connection.execute(
+                "SELECT output FROM commit_outputs ORDER BY authored_timestamp, commit_hash"
+            ).fetchall()
+        # Decoded lazily, so only the compressed rows are held in memory at once.
+        return (decode_output(data) for (data,) in rows)
+
+    def get_watermark(self, ref):
+        with self._lock:
+            row = self._connection.execute("SELECT commit_hash FROM watermarks WHERE ref = ?", (ref,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, ref, commit_hash):
+        # Flushed together with any pending saves, so the watermark never gets ahead of the processed commits.
+        with self._lock:
+            self._write_pending()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO watermarks (ref, commit_hash) VALUES (?, ?)", (ref, commit_hash)
+            )
+            self._connection.commit()
+
+    def flush(self):
+        with self._lock:
+            self._write_pending()
+            self._connection.commit()
+
+    def _write_pending(self):
+        # Opens the write transaction only once the whole batch is ready to be written.
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO processed_commits (commit_hash) VALUES (?)",
+            ((commit_hash,) for commit_hash in self._pending_commits),
+        )
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO commit_outputs (commit_hash, authored_timestamp, output) VALUES (?, ?, ?)",
+            self._pending_outputs.values(),
+        )
+        self._pending_commits.clear()
+        self._pending_outputs.clear()
+        self._batch_started = None
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._connection.close()
@@ -1,4 +1,12 @@
+import difflib
+import fnmatch
+import re
+import subprocess
+import threading
 from abc import ABC, abstractmethod
+from collections import Counter
+from models import ChangeDescription
+from payloads import change_type_of, path_of, summarize_diff
 
 class ChangeDescriptionStrategy(ABC):
     """
@@ -32,63 +40,363 @@ class BasicChangeDescriptionStrategy(ChangeDescriptionStrategy):
         File Added: path/to/file1.py
         File Modified: path/to/file2.py
         File Deleted: path/to/file3.py
-        File Renamed (Possible): path/to/file4.py
+        File Renamed: path/to/file4.py -> path/to/file5.py
 
     """
     def generate(self, diff):
         description = ""
         for change in diff:
-            if change.a_path:
-                description += f"File Added: {change.a_path}\n"
-            elif change.d_path:
-                description += f"File Deleted: {change.d_path}\n"
-            elif change.b_path:
-                description += f"File Modified: {change.b_path}\n"
+            # Works for GitPython diffs (raw or patch) and bulk-extracted history.FileChange records alike.
+            change_type = change_type_of(change)
+            if change_type == "A":
+                description += f"File Added: {change.b_path}\n"
+            elif change_type == "D":
+                description += f"File Deleted: {change.a_path}\n"
+            elif change_type == "R":
+                description += f"File Renamed: {change.a_path} -> {change.b_path}\n"
             else:
-                description += f"File Renamed (Possible): {change.a_path or change.b_path}\n"
+                description += f"File Modified: {change.b_path}\n"
         return description
 
 
+DEFAULT_TRIVIAL_GLOBS = {
+    "dependency lockfile": ["package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock",
+                            "Pipfile.lock", "uv.lock", "Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum"],
+    "generated file": ["*.min.js", "*.min.css", "*.map", "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "*.generated.*",
+                       "dist/*", "build/*"],
+    "binary asset": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.ico", "*.webp", "*.bmp", "*.woff", "*.woff2", "*.ttf",
+                     "*.otf", "*.eot", "*.pdf", "*.zip", "*.jar"],
+}
+# Files whose whitespace is syntax, so whitespace-only changes to them are never classified as formatting.
+INDENTATION_SENSITIVE_GLOBS = ["*.py", "*.pyi", "*.pyw", "*.pyx", "*.yaml", "*.yml", "Makefile", "*.mk", "*.coffee",
+                               "*.haml", "*.pug", "*.sass", "*.styl"]
+# An assignment of a version number, e.g. `version = "1.2.3"`, `"version": "1.2.3",` or `__version__ = '2.0'`.
+VERSION_LINE = re.compile(r"""^\s*["']?[\w.-]*version[\w.-]*["']?\s*[:=]\s*["']?v?\d+(\.\d+)+[\w.+-]*["']?,?\s*$""",
+                          re.IGNORECASE)
+FORMATTING = "formatting"
+VERSION_BUMP = "version bump"
+
+
+class TrivialCommitClassifier:
+    """
+    A rule-based fast path recognizing commits that need no model analysis.
+
+    A commit is trivial when every changed file falls in one of these categories:
+        - a path matching one of the `path_globs` categories (lockfiles, generated files, binary assets, ...),
+          matched against both the full path and the file name;
+        - a binary file;
+        - a whitespace-only change: the removed and added lines split into the same whitespace-separated tokens
+          (indentation, spacing and line wrapping changed, but no space added or removed within text), except in
+          files matching `indentation_sensitive_globs`, where whitespace can change the meaning;
+        - a version bump: every changed line assigns a version number, at most `max_version_bump_lines` in total.
+    Whitespace and version checks need the patch text (GitPython `create_patch=True`); without it only paths and
+    binary flags are used. Commits touching more than `max_files` files are never classified. `describe` returns a
+    templated `ChangeDescription` for trivial commits and None for the others, which go on to the model.
+
+    Unlike a `ChangeDescriptionStrategy`, the classifier does not describe every diff; it only decides whether
+    the model is needed at all.
+
+    :param path_globs: Category names mapped to glob patterns.
+    :type path_globs: dict
+    :param indentation_sensitive_globs: Glob patterns of files never classified as whitespace-only changes.
+    :type indentation_sensitive_globs: list of str
+    :param max_version_bump_lines: The maximum number of changed lines of a version bump.
+    :type max_version_bump_lines: int
+    :param max_files: The maximum number of files of a trivial commit.
+    :type max_files: int
+
+    :ivar classified: The number of commits described without the model, i.e. model calls saved.
+
+    Example usage:
+        classifier = TrivialCommitClassifier()
+        change_description = classifier.describe(diff)
+        if change_description is None:
+            change_description = ...  # Ask the model
+    """
+    def __init__(self, path_globs=None, indentation_sensitive_globs=None, max_version_bump_lines=6, max_files=200):
+        self.path_globs = DEFAULT_TRIVIAL_GLOBS if path_globs is None else path_globs
+        self.indentation_sensitive_globs = (INDENTATION_SENSITIVE_GLOBS if indentation_sensitive_globs is None
+                                            else indentation_sensitive_globs)
+        self.max_version_bump_lines = max_version_bump_lines
+        self.max_files = max_files
+        self.classified = 0
+        self._lock = threading.Lock()
+
+    def describe(self, diff):
+        """Returns a templated `ChangeDescription` when the whole commit is trivial, otherwise None."""
+        changes = list(diff)
+        categories = self.classify(changes)
+        if categories is None:
+            return None
+        with self._lock:
+            self.classified += 1
+        counts = Counter(categories)
+        kinds = ", ".join(f"{category} ({count} file{'s' if count > 1 else ''})" for category, count in counts.items())
+        paths = ", ".join(path_of(change) for change in changes[:10]) + (", ..." if len(changes) > 10 else "")
+        content = (f"Routine change: {kinds}. Files: {paths}. This commit was classified as trivial by rule, "
+                   f"so no detailed analysis was generated.")
+        return ChangeDescription(content=content, diff_summary=summarize_diff(changes))
+
+    def classify(self, diff):
+        """Returns the category of each changed file when the whole commit is trivial, otherwise None."""
+        changes = list(diff)
+        if not changes or len(changes) > self.max_files:
+            return None
+        categories = []
+        version_lines = 0
+        for change in changes:
+            category = self._path_category(change)
+            if category is None:
+                patch = self._patch_text(change)
+                if patch is None:
+                    return None
+                if patch.startswith("Binary files") or "\nBinary files" in patch[:200]:
+                    category = "binary asset"
+                else:
+                    removed, added = self._changed_lines(patch)
+                    if not removed and not added:
+                        return None  # A mode change or pure rename still deserves a look
+                    if self._tokens(removed) == self._tokens(added) and not self._matches(
+                            change, self.indentation_sensitive_globs):
+                        category = FORMATTING
+                    elif all(VERSION_LINE.match(line) for line in removed + added if line.strip()):
+                        category = VERSION_BUMP
+                        version_lines += len(removed) + len(added)
+                    else:
+                        return None
+            categories.append(category)
+        if version_lines > self.max_version_bump_lines:
+            return None
+        return categories
+
+    def _path_category(self, change):
+        for category, patterns in self.path_globs.items():
+            if self._matches(change, patterns):
+                return category
+        if getattr(change, "binary", False):  # history.FileChange knows without a patch
+            return "binary asset"
+        return None
+
+    @staticmethod
+    def _matches(change, patterns):
+        path = path_of(change)
+        name = path.rsplit("/", 1)[-1]
+        return any(fnmatch.fnmatchcase(path, pattern) or fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+
+    @staticmethod
+    def _patch_text(change):
+        patch = getattr(change, "diff", None)
+        if isinstance(patch, bytes):
+            patch = patch.decode("utf-8", "replace")
+        return patch or None
+
+    @staticmethod
+    def _changed_lines(patch):
+        # GitPython patches start at the first hunk, so every +/- line is content (even "+++ x" or "--- y").
+        removed, added = [], []
+        for line in patch.splitlines():
+            if line.startswith("+"):
+                added.append(line[1:])
+            elif line.startswith("-"):
+                removed.append(line[1:])
+        return removed, added
+
+    @staticmethod
+    def _tokens(lines):
+        # Whitespace may change in amount and lines may be rewrapped, but it may not appear or disappear between
+        # two tokens: "int x" and "intx", or "hello world" and "helloworld", differ.
+        return [token for line in lines for token in line.split()]
+
+
 class VerboseChangeDescriptionStrategy(ChangeDescriptionStrategy):
     """
     A change description strategy that generates a verbose description of file changes.
 
-    This strategy generates a string description of the file changes in a diff.
-    The description includes information about added, deleted, modified, and renamed files,
-    as well as the diff details for modified files.
+    Every file gets the same header line as `BasicChangeDescriptionStrategy`, followed for text files by unified
+    diff hunks with `context_lines` lines of context. Memory is bounded whatever the size of the commit:
+        - blobs are read in `READ_SIZE` pieces from one `git cat-file --batch` process per repository; a blob
+          that turns out to be binary (a NUL byte in its first `BINARY_SNIFF_BYTES`) or larger than
+          `max_blob_bytes` is read to its end and discarded piece by piece, and its file is listed with its size
+          instead of a diff;
+        - the hunks of one file are cut off after `max_file_bytes` characters;
+        - the description stops growing after `max_commit_bytes` characters, the remaining files being counted
+          in an 'omitted' line.
+    The description is assembled in a list and joined once.
 
-    Attributes:
-        None
+    Blob ids come from GitPython diffs (`a_blob`/`b_blob`); for `history.FileChange` records, which only carry blob
+    ids, pass the repository so the blobs can be read from it. Call `close` (or use the strategy as a context
+    manager) to stop the `git cat-file` processes.
 
-    Methods:
-        generate(diff): Generates the verbose change description for the given diff.
-        _generate_diff_summary(change): Generates the diff summary for a modified file.
-
-    Note:
-        This class inherits from the ChangeDescriptionStrategy base class.
+    :param repo: The `git.Repo` used to read blobs by id, if the diffs do not carry blob objects.
+    :param context_lines: The number of context lines around each change.
+    :type context_lines: int
+    :param max_blob_bytes: The largest blob diffed as text.
+    :type max_blob_bytes: int
+    :param max_file_bytes: The maximum size of the hunks of one file.
+    :type max_file_bytes: int
+    :param max_commit_bytes: The maximum size of the whole description.
+    :type max_commit_bytes: int
+    :param git_executable: The git executable blobs are read with.
+    :type git_executable: str
 
     Example Usage:
-        strategy = VerboseChangeDescriptionStrategy()
-        diff = calculate_diff()
-        description = strategy.generate(diff)
+        with VerboseChangeDescriptionStrategy(context_lines=3) as strategy:
+            diff = commit.parents[0].diff(commit)
+            description = strategy.generate(diff)
     """
+    READ_SIZE = 1 << 16
+    BINARY_SNIFF_BYTES = 8000  # The same window git uses to decide whether a file is binary
+
+    def __init__(self, repo=None, context_lines=3, max_blob_bytes=1 << 20, max_file_bytes=64 << 10,
+                 max_commit_bytes=512 << 10, git_executable='git'):
+        self.repo = repo
+        self.context_lines = context_lines
+        self.max_blob_bytes = max_blob_bytes
+        self.max_file_bytes = max_file_bytes
+        self.max_commit_bytes = max_commit_bytes
+        self.git_executable = git_executable
+        self._batches = {}  # git directory -> _CatFileBatch
+        self._batches_lock = threading.Lock()
+
     def generate(self, diff):
-        description = ""
-        for change in diff:
-            if change.a_path:
-                description += f"File Added: {change.a_path}\n"
-            elif change.d_path:
-                description += f"File Deleted: {change.d_path}\n"
-            elif change.b_path:
-                description += f"File Modified: {change.b_path}\n"
-                description += self._generate_diff_summary(change)  # Add diff details
-            else:
-                description += f"File Renamed (Possible): {change.a_path or change.b_path}\n"
-        return description
+        parts = []
+        size = 0
+        changes = list(diff)
+        for index, change in enumerate(changes):
+            if size >= self.max_commit_bytes:
+                parts.append(f"[... {len(changes) - index} more files omitted: description size limit reached]\n")
+                break
+            for part in self._describe_file(change):
+                parts.append(part)
+                size += len(part)
+        return "".join(parts)
+
+    def _describe_file(self, change):
+        change_type = change_type_of(change)
+        if change_type == "A":
+            yield f"File Added: {change.b_path}\n"
+        elif change_type == "D":
+            yield f"File Deleted: {change.a_path}\n"
+        elif change_type == "R":
+            yield f"File Renamed: {change.a_path} -> {change.b_path}\n"
+        else:
+            yield f"File Modified: {change.b_path}\n"
+        old, old_note = self._read_side(change, "a")
+        new, new_note = self._read_side(change, "b")
+        if old_note or new_note:
+            yield f"  ({old_note or new_note})\n"
+            return
+        if old == new:
+            return  # Rename or mode change without content changes
+        yield from self._hunks(old, new, change)
+
+    def _hunks(self, old, new, change):
+        lines = difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True),
+                                     fromfile=f"a/{change.a_path or change.b_path}",
+                                     tofile=f"b/{change.b_path or change.a_path}", n=self.context_lines)
+        written = 0
+        for line in lines:
+            if not line.endswith("\n"):
+                line += "\n\\ No newline at end of file\n"
+            if written + len(line) > self.max_file_bytes:
+                yield f"[... diff truncated after {written} characters]\n"
+                return
+            written += len(line)
+            yield line
+
+    def _read_side(self, change, side):
+        """Returns `(text, None)` for a readable side ('' if the file does not exist), else `(None, reason)`."""
+        blob = self._blob_of(change, side)
+        if blob is None:
+            return "", None
+        git_dir, blob_id = blob
+        batch = self._batch(git_dir)
+        with batch.lock:
+            try:
+                size = batch.request(blob_id)
+                pieces = []
+                note = None
+                read = 0
+                while read < size:
+                    # Blobs ruled out are still read to their end, piece by piece and discarded, to keep the
+                    # shared stream in step; GitPython's streams would read their rest in one piece.
+                    piece = batch.read(min(self.READ_SIZE, size - read))
+                    if note is None:
+                        if read < self.BINARY_SNIFF_BYTES and b"\0" in piece[:self.BINARY_SNIFF_BYTES - read]:
+                            note = f"binary file, {size} bytes"
+                        elif size > self.max_blob_bytes:
+                            note = f"{size} bytes, too large for a textual diff"
+                        else:
+                            pieces.append(piece)
+                    read += len(piece)
+                batch.read(1)  # The newline after the content
+            except BaseException:
+                self._discard_batch(git_dir)  # Out of step; the next blob gets a new process
+                raise
+        if note is not None:
+            return None, note
+        return b"".join(pieces).decode("utf-8", "replace"), None
+
+    def _batch(self, git_dir):
+        with self._batches_lock:
+            batch = self._batches.get(git_dir)
+            if batch is None:
+                batch = self._batches[git_dir] = _CatFileBatch(self.git_executable, git_dir)
+            return batch
+
+    def _discard_batch(self, git_dir):
+        with self._batches_lock:
+            batch = self._batches.pop(git_dir, None)
+        if batch is not None:
+            batch.close()
+
+    def close(self):
+        """Stops the `git cat-file` processes; the strategy starts new ones if it is used again."""
+        with self._batches_lock:
+            batches, self._batches = list(self._batches.values()), {}
+        for batch in batches:
+            batch.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _blob_of(self, change, side):
+        """Returns the `(git directory, blob id)` of one side of a change, or None if the file does not exist."""
+        blob = getattr(change, f"{side}_blob", None)
+        if blob is not None:
+            return blob.repo.git_dir, blob.hexsha
+        blob_id = getattr(change, f"{side}_blob_id", None)
+        if self.repo is None or not blob_id or set(blob_id) == {"0"}:
+            return None
+        return self.repo.git_dir, blob_id
+
+
+class _CatFileBatch:
+    """A `git cat-file --batch` process serving the blobs of one repository; hold `lock` from request to the end."""
+    def __init__(self, git_executable, git_dir):
+        self.lock = threading.Lock()
+        self._process = subprocess.Popen([git_executable, "--git-dir", git_dir, "cat-file", "--batch"],
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def request(self, blob_id) -> int:
+        """Asks for a blob and returns its size; the content is then read with `read`, followed by a newline."""
+        self._process.stdin.write(f"{blob_id}\n".encode())
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().decode(errors="replace").split()
+        if len(header) != 3 or header[1] != "blob":
+            raise RuntimeError(f"git cat-file cannot read blob {blob_id}: {' '.join(header) or 'no answer'}")
+        return int(header[2])
+
+    def read(self, size) -> bytes:
+        data = self._process.stdout.read(size)
+        if len(data) != size:
+            raise RuntimeError(f"git cat-file exited with code {self._process.poll()} in the middle of a blob")
+        return data
 
-    def _generate_diff_summary(self, change):
-        summary = "Diff:\n"
-        for d in change.diff.iter_change_type('M'):
-            summary += f"+ {d.a_blob.data_stream.read().decode()} \n"  # Added lines
-            summary += f"- {d.b_blob.data_stream.read().decode()} \n"  # Removed lines
-        return summary
+    def close(self):
+        self._process.stdin.close()
+        self._process.stdout.close()
+        self._process.wait()
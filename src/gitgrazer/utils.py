@@ -1,10 +1,24 @@
-from openai import OpenAI
+import os
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor
 from models import CommitOutput, ChangeDescription
 from config import ConfigManager
+from history import CommitRecord
+from cache import LRUCache, SqliteChangeDescriptionCache, description_cache_key
+from payloads import DiffPayloadBuilder, estimate_tokens, summarize_diff
+from scheduler import RateLimitScheduler, StreamInterruptedError
+from strategies import TrivialCommitClassifier
 
-CONFIG_MANAGER = ConfigManager()
-OPENAI_API_KEY = CONFIG_MANAGER.app_config.get_config_value('OPENAI_API_KEY')
-CLIENT = OpenAI(api_key=OPENAI_API_KEY)
+MODEL = "gpt-3.5-turbo"  # Recommended model for chat-based tasks.
+SYSTEM_PROMPT = (
+    "You are a senior developer and code reviewer who specializes in decoding and explaining the "
+    "Git commit history. Your expertise allows you to identify patterns, design decisions, and "
+    "understand what changes occurred in each commit. Your role is to clearly articulate the work "
+    "completed in each commit to provide insight into the project's evolution and development "
+    "strategies. By investigating the Git commits, you create a narrative that depicts how the "
+    "project has evolved over time.")
 
 TEMPLATE = (
     "Based on the git diff output provided: /n"
@@ -23,45 +37,332 @@ TEMPLATE = (
     "further enhancements or adjustments. Your evaluation should be as conclusive as possible, reflecting a high "
     "degree of certainty in your interpretations.")
 
+# Lockfile bumps, formatting-only changes, generated files, version bumps and binary assets get a templated
+# description without a model call; set to None to send every commit to the model.
+TRIVIAL_CLASSIFIER = TrivialCommitClassifier()
 
-def generate_commit_output(commit) -> CommitOutput:
-    if commit.parents:
-        diff = commit.parents[0].diff(commit)
-        change_description = generate_change_description(diff)
+# Huge commits are split into chunks of at most PAYLOAD_TOKEN_BUDGET tokens, summarized in parallel (map) and combined
+# into one description (reduce), so prompt size, latency and cost per commit stay bounded.
+PAYLOAD_TOKEN_BUDGET = 3000
+MAX_HUNK_TOKENS = 400
+MAX_CHUNKS = 8
+MAP_CONCURRENCY = 4
+PAYLOAD_BUILDER = DiffPayloadBuilder(token_budget=PAYLOAD_TOKEN_BUDGET, max_hunk_tokens=MAX_HUNK_TOKENS,
+                                     max_chunks=MAX_CHUNKS)
+
+CHUNK_TEMPLATE = (
+    "The following is part {{part}} of {{parts}} of a large git commit's diff:\n"
+    "{{diff}}\n"
+    "Summarize concisely what this part of the commit adds, removes or alters and why it likely does so. "
+    "Another step will merge your summary with the summaries of the other parts.")
+
+REDUCE_TEMPLATE = (
+    "A large git commit was analyzed in {{parts}} parts. These are the summaries of the parts:\n"
+    "{{summaries}}\n"
+    "Combine them into a single analysis of the whole commit. Explain what was added, removed or altered, the likely "
+    "purpose of the changes, their impact on the project's functionality and any notable deviations from coding "
+    "standards or best practices. Present your findings in a clear, narrative form.")
+
+# The OpenAI client (and the SDK import it needs), the configuration and the description cache are created on first
+# use, so importing this module stays cheap and runs that never reach the model need no API key.
+_LAZY_LOCK = threading.Lock()
+_client = None
+_description_cache = None
+_scheduler = None
+_repos = {}  # git.Repo objects of bulk history records, by real path
+
+# Every model request goes through one RateLimitScheduler: it adapts concurrency to the server (AIMD), keeps within
+# the per-minute budgets (None: unlimited) and retries 429s, timeouts and server errors with jittered backoff.
+MAX_CONCURRENCY = 8
+REQUESTS_PER_MINUTE = None
+TOKENS_PER_MINUTE = None
+MAX_RETRIES = 6
+COMPLETION_TOKEN_ESTIMATE = 500  # Reserved from the token budget for each answer
+
+# Per-run memoization keyed by commit hexsha, so the command, strategy and formatters share one diff and one output.
+MEMO_SIZE = 256
+DIFF_CACHE = LRUCache(maxsize=MEMO_SIZE)
+OUTPUT_CACHE = LRUCache(maxsize=MEMO_SIZE)
+
+# GitPython reads objects through persistent `git cat-file` processes that serve one reader at a time; concurrent
+# readers interleave their requests and hang. Lazy commit attributes and diffs are loaded under the lock of their
+# repository (see `git_lock`), so commits of other repositories and model requests still proceed concurrently.
+_GIT_LOCKS = defaultdict(threading.RLock)  # By git directory; None for commits without a repository
+_GIT_LOCKS_LOCK = threading.Lock()
+
+# Stable patch ids of the commits of this run (see patchid.compute_patch_ids), scoped by repository with
+# `register_patch_ids`. Commits sharing a patch id share one description; PATCH_CACHE also makes concurrent duplicates
+# wait for the first one instead of asking the model twice.
+PATCH_IDS = {}
+PATCH_CACHE = LRUCache(maxsize=MEMO_SIZE)
+patch_reuses = 0
+
+# Descriptions answered by batch requests of this run (see batching.BatchChangeDescriber), keyed by the cache key of
+# the single request they stand in for. They are only persisted under a key of their own, so runs without batching
+# never serve them.
+BATCH_ANSWERS = {}
+
+
+def register_patch_ids(repository_path, patch_ids):
+    """
+    Records the patch ids of commits of the repository at `repository_path`.
+
+    Patch ids are scoped by repository, so a description shared through a common cache is only reused for commits
+    of the repository it was made in, and `reused_from` always names a commit of the same repository.
+    """
+    scope = os.path.realpath(repository_path)
+    for commit_hash, patch_id in patch_ids.items():
+        PATCH_IDS[commit_hash] = f"{scope}\0{patch_id}"
+
+
+def patch_key(commit):
+    """
+    Returns the key under which descriptions of `commit`'s patch are shared, or None without a known patch id.
+
+    Like `description_cache_key`, the key covers the model and prompts, so changing either stops reusing
+    descriptions made with the old ones.
+    """
+    patch_id = PATCH_IDS.get(commit.hexsha)
+    if patch_id is None:
+        return None
+    return description_cache_key(MODEL, SYSTEM_PROMPT, TEMPLATE + CHUNK_TEMPLATE + REDUCE_TEMPLATE, patch_id)
+
+
+def get_client():
+    """Returns the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _LAZY_LOCK:
+            if _client is None:
+                from openai import OpenAI
+                api_key = ConfigManager().app_config.get_config_value('OPENAI_API_KEY')
+                # The SDK honours OPENAI_BASE_URL, so the client can be pointed at any OpenAI-compatible server.
+                # Retries are left to the scheduler, which shares backoff and rate-limit state across requests.
+                _client = OpenAI(api_key=api_key, max_retries=0)
+    return _client
+
+
+def get_description_cache() -> SqliteChangeDescriptionCache:
+    """Returns the shared change description cache, opening it on first use."""
+    global _description_cache
+    if _description_cache is None:
+        with _LAZY_LOCK:
+            if _description_cache is None:
+                # Content-addressed, so re-runs over already summarized history never reach the model.
+                _description_cache = SqliteChangeDescriptionCache()
+    return _description_cache
+
+
+def set_description_cache(cache):
+    """Replaces the shared change description cache, e.g. with one at another path, or None to reopen the default."""
+    global _description_cache
+    with _LAZY_LOCK:
+        _description_cache = cache
+
+
+def get_scheduler() -> RateLimitScheduler:
+    """Returns the shared model request scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _LAZY_LOCK:
+            if _scheduler is None:
+                _scheduler = RateLimitScheduler(max_concurrency=MAX_CONCURRENCY,
+                                                requests_per_minute=REQUESTS_PER_MINUTE,
+                                                tokens_per_minute=TOKENS_PER_MINUTE, max_retries=MAX_RETRIES)
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Replaces the shared model request scheduler, e.g. with one using other budgets, or None to recreate it."""
+    global _scheduler
+    with _LAZY_LOCK:
+        _scheduler = scheduler
+
+
+def get_commit_diff(commit):
+    """Returns the diff between `commit` and its first parent, computing it at most once per run."""
+    if isinstance(commit, CommitRecord):
+        if commit.repo_path is None:
+            return commit.changes  # Extracted with patches, e.g. by parallel.ParallelGitHistory
+        # Bulk git log records only carry file lists; the patch is read like for any other commit.
+        return DIFF_CACHE.get_or_compute(commit.hexsha, lambda: _record_diff(commit))
+    # Patches are included so the model sees the hunks, not just the file list.
+    return DIFF_CACHE.get_or_compute(commit.hexsha, lambda: _first_parent_diff(commit))
+
+
+def _record_diff(record):
+    with git_lock(record):  # Resolving the hash reads the object too
+        return _first_parent_diff(get_repo(record.repo_path).commit(record.hexsha))
+
+
+def get_repo(repo_path):
+    """Returns the shared `git.Repo` of `repo_path`, opening it on first use."""
+    key = os.path.realpath(repo_path)
+    with _LAZY_LOCK:
+        if key not in _repos:
+            import git
+            _repos[key] = git.Repo(key)
+        return _repos[key]
+
+
+def git_lock(commit):
+    """Returns the lock serializing GitPython reads from the repository of `commit` (a commit or commit record)."""
+    repo = getattr(commit, "repo", None)
+    if repo is None and getattr(commit, "repo_path", None) is not None:
+        repo = get_repo(commit.repo_path)  # Bulk history records are diffed through the shared repository
+    with _GIT_LOCKS_LOCK:
+        return _GIT_LOCKS[repo.git_dir if repo is not None else None]
+
+
+def _first_parent_diff(commit):
+    with git_lock(commit):
+        return commit.parents[0].diff(commit, create_patch=True)
+
+
+def generate_commit_output(commit, on_token=None) -> CommitOutput:
+    """
+    Builds the output of `commit`, at most once per run.
+
+    :param on_token: Optional callable receiving the answer text as the model streams it. It is only called when
+        this call actually asks the model; cached, reused and trivial descriptions arrive whole in the result.
+    """
+    return OUTPUT_CACHE.get_or_compute(commit.hexsha, lambda: _build_commit_output(commit, on_token))
+
+
+def _build_commit_output(commit, on_token=None) -> CommitOutput:
+    with git_lock(commit):
+        parents, author, date, message = (commit.parents, commit.author.name, commit.authored_datetime,
+                                          commit.message.strip())
+    reused_from = None
+    patch_id = patch_key(commit)
+    if not parents:
+        change_description = None  # Root commits have nothing to diff against
+    elif patch_id is not None:
+        origin, change_description = PATCH_CACHE.get_or_compute(patch_id,
+                                                                 lambda: _describe_patch(commit, patch_id, on_token))
+        if origin != commit.hexsha:
+            reused_from = origin
+            _count_patch_reuse()
     else:
-        change_description = ""
+        change_description = generate_change_description(get_commit_diff(commit), on_token=on_token)
     output = CommitOutput(
         commit_hash=commit.hexsha,
-        author=commit.author.name,
-        date=commit.authored_datetime,
-        message=commit.message.strip(),
+        author=author,
+        date=date,
+        message=message,
         change_description=change_description,
+        reused_from=reused_from,
     )
     return output
 
 
-def generate_change_description(diff) -> ChangeDescription:
-    diff_summary = ""
-    for d in diff:
-        diff_summary += f'{d.change_type} {d.a_path}\n'
-    # Use the openai.ChatCompletion.create API
-    response = CLIENT.chat.completions.create(
-        model="gpt-3.5-turbo",  # Recommended model for chat-based tasks.
-        messages=[
-            {"role": "system",
-             "content": ("You are a senior developer and code reviewer who specializes in decoding and explaining the "
-                         "Git commit history. Your expertise allows you to identify patterns, design decisions, and "
-                         "understand what changes occurred in each commit. Your role is to clearly articulate the work "
-                         "completed in each commit to provide insight into the project's evolution and development "
-                         "strategies. By investigating the Git commits, you create a narrative that depicts how the "
-                         "project has evolved over time.")},
-            {"role": "user", "content": TEMPLATE.replace("{{diff}}", diff_summary)}
-        ]
-    )
-    # Extract the response
-    content = response.choices[0].message.content.strip()
+def _count_patch_reuse():
+    global patch_reuses
+    with _LAZY_LOCK:
+        patch_reuses += 1
+
+
+def _describe_patch(commit, patch_id, on_token=None):
+    """Returns the (origin commit hash, description) of a patch, describing it through `commit` if it is new."""
+    known = get_description_cache().get_by_patch_id(patch_id)
+    if known is not None:
+        return known
+    diff = get_commit_diff(commit)
+    change_description = generate_change_description(diff, on_token=on_token)
+    get_description_cache().link_patch_id(patch_id, commit.hexsha, plan_change_description(diff).cache_key)
+    return commit.hexsha, change_description
+
+
+class DescriptionRequest(NamedTuple):
+    """What `generate_change_description` would send for a diff, and the cache key of its answer."""
+    diff_summary: str
+    chunks: list
+    cache_key: str
+
+
+def plan_change_description(diff) -> DescriptionRequest:
+    diff_summary = summarize_diff(diff)
+    chunks = PAYLOAD_BUILDER.build(diff)
+    templates = TEMPLATE if len(chunks) == 1 else CHUNK_TEMPLATE + REDUCE_TEMPLATE
+    cache_key = description_cache_key(MODEL, SYSTEM_PROMPT, templates, "\0".join(chunks))
+    return DescriptionRequest(diff_summary, chunks, cache_key)
+
+
+def generate_change_description(diff, on_token=None) -> ChangeDescription:
+    if TRIVIAL_CLASSIFIER is not None:
+        trivial = TRIVIAL_CLASSIFIER.describe(diff)
+        if trivial is not None:
+            return trivial
+    request = plan_change_description(diff)
+    batched = BATCH_ANSWERS.get(request.cache_key)
+    if batched is not None:
+        return batched
+    cached = get_description_cache().get(request.cache_key)
+    if cached is not None:
+        return cached
+    if len(request.chunks) == 1:
+        content = complete(TEMPLATE.replace("{{diff}}", request.chunks[0]), on_token=on_token)
+    else:
+        content = _map_reduce(request.chunks, on_token)
+
+    change_description = ChangeDescription(content=content, diff_summary=request.diff_summary)
+    get_description_cache().put(request.cache_key, change_description)
+    return change_description
+
+
+def _map_reduce(chunks, on_token=None) -> str:
+    """Summarizes each chunk in parallel, then asks the model to merge the partial summaries."""
+    parts = str(len(chunks))
+    prompts = [CHUNK_TEMPLATE.replace("{{part}}", str(number)).replace("{{parts}}", parts).replace("{{diff}}", chunk)
+               for number, chunk in enumerate(chunks, start=1)]
+    with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+        summaries = list(executor.map(complete, prompts))
+    merged = "\n\n".join(f"Part {number}: {summary}" for number, summary in enumerate(summaries, start=1))
+    # Only the final, user-visible answer is streamed.
+    return complete(REDUCE_TEMPLATE.replace("{{parts}}", parts).replace("{{summaries}}", merged), on_token=on_token)
+
+
+def complete(user_content, on_token=None) -> str:
+    """
+    Sends one chat completion request with the reviewer system prompt and returns the stripped answer.
+
+    With `on_token`, the answer is requested with `stream=True` and each text delta is passed to `on_token` as it
+    arrives; the full answer is still assembled and returned. A stream that fails before its first token is retried
+    like any request; once tokens were passed to `on_token`, it fails with `StreamInterruptedError` instead, so no
+    text is passed on twice.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": user_content}
+    ]
+    tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_content) + COMPLETION_TOKEN_ESTIMATE
+    if on_token is not None:
+        return get_scheduler().run(lambda: _send_streaming(messages, on_token), tokens=tokens)
+    return get_scheduler().run(lambda: _send(messages), tokens=tokens)
+
+
+def _send(messages):
+    # The raw response exposes the x-ratelimit-* headers the scheduler paces itself with.
+    raw_response = get_client().chat.completions.with_raw_response.create(model=MODEL, messages=messages)
+    response = raw_response.parse()
+    return response.choices[0].message.content.strip(), raw_response.headers
+
 
-    return ChangeDescription(content=content, diff_summary=diff_summary)
+def _send_streaming(messages, on_token):
+    raw_response = get_client().chat.completions.with_raw_response.create(model=MODEL, messages=messages,
+                                                                          stream=True)
+    parts = []
+    try:
+        for chunk in raw_response.parse():
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+    except Exception as e:
+        if parts:
+            raise StreamInterruptedError(f"Answer stream failed after {len(parts)} tokens: {e}") from e
+        raise
+    return "".join(parts).strip(), raw_response.headers
 
 
 def sanitize_for_html(text: str) -> str: